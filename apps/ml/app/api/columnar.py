@@ -0,0 +1,286 @@
+"""
+Columnar batch helpers - Arrow IPC / Parquet bodies in and out of the batch endpoints
+"""
+import logging
+from datetime import date
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from app.api.schemas import MAX_BATCH_ITEMS
+from app.services.executor import InferenceRejected, run_inference
+from app.services.metrics import STAGE_SERIALIZATION, STAGE_VALIDATION, record_prediction_error, stage_timer
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Content types accepted for each columnar format (first one is used in responses)
+COLUMNAR_MEDIA_TYPES: Dict[str, Tuple[str, ...]] = {
+    "arrow_stream": (ARROW_STREAM_MEDIA_TYPE,),
+    "arrow_file": (ARROW_FILE_MEDIA_TYPE, "application/vnd.apache.arrow"),
+    "parquet": (PARQUET_MEDIA_TYPE, "application/x-parquet"),
+}
+
+
+class ColumnSpec(NamedTuple):
+    """One input column: where it goes in the service batch and how it is checked"""
+    name: str                         # column name in the request body
+    target: str                       # service item key (see _inventory_item / _expiry_item)
+    default: Optional[float] = None   # None means the column is required
+    non_negative: bool = True
+    truncate: bool = False            # int() the value like the JSON path does
+    integer: bool = False             # reject non-integral values (ids), like the JSON schema
+
+
+# Same names, defaults and bounds as InventoryOptimizationRequest
+INVENTORY_COLUMNS: List[ColumnSpec] = [
+    ColumnSpec("medicine_id", "medicine_id", non_negative=False, integer=True),
+    ColumnSpec("current_stock", "quantity_received", truncate=True),
+    ColumnSpec("avg_daily_sales", "avg_daily_sales"),
+    ColumnSpec("price", "unit_cost"),
+    ColumnSpec("days_until_expiry", "days_until_expiry", 180, integer=True),
+    ColumnSpec("days_since_last_order", "days_since_last_order", 30, integer=True),
+    ColumnSpec("order_count", "order_count", 10, integer=True),
+]
+INVENTORY_HISTORY_COLUMN = "historical_qty_data"
+# Optional scoring date per row (date, timestamp or 'YYYY-MM-DD'; null = today)
+AS_OF_COLUMN = "as_of"
+
+# Same names, defaults and bounds as ExpiryPredictionRequest
+EXPIRY_COLUMNS: List[ColumnSpec] = [
+    ColumnSpec("medicine_id", "medicine_id", non_negative=False, integer=True),
+    ColumnSpec("days_until_expiry", "days_until_expiry", integer=True),
+    ColumnSpec("stock_quantity", "stock_quantity", truncate=True),
+    ColumnSpec("avg_daily_sales", "estimated_daily_usage"),
+    ColumnSpec("unit_price", "unit_price"),
+    ColumnSpec("supplier_id", "supplier", 0, non_negative=False, integer=True),
+]
+
+
+def columnar_format(media_type: Optional[str]) -> Optional[str]:
+    """Map a content type (or Accept header) onto a columnar format name, None if not columnar"""
+    if not media_type:
+        return None
+    for part in media_type.split(","):
+        value = part.split(";")[0].strip().lower()
+        for fmt, media_types in COLUMNAR_MEDIA_TYPES.items():
+            if value in media_types:
+                return fmt
+    return None
+
+
+def _read_table(body: bytes, fmt: str):
+    import pyarrow as pa
+
+    if fmt == "arrow_stream":
+        return pa.ipc.open_stream(body).read_all()
+    if fmt == "arrow_file":
+        return pa.ipc.open_file(pa.py_buffer(body)).read_all()
+    import pyarrow.parquet as pq
+    return pq.read_table(pa.BufferReader(body))
+
+
+def _write_table(table, fmt: str) -> bytes:
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink)
+    else:
+        new_writer = pa.ipc.new_stream if fmt == "arrow_stream" else pa.ipc.new_file
+        with new_writer(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _numeric_column(table, spec: ColumnSpec, n: int):
+    """Column as float64 plus a mask of rows that pass the spec's checks"""
+    import numpy as np
+    import pyarrow as pa
+
+    if spec.name not in table.column_names:
+        if spec.default is None:
+            raise HTTPException(status_code=400, detail=f"Missing required column '{spec.name}'")
+        return np.full(n, spec.default, dtype=np.float64), np.ones(n, dtype=bool)
+
+    try:
+        column = table.column(spec.name).cast(pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise HTTPException(status_code=400, detail=f"Column '{spec.name}' must be numeric")
+
+    values = column.to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+    # Nulls come through as NaN, so one finite check covers both
+    ok = np.isfinite(values)
+    if spec.non_negative:
+        ok &= ~(values < 0)
+    if spec.integer:
+        ok &= values == np.trunc(values)
+    if spec.truncate:
+        values = np.trunc(values)
+    return values, ok
+
+
+def _history_column(table, n: int):
+    """Order history list column as (flat values, lengths) plus a row mask, None if absent"""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if INVENTORY_HISTORY_COLUMN not in table.column_names:
+        return None, np.ones(n, dtype=bool)
+
+    try:
+        column = table.column(INVENTORY_HISTORY_COLUMN).combine_chunks().cast(pa.list_(pa.float64()))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise HTTPException(
+            status_code=400, detail=f"Column '{INVENTORY_HISTORY_COLUMN}' must be a list of numbers"
+        )
+
+    # Null lists have no values and a null length - same as an omitted history
+    lengths = pc.list_value_length(column).fill_null(0).to_numpy(zero_copy_only=False).astype(np.int64)
+    flat = pc.list_flatten(column).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+
+    ok = np.ones(n, dtype=bool)
+    bad_values = ~np.isfinite(flat)
+    if bad_values.any():
+        ok[np.repeat(np.arange(n), lengths)[bad_values]] = False
+    return (flat, lengths), ok
+
+
+def _as_of_column(table, n: int):
+    """as_of column as epoch days plus a row mask, None if absent"""
+    import numpy as np
+    import pyarrow as pa
+
+    if AS_OF_COLUMN not in table.column_names:
+        return None, np.ones(n, dtype=bool)
+
+    column = table.column(AS_OF_COLUMN).combine_chunks()
+    try:
+        column = column.cast(pa.date32())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise HTTPException(status_code=400, detail=f"Column '{AS_OF_COLUMN}' must hold dates (YYYY-MM-DD)")
+
+    today = np.datetime64(date.today(), "D").astype(np.int64)
+    days = column.cast(pa.int32()).fill_null(int(today)).to_numpy(zero_copy_only=False).astype(np.int64)
+    return days, np.ones(n, dtype=bool)
+
+
+def read_columns(
+    table, specs: List[ColumnSpec], with_history: bool, with_as_of: bool = False
+) -> Tuple[Dict[str, Any], Any]:
+    """Validate every column in bulk. Returns (service columns for valid rows, valid mask)."""
+    import numpy as np
+
+    n = table.num_rows
+    columns: Dict[str, Any] = {}
+    valid = np.ones(n, dtype=bool)
+    for spec in specs:
+        values, ok = _numeric_column(table, spec, n)
+        columns[spec.target] = values
+        valid &= ok
+
+    history = None
+    if with_history:
+        history, ok = _history_column(table, n)
+        valid &= ok
+
+    as_of = None
+    if with_as_of:
+        as_of, ok = _as_of_column(table, n)
+        valid &= ok
+
+    columns = {key: values[valid] for key, values in columns.items()}
+    columns["medicine_id"] = columns["medicine_id"].astype(np.int64)
+    if history is not None:
+        flat, lengths = history
+        columns[INVENTORY_HISTORY_COLUMN] = (flat[np.repeat(valid, lengths)], lengths[valid])
+    if as_of is not None:
+        columns[AS_OF_COLUMN] = as_of[valid]
+    return columns, valid
+
+
+def result_table(table, results: Dict[str, Any], valid, failed: bool = False):
+    """
+    Scatter result arrays for valid rows back to input order; invalid rows are
+    null with an error. failed (scoring raised, results empty) gives every
+    valid row a "Prediction failed" error too.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    n = table.num_rows
+    arrays = {"medicine_id": table.column("medicine_id").combine_chunks()}
+    for name, values in results.items():
+        if name == "medicine_id":
+            continue
+        values = np.asarray(values)
+        # Labels (risk_level, recommendation) come back as NumPy strings
+        dtype = object if values.dtype.kind in ("U", "O") else values.dtype
+        full = np.zeros(n, dtype=dtype)
+        full[valid] = values
+        arrays[name] = pa.array(full, mask=~valid)
+
+    errors = np.where(valid, "Prediction failed", "Invalid input row").astype(object)
+    arrays["error"] = pa.array(errors, mask=None if failed else valid, type=pa.string())
+    return pa.table(arrays)
+
+
+async def score_columnar(
+    request: Request,
+    fmt: str,
+    model_key: str,
+    predict_fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    specs: List[ColumnSpec],
+    with_history: bool = False,
+    with_as_of: bool = False
+) -> Response:
+    """
+    Score an Arrow IPC / Parquet batch without building per-row Python objects.
+    Columns are validated in bulk; rows that fail validation come back with a
+    null prediction and an error instead of failing the whole batch.
+    Responds in the Accept header's columnar format, else the request's.
+    with_as_of reads the optional per-row as_of column (backfill scoring).
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Columnar bodies need pyarrow installed")
+
+    try:
+        table = _read_table(await request.body(), fmt)
+    except (pa.ArrowInvalid, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable {fmt} body: {e}")
+
+    if table.num_rows == 0:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one row")
+    if table.num_rows > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} rows")
+
+    with stage_timer(model_key, STAGE_VALIDATION):
+        columns, valid = read_columns(table, specs, with_history, with_as_of)
+    record_prediction_error(model_key, "invalid_input", int((~valid).sum()))
+    results: Optional[Dict[str, Any]] = {}
+    failed = False
+    if valid.any():
+        try:
+            results = await run_inference(model_key, predict_fn, columns)
+        except InferenceRejected:
+            raise
+        except Exception as e:
+            # Same as the JSON path: rows come back as failed predictions, not a 500
+            logger.error(f"Error in columnar {model_key} prediction: {e}")
+            record_prediction_error(model_key, "exception", int(valid.sum()))
+            results, failed = {}, True
+        if results is None:
+            raise HTTPException(status_code=503, detail=f"Model '{model_key}' not available")
+
+    out_fmt = columnar_format(request.headers.get("accept")) or fmt
+    with stage_timer(model_key, STAGE_SERIALIZATION):
+        body = _write_table(result_table(table, results, valid, failed), out_fmt)
+    return Response(content=body, media_type=COLUMNAR_MEDIA_TYPES[out_fmt][0])
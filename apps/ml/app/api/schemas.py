@@ -1,9 +1,67 @@
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+import os
+from datetime import date
+from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+
+# Item cap for JSON batch bodies (the /stream variants have no cap)
+MAX_BATCH_ITEMS = int(os.getenv("ML_MAX_BATCH_ITEMS", "10000"))
+# Point cap for what-if grids (product of the axis lengths)
+MAX_SCENARIO_POINTS = int(os.getenv("ML_MAX_SCENARIO_POINTS", "100000"))
 
 class DemandForecastRequest(BaseModel):
     """Request model for demand forecasting"""
     periods: int = Field(default=30, ge=1, le=365, description="Number of days to forecast")
+    uncertainty_samples: Optional[int] = Field(
+        default=None, ge=0, le=5000,
+        description="Prophet samples for the bounds (0 = no bounds, default = model setting; other counts are not cached)"
+    )
+
+
+class CatalogForecastRequest(BaseModel):
+    """Request model for 4-week forecasts of many medicines from one Prophet run"""
+    avg_daily_sales: List[float] = Field(..., min_items=1, description="Average daily sales per medicine")
+    std_deviation: List[float] = Field(..., min_items=1, description="Daily sales std deviation per medicine")
+    medicine_ids: Optional[List[int]] = Field(default=None, description="IDs echoed back, same order as the arrays")
+
+    @model_validator(mode="after")
+    def check_lengths(self) -> "CatalogForecastRequest":
+        n = len(self.avg_daily_sales)
+        if len(self.std_deviation) != n or (self.medicine_ids is not None and len(self.medicine_ids) != n):
+            raise ValueError("avg_daily_sales, std_deviation and medicine_ids must have the same length")
+        if any(value < 0 for value in self.avg_daily_sales):
+            raise ValueError("avg_daily_sales must be >= 0")
+        return self
+
+
+class SalesRecord(BaseModel):
+    """One day of unit sales (quantities only - no revenue fields)"""
+    date: str = Field(description="Sale date (YYYY-MM-DD)")
+    qty: float = Field(ge=0, description="Units sold")
+
+
+class WeeklyDemandRequest(BaseModel):
+    """Request model for next-week demand from one medicine's sales history"""
+    sales_history: List[SalesRecord] = Field(..., min_items=1)
+    quality: Literal["fast", "balanced", "best"] = Field(
+        default="balanced",
+        description="fast = LightGBM, best = stacking ensemble, balanced = ensemble within latency budget"
+    )
+    latency_budget_ms: Optional[float] = Field(default=None, gt=0, description="Per-request model latency budget")
+    as_of: Optional[date] = Field(default=None, description="Forecast as of this day (YYYY-MM-DD): later sales are ignored")
+
+
+class WeeklyDemandSeries(BaseModel):
+    """One medicine's sales history for batch weekly demand"""
+    medicine_id: int
+    sales_history: List[SalesRecord] = Field(..., min_items=1)
+
+
+class BatchWeeklyDemandRequest(BaseModel):
+    """Request model for catalog-wide next-week demand (no item cap)"""
+    series: List[WeeklyDemandSeries] = Field(..., min_items=1)
+    quality: Literal["fast", "balanced", "best"] = Field(default="balanced")
+    latency_budget_ms: Optional[float] = Field(default=None, gt=0, description="Model latency budget for the whole batch")
+    as_of: Optional[date] = Field(default=None, description="Forecast as of this day (YYYY-MM-DD): later sales are ignored")
 
 
 class InventoryOptimizationRequest(BaseModel):
@@ -17,12 +75,13 @@ class InventoryOptimizationRequest(BaseModel):
     days_until_expiry: int = Field(default=180, ge=0)
     days_since_last_order: int = Field(default=30, ge=0)
     order_count: int = Field(default=10, ge=0)
-    historical_qty_data: Optional[List[float]] = Field(default=None, description="List of last 5 order quantities")
+    historical_qty_data: Optional[List[float]] = Field(default=None, description="Last 5 order quantities, oldest first (the last one is the most recent)")
+    as_of: Optional[date] = Field(default=None, description="Score as of this day (YYYY-MM-DD), default today")
 
 
 class BatchInventoryRequest(BaseModel):
     """Request model for batch inventory optimization"""
-    medicines: List[InventoryOptimizationRequest] = Field(..., min_items=1, max_items=100)
+    medicines: List[InventoryOptimizationRequest] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS)
 
 
 class ExpiryPredictionRequest(BaseModel):
@@ -38,4 +97,107 @@ class ExpiryPredictionRequest(BaseModel):
 
 class BatchExpiryRequest(BaseModel):
     """Request model for batch expiry prediction"""
-    medicines: List[ExpiryPredictionRequest] = Field(..., min_items=1, max_items=100)
+    medicines: List[ExpiryPredictionRequest] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS)
+
+
+class ScenarioRange(BaseModel):
+    """One what-if axis: explicit values, or steps evenly spaced values from start to stop (inclusive)"""
+    values: Optional[List[float]] = Field(default=None, min_items=1, max_items=MAX_SCENARIO_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: Optional[int] = Field(default=None, ge=1, le=MAX_SCENARIO_POINTS)
+
+    @model_validator(mode="after")
+    def check_range(self) -> "ScenarioRange":
+        if self.values is not None:
+            ends = self.values
+        elif None in (self.start, self.stop, self.steps):
+            raise ValueError("give either values or start, stop and steps")
+        else:
+            ends = [self.start, self.stop]
+        if min(ends) < 0:
+            raise ValueError("scenario values must be >= 0")
+        return self
+
+    def grid_values(self) -> List[float]:
+        if self.values is not None:
+            return self.values
+        if self.steps == 1:
+            return [self.start]
+        step = (self.stop - self.start) / (self.steps - 1)
+        return [self.start + i * step for i in range(self.steps)]
+
+
+def _check_grid_size(ranges: Dict[str, ScenarioRange]) -> None:
+    points = 1
+    for axis in ranges.values():
+        points *= len(axis.values) if axis.values is not None else axis.steps
+    if points > MAX_SCENARIO_POINTS:
+        raise ValueError(f"grid has {points} points, the limit is {MAX_SCENARIO_POINTS}")
+
+
+class InventoryScenarioRequest(BaseModel):
+    """What-if grid for inventory optimization: a base item and the fields to vary (first varies slowest)"""
+    base: InventoryOptimizationRequest
+    ranges: Dict[
+        Literal["current_stock", "price", "days_until_expiry", "days_since_last_order", "order_count"],
+        ScenarioRange
+    ] = Field(..., min_items=1)
+
+    @model_validator(mode="after")
+    def check_size(self) -> "InventoryScenarioRequest":
+        _check_grid_size(self.ranges)
+        return self
+
+
+class ExpiryScenarioRequest(BaseModel):
+    """What-if grid for expiry risk: a base item and the fields to vary (first varies slowest)"""
+    base: ExpiryPredictionRequest
+    ranges: Dict[
+        Literal["days_until_expiry", "stock_quantity", "avg_daily_sales", "unit_price"],
+        ScenarioRange
+    ] = Field(..., min_items=1)
+
+    @model_validator(mode="after")
+    def check_size(self) -> "ExpiryScenarioRequest":
+        _check_grid_size(self.ranges)
+        return self
+
+
+class CatalogIngestRequest(BaseModel):
+    """Request model for catalog-wide scoring straight from the pharmacy database"""
+    organization_id: Optional[str] = Field(default=None, description="Limit to one organization's inventory")
+    as_of: Optional[date] = Field(default=None, description="Rebuild and score the catalog as it stood at the end of this day, default now")
+
+
+class SaleEvent(BaseModel):
+    """One sale of a medicine, for the feature store"""
+    medicine_id: int
+    date: str = Field(description="Sale date (YYYY-MM-DD)")
+    qty: float = Field(ge=0, description="Units sold")
+
+
+class ReceiptEvent(BaseModel):
+    """One received order (inventory batch) of a medicine, for the feature store"""
+    medicine_id: int
+    date: str = Field(description="Receipt date (YYYY-MM-DD)")
+    qty: float = Field(ge=0, description="Units received")
+
+
+class FeatureEventsRequest(BaseModel):
+    """Sales and receipts to fold into the per-medicine rolling statistics"""
+    sales: List[SaleEvent] = Field(default_factory=list, max_items=MAX_BATCH_ITEMS)
+    receipts: List[ReceiptEvent] = Field(default_factory=list, max_items=MAX_BATCH_ITEMS)
+
+
+class StoredWeeklyDemandRequest(BaseModel):
+    """Request model for next-week demand from the feature store's sales history"""
+    medicine_ids: List[int] = Field(..., min_items=1)
+    quality: Literal["fast", "balanced", "best"] = Field(default="balanced")
+    latency_budget_ms: Optional[float] = Field(default=None, gt=0, description="Model latency budget for the whole batch")
+
+
+class ModelReloadRequest(BaseModel):
+    """Request model for reloading retrained model artifacts"""
+    models: Optional[List[str]] = Field(default=None, description="Model keys to reload (all by default)")
+    force: bool = Field(default=False, description="Reload even if the artifact is unchanged")
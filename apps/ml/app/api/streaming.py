@@ -0,0 +1,163 @@
+"""
+Streaming batch helpers - NDJSON in, NDJSON out, processed in fixed-size chunks
+"""
+import os
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.types import Receive, Scope, Send
+
+from app.services.executor import InferenceRejected, run_inference
+
+logger = logging.getLogger(__name__)
+
+# Items scored per model call while streaming
+STREAM_CHUNK_SIZE = int(os.getenv("ML_STREAM_CHUNK_SIZE", "500"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Size cap for {"medicines": [...]} bodies on the stream endpoints (NDJSON is uncapped)
+MAX_JSON_BODY_BYTES = int(os.getenv("ML_STREAM_MAX_JSON_BYTES", str(16 * 1024 * 1024)))
+
+# (index, validated item or None, error message or None)
+ParsedItem = Tuple[int, Optional[BaseModel], Optional[str]]
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming NDJSON response whose body may still be reading the request.
+    Starlette's StreamingResponse listens for a client disconnect on receive()
+    while the body runs, which takes (and drops) the http.request messages the
+    body is waiting for. Here receive() belongs to the body alone; a client
+    that goes away mid-upload surfaces as ClientDisconnect from request.stream().
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield complete lines from the request body as it arrives"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def _iter_ndjson_items(request: Request, item_model: Type[BaseModel]) -> AsyncIterator[ParsedItem]:
+    index = 0
+    async for line in _iter_lines(request):
+        if not line.strip():
+            continue
+        try:
+            yield index, item_model.model_validate_json(line), None
+        except ValidationError as e:
+            yield index, None, f"Invalid item: {e.errors()[0]['msg']}"
+        index += 1
+
+
+async def _iter_json_items(raw_items: List[Any], item_model: Type[BaseModel]) -> AsyncIterator[ParsedItem]:
+    for index, raw in enumerate(raw_items):
+        try:
+            yield index, item_model.model_validate(raw), None
+        except ValidationError as e:
+            yield index, None, f"Invalid item: {e.errors()[0]['msg']}"
+
+
+async def open_request_items(
+    request: Request,
+    item_model: Type[BaseModel],
+    list_key: str
+) -> AsyncIterator[ParsedItem]:
+    """
+    Get an iterator over the batch items of a request, validated one at a time.
+    NDJSON bodies (one item per line) are read incrementally while the response
+    streams (see NDJSONStreamingResponse), so memory stays flat for any payload
+    size. JSON bodies ({list_key: [...]}) are parsed up front so malformed JSON
+    is a 400 rather than a broken stream, and are capped at MAX_JSON_BODY_BYTES (413).
+    Items that fail validation are yielded with an error instead of failing the batch.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        return _iter_ndjson_items(request, item_model)
+
+    too_large = HTTPException(
+        status_code=413, detail=f"JSON body exceeds {MAX_JSON_BODY_BYTES} bytes - send NDJSON for larger batches"
+    )
+    if int(request.headers.get("content-length") or 0) > MAX_JSON_BODY_BYTES:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_JSON_BODY_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    try:
+        body = json.loads(b"".join(chunks))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON or NDJSON")
+    raw_items = body.get(list_key) if isinstance(body, dict) else body
+    if not isinstance(raw_items, list):
+        raise HTTPException(status_code=400, detail=f"Expected a '{list_key}' array")
+    return _iter_json_items(raw_items, item_model)
+
+
+async def stream_batch_results(
+    items: AsyncIterator[ParsedItem],
+    model_key: str,
+    batch_fn: Callable[[List[Dict[str, Any]]], List[Optional[Dict[str, Any]]]],
+    to_service_items: Callable[[List[Any]], List[Dict[str, Any]]],
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Score items in chunks of chunk_size and emit one NDJSON line per item as
+    soon as its chunk finishes. Each line carries the item's input index.
+    to_service_items maps a chunk of parsed requests onto batch_fn items.
+    """
+    chunk: List[Tuple[int, Any]] = []
+
+    async def flush() -> AsyncIterator[bytes]:
+        service_items = to_service_items([item for _, item in chunk])
+        try:
+            predictions = await run_inference(model_key, batch_fn, service_items)
+        except InferenceRejected as e:
+            # Headers are already sent - report the shed chunk in-band
+            for index, item in chunk:
+                yield (json.dumps({"index": index, "medicine_id": item.medicine_id, "error": e.detail}) + "\n").encode()
+            return
+        for (index, item), res in zip(chunk, predictions):
+            if res:
+                row = {"index": index, "medicine_id": item.medicine_id, **res}
+            else:
+                row = {"index": index, "medicine_id": item.medicine_id, "error": "Prediction failed"}
+            yield (json.dumps(row) + "\n").encode()
+
+    async for index, item, error in items:
+        if error is not None:
+            yield (json.dumps({"index": index, "error": error}) + "\n").encode()
+            continue
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            async for line in flush():
+                yield line
+            chunk = []
+
+    if chunk:
+        async for line in flush():
+            yield line
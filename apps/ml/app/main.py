@@ -1,42 +1,145 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import BaseModel, ValidationError
 from contextlib import asynccontextmanager
 import logging
-from typing import List
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from app.services.ml_service import (
-    load_ml_models, 
+    MODEL_FILES,
+    init_worker,
+    start_background_loading,
+    start_model_watcher,
+    stop_model_watcher,
+    reload_models,
+    get_model_registry,
+    is_ready,
+    is_model_available,
+    get_model_states,
     get_ml_status, 
     predict_demand, 
+    predict_weekly_demand,
+    predict_weekly_demand_batch,
+    predict_stored_weekly_demand_batch,
+    attach_stored_order_history,
+    get_demand_forecast_for_catalog,
     predict_inventory_optimization,
-    predict_expiry_risk
+    predict_inventory_optimization_batch,
+    predict_inventory_optimization_columns,
+    predict_expiry_risk,
+    predict_expiry_risk_batch,
+    predict_expiry_risk_columns
+)
+from app.services.executor import (
+    InferenceRejected,
+    start_executor,
+    shutdown_executor,
+    run_inference,
+    get_executor_status
+)
+from app.services.router import choose_demand_model, get_model_timings
+from app.services.model_versions import MODEL_VERSION_HEADER, begin_request, format_versions
+from app.services.prediction_cache import clear_prediction_cache, get_cache_stats
+from app.services.calendar_table import epoch_day
+from app.services.feature_store import (
+    get_feature_store,
+    save_feature_store,
+    start_snapshot_thread,
+    stop_snapshot_thread
+)
+from app.services.scenarios import expiry_scenarios, inventory_scenarios
+from app.services.ingestion import (
+    expiry_columns,
+    get_pool,
+    inventory_columns,
+    load_catalog_aggregates
+)
+from app.services.metrics import (
+    METRICS_CONTENT_TYPE,
+    REQUEST_ERRORS,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    render_metrics
+)
+from app.services.batching import (
+    BATCHING_ENABLED,
+    register_batcher,
+    get_batcher,
+    get_batching_stats
+)
+from app.api.streaming import NDJSON_MEDIA_TYPE, NDJSONStreamingResponse, open_request_items, stream_batch_results
+from app.api.columnar import (
+    COLUMNAR_MEDIA_TYPES,
+    INVENTORY_COLUMNS,
+    EXPIRY_COLUMNS,
+    ColumnSpec,
+    columnar_format,
+    score_columnar
 )
 from app.api.schemas import (
     DemandForecastRequest, 
+    CatalogForecastRequest,
+    WeeklyDemandRequest,
+    BatchWeeklyDemandRequest,
     InventoryOptimizationRequest, 
     BatchInventoryRequest,
     ExpiryPredictionRequest,
-    BatchExpiryRequest
+    BatchExpiryRequest,
+    CatalogIngestRequest,
+    FeatureEventsRequest,
+    StoredWeeklyDemandRequest,
+    ModelReloadRequest,
+    ScenarioRange,
+    InventoryScenarioRequest,
+    ExpiryScenarioRequest
 )
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared secret for the /admin endpoints (X-Admin-Token header); unset = no check
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN", "")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     logger.info("Starting ML Service...")
     
-    # Load ML models at startup
-    success = load_ml_models()
-    if success:
-        logger.info("ML models loaded successfully")
-    else:
-        logger.warning("Failed to load some ML models")
+    # Load ML models in the background so the service accepts traffic at once;
+    # /ready turns green when the models in ML_READY_MODELS are loaded
+    start_background_loading()
+
+    # Inference runs on a worker pool so the event loop stays responsive
+    # (process workers load their own models and watch models/ themselves)
+    start_executor(initializer=init_worker)
+
+    # Swap in retrained artifacts from models/ without a restart
+    start_model_watcher()
+
+    # Rolling per-medicine statistics, restored from the last snapshot
+    get_feature_store()
+    start_snapshot_thread()
+
+    # Opt-in request coalescing for the single-item endpoints
+    if BATCHING_ENABLED:
+        register_batcher("inventory", "inventory_lgb", predict_inventory_optimization_batch)
+        register_batcher("expiry", "expiry_xgb", predict_expiry_risk_batch)
         
     yield
     
     logger.info("Shutting down ML Service...")
+    stop_model_watcher()
+    shutdown_executor()
+    stop_snapshot_thread()
 
 app = FastAPI(
     title="Smart Pharmacy ML Service",
@@ -45,87 +148,525 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(InferenceRejected)
+async def inference_rejected_handler(request: Request, exc: InferenceRejected):
+    """Shed load with 429/503 when the inference executor is saturated"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": "1"}
+    )
+
+def _endpoint_label(scope: Scope) -> str:
+    """Route template of a request (keeps metric labels bounded), 'unmatched' for unknown paths"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+# The middlewares below are plain ASGI rather than @app.middleware("http"): Starlette's
+# BaseHTTPMiddleware re-wraps every response in a StreamingResponse that reads receive()
+# concurrently with the body, which breaks the NDJSON endpoints that read the request
+# while they respond.
+
+class MetricsMiddleware:
+    """Per-endpoint latency (up to the last body chunk), in-flight and error metrics"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = _endpoint_label(scope)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).dec()
+            REQUEST_LATENCY.labels(method=scope["method"], endpoint=endpoint, status=str(status)).observe(
+                time.perf_counter() - started
+            )
+            if status >= 400:
+                REQUEST_ERRORS.labels(endpoint=endpoint, status=str(status)).inc()
+
+class ModelVersionMiddleware:
+    """Report the model version(s) that served a request in the X-Model-Version header"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        versions = begin_request()
+
+        async def send_with_version(message: Message) -> None:
+            # Streaming responses send their headers before inference runs - their items carry model_version
+            if message["type"] == "http.response.start" and versions:
+                MutableHeaders(scope=message)[MODEL_VERSION_HEADER] = format_versions(versions)
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ModelVersionMiddleware)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics (request latency, per-stage inference timings, batch sizes, errors)"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/live")
+async def liveness_check():
+    """Liveness probe - the process is up and serving"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe - 503 until the required models are loaded"""
+    body = {"ready": is_ready(), "models": get_model_states()}
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.get("/health")
 async def health_check():
     """Check service health and model status"""
-    return get_ml_status()
+    return {
+        **get_ml_status(),
+        "model_timings": get_model_timings(),
+        "executor": get_executor_status(),
+        "batching": get_batching_stats(),
+        "prediction_cache": get_cache_stats(),
+        "feature_store": store.stats() if (store := get_feature_store()) else None
+    }
 
 @app.post("/forecast/demand")
 async def forecast_demand_endpoint(request: DemandForecastRequest):
     """Forecast medicine demand for the next N days"""
-    result = predict_demand(periods=request.periods)
+    result = await run_inference(
+        "demand_prophet", predict_demand,
+        periods=request.periods, uncertainty_samples=request.uncertainty_samples
+    )
     if result is None:
         raise HTTPException(status_code=503, detail="Demand forecasting model not available")
     return {"forecast": result}
 
+@app.post("/forecast/demand/catalog")
+async def forecast_catalog_endpoint(request: CatalogForecastRequest):
+    """4-week demand forecast for many medicines from a single Prophet profile"""
+    forecasts = await run_inference(
+        "demand_prophet", get_demand_forecast_for_catalog,
+        request.avg_daily_sales, request.std_deviation
+    )
+    if forecasts and not forecasts[0]:
+        raise HTTPException(status_code=503, detail="Demand forecasting model not available")
+
+    medicine_ids = request.medicine_ids or list(range(len(forecasts)))
+    return {
+        "results": [
+            {"medicine_id": medicine_id, "forecast": forecast}
+            for medicine_id, forecast in zip(medicine_ids, forecasts)
+        ]
+    }
+
+@app.post("/forecast/demand/weekly")
+async def forecast_weekly_demand_endpoint(request: WeeklyDemandRequest):
+    """Forecast next week's demand for one medicine (LightGBM or stacking ensemble)"""
+    model_key = choose_demand_model(
+        {
+            "demand_lgb": is_model_available("demand_lgb"),
+            "demand_stacking": is_model_available("demand_stacking")
+        },
+        quality=request.quality,
+        latency_budget_ms=request.latency_budget_ms
+    )
+    if model_key is None:
+        raise HTTPException(status_code=503, detail="Weekly demand model not available")
+
+    sales_history = [record.model_dump() for record in request.sales_history]
+    result = await run_inference(model_key, predict_weekly_demand, sales_history, model_key, request.as_of)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Weekly demand prediction failed")
+    return result
+
+@app.post("/forecast/demand/weekly/batch")
+async def batch_forecast_weekly_demand_endpoint(request: BatchWeeklyDemandRequest):
+    """Forecast next week's demand for many medicines in one vectorized pass"""
+    model_key = choose_demand_model(
+        {
+            "demand_lgb": is_model_available("demand_lgb"),
+            "demand_stacking": is_model_available("demand_stacking")
+        },
+        quality=request.quality,
+        latency_budget_ms=request.latency_budget_ms,
+        rows=len(request.series)
+    )
+    if model_key is None:
+        raise HTTPException(status_code=503, detail="Weekly demand model not available")
+
+    series = [
+        [{"date": record.date, "qty": record.qty} for record in item.sales_history]
+        for item in request.series
+    ]
+    predictions = await run_inference(model_key, predict_weekly_demand_batch, series, model_key, request.as_of)
+    results = []
+    for item, res in zip(request.series, predictions):
+        if res:
+            results.append({"medicine_id": item.medicine_id, **res})
+        else:
+            results.append({"medicine_id": item.medicine_id, "error": "Prediction failed"})
+    return {"model": model_key, "results": results}
+
+@app.post("/forecast/demand/weekly/stored")
+async def stored_forecast_weekly_demand_endpoint(request: StoredWeeklyDemandRequest):
+    """Next-week demand for many medicines from the sales already in the feature store"""
+    if get_feature_store() is None:
+        raise HTTPException(status_code=503, detail="Feature store is disabled")
+    model_key = choose_demand_model(
+        {
+            "demand_lgb": is_model_available("demand_lgb"),
+            "demand_stacking": is_model_available("demand_stacking")
+        },
+        quality=request.quality,
+        latency_budget_ms=request.latency_budget_ms,
+        rows=len(request.medicine_ids)
+    )
+    if model_key is None:
+        raise HTTPException(status_code=503, detail="Weekly demand model not available")
+
+    # Read the store here, where events update it - process-pool workers hold stale copies
+    history = await run_in_threadpool(get_feature_store().weekly_history, request.medicine_ids)
+    predictions = await run_inference(
+        model_key, predict_stored_weekly_demand_batch, request.medicine_ids, model_key, history
+    )
+    results = []
+    for medicine_id, res in zip(request.medicine_ids, predictions):
+        results.append(res or {"medicine_id": medicine_id, "error": "No sales history in the feature store"})
+    return {"model": model_key, "results": results}
+
+def _apply_feature_events(request: FeatureEventsRequest) -> Dict[str, int]:
+    store = get_feature_store()
+    # Parse every date before touching the store so a bad event applies nothing;
+    # per medicine the store expects receipts in time order
+    receipts = sorted((epoch_day(e.date), e.medicine_id, e.qty) for e in request.receipts)
+    sales = [(epoch_day(e.date), e.medicine_id, e.qty) for e in request.sales]
+    for day, medicine_id, qty in receipts:
+        store.record_receipt(medicine_id, day, qty)
+    for day, medicine_id, qty in sales:
+        store.record_sale(medicine_id, day, qty)
+    return {"sales": len(request.sales), "receipts": len(request.receipts), **store.stats()}
+
+@app.post("/features/events")
+async def feature_events_endpoint(request: FeatureEventsRequest):
+    """Fold new sales and receipts into the feature store (O(1) per event)"""
+    if get_feature_store() is None:
+        raise HTTPException(status_code=503, detail="Feature store is disabled")
+    try:
+        applied = await run_in_threadpool(_apply_feature_events, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event date: {e}")
+    if request.receipts:
+        # Cached inventory results may have been computed from the old order history
+        clear_prediction_cache("inventory_lgb")
+    return applied
+
+@app.post("/features/snapshot")
+async def feature_snapshot_endpoint():
+    """Write the feature store snapshot now (it is also written periodically and on shutdown)"""
+    if get_feature_store() is None:
+        raise HTTPException(status_code=503, detail="Feature store is disabled")
+    written = await run_in_threadpool(save_feature_store)
+    return {"written": written, **get_feature_store().stats()}
+
+def _check_admin_token(request: Request) -> None:
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/models")
+async def model_registry_endpoint(request: Request):
+    """Served version, load state and recent versions of every model"""
+    _check_admin_token(request)
+    return {"models": get_model_registry()}
+
+@app.post("/admin/models/reload")
+async def reload_models_endpoint(request: Request, body: ModelReloadRequest):
+    """
+    Load retrained artifacts next to the serving models, validate them against
+    the feature lists and swap them in. Requests in flight finish on the old
+    version. With ML_EXECUTOR_KIND=process this reloads the API process; the
+    workers pick the artifacts up through their own watchers.
+    """
+    _check_admin_token(request)
+    unknown = [key for key in body.models or [] if key not in MODEL_FILES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown)}")
+    results = await run_in_threadpool(reload_models, body.models, body.force)
+    return {"results": results}
+
+async def _parse_json_body(request: Request, model: Type[BaseModel]) -> BaseModel:
+    """Validate a JSON body by hand for endpoints that also take other content types"""
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def _body_schema(
+    model: Type[BaseModel], ndjson_item: Optional[Type[BaseModel]] = None, columnar: bool = False
+) -> Dict[str, Any]:
+    """
+    openapi_extra documenting the body of an endpoint that reads the raw Request
+    (JSON, plus one item per NDJSON line and/or the columnar formats)
+    """
+    def schema(body_model: Type[BaseModel]) -> Dict[str, Any]:
+        # Nested models are already components (their single-item endpoints use them)
+        body = body_model.model_json_schema(ref_template="#/components/schemas/{model}")
+        body.pop("$defs", None)
+        return body
+
+    content: Dict[str, Any] = {"application/json": {"schema": schema(model)}}
+    if ndjson_item is not None:
+        content[NDJSON_MEDIA_TYPE] = {"schema": schema(ndjson_item)}
+    if columnar:
+        for media_types in COLUMNAR_MEDIA_TYPES.values():
+            content[media_types[0]] = {"schema": {"type": "string", "format": "binary"}}
+    return {"requestBody": {"required": True, "content": content}}
+
+def _inventory_item(request: InventoryOptimizationRequest) -> Dict[str, Any]:
+    """Map an API request onto predict_inventory_optimization arguments"""
+    item = {
+        "medicine_id": request.medicine_id,
+        "quantity_received": int(request.current_stock),
+        "unit_cost": request.price,
+        "days_until_expiry": request.days_until_expiry,
+        "days_since_last_order": request.days_since_last_order,
+        "order_count": request.order_count,
+        "historical_qty_data": request.historical_qty_data
+    }
+    if request.as_of is not None:
+        item["as_of"] = request.as_of.isoformat()
+    return item
+
+def _inventory_items(requests: List[InventoryOptimizationRequest]) -> List[Dict[str, Any]]:
+    """_inventory_item for many requests, with the feature store's order history attached"""
+    return attach_stored_order_history([_inventory_item(request) for request in requests])
+
+def _expiry_item(request: ExpiryPredictionRequest) -> Dict[str, Any]:
+    """Map an API request onto predict_expiry_risk arguments"""
+    return {
+        "medicine_id": request.medicine_id,
+        "supplier": request.supplier_id,
+        "days_until_expiry": request.days_until_expiry,
+        "stock_quantity": int(request.stock_quantity),
+        "unit_price": request.unit_price,
+        "estimated_daily_usage": request.avg_daily_sales
+    }
+
+def _expiry_items(requests: List[ExpiryPredictionRequest]) -> List[Dict[str, Any]]:
+    """_expiry_item for many requests"""
+    return [_expiry_item(request) for request in requests]
+
 @app.post("/inventory/optimize")
 async def optimize_inventory_endpoint(request: InventoryOptimizationRequest):
     """Get optimal stock level recommendation for a medicine"""
-    result = predict_inventory_optimization(
-        medicine_id=request.medicine_id,
-        quantity_received=int(request.current_stock),
-        unit_cost=request.price,
-        days_until_expiry=request.days_until_expiry,
-        days_since_last_order=request.days_since_last_order,
-        order_count=request.order_count,
-        historical_qty_data=request.historical_qty_data
-    )
+    item = _inventory_items([request])[0]
+    batcher = get_batcher("inventory")
+    if batcher is not None:
+        # Coalesced with concurrent requests into one matrix prediction
+        result = await batcher.submit(item)
+    else:
+        result = await run_inference("inventory_lgb", predict_inventory_optimization, **item)
     
     if result is None:
         raise HTTPException(status_code=503, detail="Inventory optimization model not available")
     return result
 
-@app.post("/inventory/optimize/batch")
-async def batch_optimize_inventory_endpoint(request: BatchInventoryRequest):
-    """Batch optimize inventory"""
-    results = []
-    for item in request.medicines:
-        res = predict_inventory_optimization(
-            medicine_id=item.medicine_id,
-            quantity_received=int(item.current_stock),
-            unit_cost=item.price,
-            days_until_expiry=item.days_until_expiry,
-            days_since_last_order=item.days_since_last_order,
-            order_count=item.order_count,
-            historical_qty_data=item.historical_qty_data
+@app.post("/inventory/optimize/batch", openapi_extra=_body_schema(BatchInventoryRequest, columnar=True))
+async def batch_optimize_inventory_endpoint(request: Request):
+    """
+    Batch optimize inventory (single model call for the whole batch).
+    Accepts {"medicines": [...]} JSON, or an Arrow IPC / Parquet table with
+    one column per request field (answered in the same format unless Accept says otherwise).
+    """
+    fmt = columnar_format(request.headers.get("content-type"))
+    if fmt is not None:
+        return await score_columnar(
+            request, fmt, "inventory_lgb", predict_inventory_optimization_columns,
+            INVENTORY_COLUMNS, with_history=True, with_as_of=True
         )
+
+    batch = await _parse_json_body(request, BatchInventoryRequest)
+    items = _inventory_items(batch.medicines)
+    predictions = await run_inference("inventory_lgb", predict_inventory_optimization_batch, items)
+    results = []
+    for item, res in zip(batch.medicines, predictions):
         if res:
             results.append(res)
         else:
             results.append({"medicine_id": item.medicine_id, "error": "Prediction failed"})
     return {"results": results}
 
+@app.post(
+    "/inventory/optimize/batch/stream",
+    openapi_extra=_body_schema(BatchInventoryRequest, ndjson_item=InventoryOptimizationRequest)
+)
+async def stream_optimize_inventory_endpoint(request: Request):
+    """
+    Batch optimize inventory with no item cap. Accepts NDJSON (one item per line)
+    or {"medicines": [...]}; results stream back as NDJSON chunk by chunk.
+    """
+    items = await open_request_items(request, InventoryOptimizationRequest, "medicines")
+    return NDJSONStreamingResponse(
+        stream_batch_results(items, "inventory_lgb", predict_inventory_optimization_batch, _inventory_items)
+    )
+
 @app.post("/expiry/predict")
 async def predict_expiry_endpoint(request: ExpiryPredictionRequest):
     """Predict probability of medicine expiring"""
-    result = predict_expiry_risk(
-        medicine_id=request.medicine_id,
-        supplier=request.supplier_id,
-        days_until_expiry=request.days_until_expiry,
-        stock_quantity=int(request.stock_quantity),
-        unit_price=request.unit_price,
-        estimated_daily_usage=request.avg_daily_sales
-    )
+    item = _expiry_item(request)
+    batcher = get_batcher("expiry")
+    if batcher is not None:
+        # Coalesced with concurrent requests into one matrix prediction
+        result = await batcher.submit(item)
+    else:
+        result = await run_inference("expiry_xgb", predict_expiry_risk, **item)
     
     if result is None:
         raise HTTPException(status_code=503, detail="Expiry prediction model not available")
     return result
 
-@app.post("/expiry/predict/batch")
-async def batch_predict_expiry_endpoint(request: BatchExpiryRequest):
-    """Batch predict expiry risk"""
-    results = []
-    for item in request.medicines:
-        res = predict_expiry_risk(
-            medicine_id=item.medicine_id,
-            supplier=item.supplier_id,
-            days_until_expiry=item.days_until_expiry,
-            stock_quantity=int(item.stock_quantity),
-            unit_price=item.unit_price,
-            estimated_daily_usage=item.avg_daily_sales
+@app.post("/expiry/predict/batch", openapi_extra=_body_schema(BatchExpiryRequest, columnar=True))
+async def batch_predict_expiry_endpoint(request: Request):
+    """
+    Batch predict expiry risk (single model call for the whole batch).
+    Accepts {"medicines": [...]} JSON, or an Arrow IPC / Parquet table with
+    one column per request field (answered in the same format unless Accept says otherwise).
+    """
+    fmt = columnar_format(request.headers.get("content-type"))
+    if fmt is not None:
+        return await score_columnar(
+            request, fmt, "expiry_xgb", predict_expiry_risk_columns, EXPIRY_COLUMNS
         )
+
+    batch = await _parse_json_body(request, BatchExpiryRequest)
+    items = _expiry_items(batch.medicines)
+    predictions = await run_inference("expiry_xgb", predict_expiry_risk_batch, items)
+    results = []
+    for item, res in zip(batch.medicines, predictions):
         if res:
             results.append(res)
         else:
             results.append({"medicine_id": item.medicine_id, "error": "Prediction failed"})
     return {"results": results}
+
+@app.post(
+    "/expiry/predict/batch/stream",
+    openapi_extra=_body_schema(BatchExpiryRequest, ndjson_item=ExpiryPredictionRequest)
+)
+async def stream_predict_expiry_endpoint(request: Request):
+    """
+    Batch predict expiry risk with no item cap. Accepts NDJSON (one item per line)
+    or {"medicines": [...]}; results stream back as NDJSON chunk by chunk.
+    """
+    items = await open_request_items(request, ExpiryPredictionRequest, "medicines")
+    return NDJSONStreamingResponse(
+        stream_batch_results(items, "expiry_xgb", predict_expiry_risk_batch, _expiry_items)
+    )
+
+def _scenario_axes(ranges: Dict[str, ScenarioRange], specs: List[ColumnSpec]) -> List[Tuple[str, List[float]]]:
+    """Map what-if ranges onto service item keys, truncating the fields the item mapping int()s"""
+    by_name = {spec.name: spec for spec in specs}
+    axes = []
+    for name, axis in ranges.items():
+        spec = by_name[name]
+        values = axis.grid_values()
+        axes.append((spec.target, [float(int(v)) for v in values] if spec.truncate else values))
+    return axes
+
+@app.post("/inventory/scenarios")
+async def inventory_scenarios_endpoint(request: InventoryScenarioRequest):
+    """
+    What-if surface for one medicine: optimal stock, reorder quantity and days
+    of stock over the Cartesian grid of the given ranges, scored in one model call.
+    """
+    axes = _scenario_axes(request.ranges, INVENTORY_COLUMNS)
+    result = await run_inference("inventory_lgb", inventory_scenarios, _inventory_item(request.base), axes)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Inventory optimization model not available")
+    return result
+
+@app.post("/expiry/scenarios")
+async def expiry_scenarios_endpoint(request: ExpiryScenarioRequest):
+    """
+    What-if surface for one medicine: expiry risk probability and potential
+    waste over the Cartesian grid of the given ranges, scored in one model call.
+    """
+    axes = _scenario_axes(request.ranges, EXPIRY_COLUMNS)
+    result = await run_inference("expiry_xgb", expiry_scenarios, _expiry_item(request.base), axes)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Expiry prediction model not available")
+    return result
+
+async def _load_catalog(request: CatalogIngestRequest) -> Dict[str, Any]:
+    """Pull the catalog aggregates from ML_DATABASE_URL (off the event loop)"""
+    pool = get_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="No database configured (set ML_DATABASE_URL)")
+    # A backdated catalog is rebuilt as it stood at the end of the as_of day (UTC)
+    now = datetime.combine(request.as_of, datetime.max.time()) if request.as_of else None
+    return await run_in_threadpool(load_catalog_aggregates, pool, request.organization_id, now)
+
+def _catalog_rows(product_ids: List[str], columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn per-product arrays into one JSON row per product"""
+    lists = {name: values.tolist() for name, values in columns.items()}
+    return [
+        {"product_id": product_id, **{name: values[i] for name, values in lists.items()}}
+        for i, product_id in enumerate(product_ids)
+    ]
+
+@app.post("/catalog/features")
+async def catalog_features_endpoint(request: CatalogIngestRequest):
+    """Per-medicine model inputs for the whole catalog, computed from the database in one pass"""
+    aggregates = await _load_catalog(request)
+    product_ids = aggregates.pop("product_id")
+    return {"medicines": _catalog_rows(product_ids, aggregates)}
+
+@app.post("/catalog/inventory/optimize")
+async def catalog_optimize_inventory_endpoint(request: CatalogIngestRequest):
+    """Inventory optimization for every medicine in the database (one ingestion, one model call)"""
+    aggregates = await _load_catalog(request)
+    if not aggregates["product_id"]:
+        return {"results": []}
+    results = await run_inference(
+        "inventory_lgb", predict_inventory_optimization_columns,
+        inventory_columns(aggregates, epoch_day(request.as_of) if request.as_of else None)
+    )
+    if results is None:
+        raise HTTPException(status_code=503, detail="Inventory optimization model not available")
+    return {"results": _catalog_rows(aggregates["product_id"], results)}
+
+@app.post("/catalog/expiry/predict")
+async def catalog_predict_expiry_endpoint(request: CatalogIngestRequest):
+    """Expiry risk for every medicine in the database (one ingestion, one model call)"""
+    aggregates = await _load_catalog(request)
+    if not aggregates["product_id"]:
+        return {"results": []}
+    results = await run_inference("expiry_xgb", predict_expiry_risk_columns, expiry_columns(aggregates))
+    if results is None:
+        raise HTTPException(status_code=503, detail="Expiry prediction model not available")
+    return {"results": _catalog_rows(aggregates["product_id"], results)}
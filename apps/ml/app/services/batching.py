@@ -0,0 +1,138 @@
+"""
+Micro-batching - Coalesces concurrent single-item requests into one model call
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.executor import run_inference
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: ML_BATCHING_ENABLED=true groups single-item calls arriving within
+# ML_BATCH_WINDOW_MS (or up to ML_MAX_BATCH_SIZE items) into one prediction
+BATCHING_ENABLED = os.getenv("ML_BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+BATCH_WINDOW_MS = float(os.getenv("ML_BATCH_WINDOW_MS", "3"))
+MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "64"))
+
+# Upper bounds of the achieved batch-size histogram
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class MicroBatcher:
+    """Groups items submitted within a short window and scores them together"""
+
+    def __init__(
+        self,
+        model_key: str,
+        batch_fn: Callable[[List[Dict[str, Any]]], List[Optional[Dict[str, Any]]]],
+        window_ms: float = BATCH_WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE
+    ):
+        self.model_key = model_key
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+        # Achieved batch sizes
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+        self.size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    async def submit(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue one item and wait for its result from the shared batch call"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        self._record(len(batch))
+        try:
+            results = await run_inference(self.model_key, self.batch_fn, [item for item, _ in batch])
+        except Exception as e:
+            # Fan the failure (e.g. InferenceRejected) out to every caller
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int) -> None:
+        self.batches += 1
+        self.items += size
+        self.max_seen = max(self.max_seen, size)
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= bound:
+                self.size_counts[i] += 1
+                break
+        else:
+            self.size_counts[-1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Achieved batch-size statistics"""
+        labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_batch_size_seen": self.max_seen,
+            "batch_size_histogram": dict(zip(labels, self.size_counts)),
+        }
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def register_batcher(
+    name: str,
+    model_key: str,
+    batch_fn: Callable[[List[Dict[str, Any]]], List[Optional[Dict[str, Any]]]]
+) -> MicroBatcher:
+    """Create (or return) the batcher for an endpoint"""
+    if name not in _batchers:
+        _batchers[name] = MicroBatcher(model_key, batch_fn)
+    return _batchers[name]
+
+
+def get_batcher(name: str) -> Optional[MicroBatcher]:
+    """Get a registered batcher, None when batching is disabled"""
+    return _batchers.get(name) if BATCHING_ENABLED else None
+
+
+def get_batching_stats() -> Dict[str, Any]:
+    """Get configuration and achieved batch sizes of all batchers"""
+    return {
+        "enabled": BATCHING_ENABLED,
+        "window_ms": BATCH_WINDOW_MS,
+        "max_batch_size": MAX_BATCH_SIZE,
+        "endpoints": {name: batcher.stats() for name, batcher in _batchers.items()},
+    }
@@ -0,0 +1,111 @@
+"""
+Calendar Table - Per-day calendar features precomputed for a multi-year range
+
+Days are indexed by epoch day (days since 1970-01-01), so looking up the
+calendar features of any batch of dates is one fancy-indexing operation.
+"""
+import threading
+from datetime import date
+from typing import Any, Dict, Optional
+
+# Range covered by the precomputed table (dates outside it are computed on the fly)
+CALENDAR_START = date(2000, 1, 1)
+CALENDAR_END = date(2060, 12, 31)
+
+_EPOCH = date(1970, 1, 1)
+
+_table: Optional[Dict[str, Dict[str, Any]]] = None
+_table_lock = threading.Lock()
+
+
+def epoch_day(value: Any) -> int:
+    """Days since 1970-01-01 for a date, datetime or ISO date string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif hasattr(value, "date"):
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+def epoch_days(values: Any):
+    """epoch_day for a scalar, or an int64 array for a sequence / array of dates (ints pass through)"""
+    import numpy as np
+
+    if isinstance(values, (str, date)):
+        return epoch_day(values)
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values.astype(np.int64)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[D]").astype(np.int64)
+    return np.fromiter((epoch_day(v) for v in values.ravel()), dtype=np.int64, count=values.size).reshape(values.shape)
+
+
+def _build(first_day: int, n_days: int) -> Dict[str, Dict[str, Any]]:
+    """Calendar features for n_days consecutive epoch days, grouped by model"""
+    import numpy as np
+
+    days = np.arange(first_day, first_day + n_days, dtype=np.int64)
+    months = days.astype("datetime64[D]").astype("datetime64[M]")
+    month_start = months.astype("datetime64[D]").astype(np.int64)
+    day = days - month_start + 1
+    days_in_month = (months + 1).astype("datetime64[D]").astype(np.int64) - month_start
+    month = months.astype(np.int64) % 12 + 1
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+    quarter_first_month = month % 3 == 1
+    quarter_last_month = month % 3 == 0
+
+    small = np.int16
+    return {
+        # Inventory model: training approximated month / quarter boundaries by +-3 days
+        "inventory": {
+            "day_of_week": weekday.astype(small),
+            "day_of_month": day.astype(small),
+            "month": month.astype(small),
+            "quarter": ((month - 1) // 3 + 1).astype(small),
+            "is_weekend": (weekday >= 5).astype(small),
+            "is_month_start": (day <= 3).astype(small),
+            "is_month_end": (day >= 28).astype(small),
+            "is_quarter_start": (quarter_first_month & (day <= 3)).astype(small),
+            "is_quarter_end": (quarter_last_month & (day >= 28)).astype(small),
+        },
+        # Weekly demand models: exact boundaries, as pandas' .dt accessors report them
+        "demand": {
+            "is_month_start": (day == 1).astype(small),
+            "is_month_end": (day == days_in_month).astype(small),
+            "is_quarter_start": (quarter_first_month & (day == 1)).astype(small),
+            "is_quarter_end": (quarter_last_month & (day == days_in_month)).astype(small),
+            "week_of_month": (day // 7 + 1).astype(small),
+            "month": month.astype(small),
+        },
+    }
+
+
+def get_calendar_table() -> Dict[str, Dict[str, Any]]:
+    """The precomputed table for CALENDAR_START..CALENDAR_END (built on first use)"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = _build(epoch_day(CALENDAR_START), (CALENDAR_END - CALENDAR_START).days + 1)
+    return _table
+
+
+def calendar_features(name: str, days: Any) -> Dict[str, Any]:
+    """
+    Calendar features ('inventory' or 'demand') for an array of epoch days,
+    as {feature name: array shaped like days}.
+    """
+    import numpy as np
+
+    days = np.asarray(days, dtype=np.int64)
+    first = epoch_day(CALENDAR_START)
+    offsets = days - first
+    table = get_calendar_table()[name]
+    size = len(next(iter(table.values())))
+    if days.size and (offsets.min() < 0 or offsets.max() >= size):
+        # Outside the precomputed range - build just the span these days need
+        first = int(days.min())
+        offsets = days - first
+        table = _build(first, int(days.max()) - first + 1)[name]
+    return {col: values[offsets] for col, values in table.items()}
@@ -0,0 +1,164 @@
+"""
+Inference Executor - Runs blocking model inference off the asyncio event loop
+"""
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services.metrics import INFERENCE_IN_FLIGHT, INFERENCE_REJECTED
+from app.services.model_versions import record_request_versions, track_model_versions
+
+logger = logging.getLogger(__name__)
+
+# Executor configuration (environment overridable)
+# ML_EXECUTOR_KIND: "thread" (default - LightGBM, XGBoost and NumPy release the GIL)
+#                   or "process" (each worker loads its own copy of the models)
+EXECUTOR_KIND = os.getenv("ML_EXECUTOR_KIND", "thread").lower()
+EXECUTOR_WORKERS = int(os.getenv("ML_EXECUTOR_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Max requests admitted (running + waiting) before new ones get 429
+MAX_QUEUE_DEPTH = int(os.getenv("ML_EXECUTOR_MAX_QUEUE", "64"))
+# Max seconds a request waits for a model slot before it gets 503
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ML_EXECUTOR_QUEUE_TIMEOUT", "5"))
+
+# Per-model concurrency limits, override with ML_MODEL_CONCURRENCY="demand_prophet=1,expiry_xgb=8"
+DEFAULT_MODEL_CONCURRENCY: Dict[str, int] = {
+    "demand_prophet": 1,
+    "demand_lgb": 2,
+    "demand_stacking": 2,
+    "inventory_lgb": 4,
+    "expiry_xgb": 4,
+}
+
+_executor: Optional[Executor] = None
+_model_limits: Dict[str, int] = {}
+_model_semaphores: Dict[str, asyncio.Semaphore] = {}
+_model_in_flight: Dict[str, int] = {}
+_pending = 0
+_rejected = 0
+
+
+class InferenceRejected(Exception):
+    """Raised when the executor is saturated and a request must be shed"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _parse_model_concurrency(value: str) -> Dict[str, int]:
+    """Parse 'model=n,model=n' into a dict of limits"""
+    limits = dict(DEFAULT_MODEL_CONCURRENCY)
+    for part in value.split(","):
+        if "=" not in part:
+            continue
+        key, limit = part.split("=", 1)
+        try:
+            limits[key.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning(f"Ignoring invalid model concurrency '{part}'")
+    return limits
+
+
+def start_executor(initializer: Optional[Callable[[], Any]] = None) -> None:
+    """
+    Create the inference pool - call once at startup.
+    initializer runs in every worker process (process mode only), e.g. load_ml_models.
+    """
+    global _executor, _model_limits
+
+    if _executor is not None:
+        return
+
+    if EXECUTOR_KIND == "process":
+        _executor = ProcessPoolExecutor(max_workers=EXECUTOR_WORKERS, initializer=initializer)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="inference")
+
+    _model_limits = _parse_model_concurrency(os.getenv("ML_MODEL_CONCURRENCY", ""))
+    _model_semaphores.clear()
+    logger.info(
+        f"Inference executor started: {EXECUTOR_KIND} pool, {EXECUTOR_WORKERS} workers, "
+        f"max queue {MAX_QUEUE_DEPTH}"
+    )
+
+
+def shutdown_executor() -> None:
+    """Stop the inference pool, letting running jobs finish"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def _get_semaphore(model_key: str) -> asyncio.Semaphore:
+    semaphore = _model_semaphores.get(model_key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(_model_limits.get(model_key, EXECUTOR_WORKERS))
+        _model_semaphores[model_key] = semaphore
+    return semaphore
+
+
+async def run_inference(model_key: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking inference call on the pool without stalling the event loop.
+    Raises InferenceRejected (429) when the queue is full, or (503) when no
+    slot for the model frees up within QUEUE_TIMEOUT_SECONDS.
+    The model versions the call used are added to the current request.
+    """
+    global _pending, _rejected
+
+    if _executor is None:
+        # Executor not started (e.g. scripts / tests) - run inline
+        result, versions = track_model_versions(fn, *args, **kwargs)
+        record_request_versions(versions)
+        return result
+
+    if _pending >= MAX_QUEUE_DEPTH:
+        _rejected += 1
+        INFERENCE_REJECTED.labels(model=model_key, status="429").inc()
+        raise InferenceRejected(429, "ML service is at capacity, retry later")
+
+    _pending += 1
+    try:
+        semaphore = _get_semaphore(model_key)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _rejected += 1
+            INFERENCE_REJECTED.labels(model=model_key, status="503").inc()
+            raise InferenceRejected(503, f"Timed out waiting for model '{model_key}'")
+
+        _model_in_flight[model_key] = _model_in_flight.get(model_key, 0) + 1
+        INFERENCE_IN_FLIGHT.labels(model=model_key).inc()
+        try:
+            loop = asyncio.get_running_loop()
+            result, versions = await loop.run_in_executor(
+                _executor, functools.partial(track_model_versions, fn, *args, **kwargs)
+            )
+            record_request_versions(versions)
+            return result
+        finally:
+            _model_in_flight[model_key] -= 1
+            INFERENCE_IN_FLIGHT.labels(model=model_key).dec()
+            semaphore.release()
+    finally:
+        _pending -= 1
+
+
+def get_executor_status() -> Dict[str, Any]:
+    """Get queue depth and per-model load of the inference pool"""
+    return {
+        "kind": EXECUTOR_KIND,
+        "running": _executor is not None,
+        "workers": EXECUTOR_WORKERS,
+        "pending": _pending,
+        "max_queue_depth": MAX_QUEUE_DEPTH,
+        "rejected": _rejected,
+        "model_limits": dict(_model_limits),
+        "model_in_flight": dict(_model_in_flight),
+    }
@@ -0,0 +1,263 @@
+"""
+Feature Store - Incremental per-medicine order and weekly sales statistics
+"""
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.services.features import HISTORY_LENGTH, WEEKLY_HISTORY
+
+logger = logging.getLogger(__name__)
+
+# Feature store configuration (environment overridable)
+FEATURE_STORE_ENABLED = os.getenv("ML_FEATURE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+FEATURE_STORE_PATH = Path(os.getenv(
+    "ML_FEATURE_STORE_PATH", str(Path(__file__).parent.parent.parent / "data" / "feature_store.npz")
+))
+# Seconds between background snapshots (0 = only on shutdown / on demand)
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("ML_FEATURE_STORE_SNAPSHOT_SECONDS", "300"))
+
+# Marks an empty week slot (sorts before every real week)
+NO_WEEK = -(2 ** 62)
+INITIAL_CAPACITY = 1024
+
+
+class FeatureStore:
+    """
+    Per-medicine state, updated one event at a time in O(1):
+    - receipts (orders): the last HISTORY_LENGTH quantities in a ring, oldest ->
+      newest like historical_qty_data, plus running count / sum / sum of
+      squares over the whole history
+    - sales: the last WEEKLY_HISTORY observed Monday-start weeks (units, records)
+    State lives in dense NumPy arrays (one row per medicine) so batch reads are
+    single fancy-indexing operations.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._lock = threading.RLock()
+        self._slots: Dict[int, int] = {}
+        self.revision = 0
+        self._alloc(max(1, capacity))
+
+    def _alloc(self, capacity: int) -> None:
+        import numpy as np
+
+        self.order_ring = np.zeros((capacity, HISTORY_LENGTH))
+        self.order_count = np.zeros(capacity, dtype=np.int64)
+        self.order_sum = np.zeros(capacity)
+        self.order_sumsq = np.zeros(capacity)
+        self.last_order_day = np.full(capacity, np.nan)
+        self.week_start = np.full((capacity, WEEKLY_HISTORY), NO_WEEK, dtype=np.int64)
+        self.week_qty = np.zeros((capacity, WEEKLY_HISTORY))
+        self.week_records = np.zeros((capacity, WEEKLY_HISTORY))
+
+    def _grow(self) -> None:
+        old = {name: getattr(self, name) for name in self._array_names()}
+        capacity = len(self.order_count) * 2
+        self._alloc(capacity)
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    @staticmethod
+    def _array_names() -> Tuple[str, ...]:
+        return (
+            "order_ring", "order_count", "order_sum", "order_sumsq", "last_order_day",
+            "week_start", "week_qty", "week_records",
+        )
+
+    def _slot(self, medicine_id: int) -> int:
+        slot = self._slots.get(medicine_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= len(self.order_count):
+                self._grow()
+            self._slots[medicine_id] = slot
+        return slot
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def record_receipt(self, medicine_id: int, day: int, qty: float) -> None:
+        """Add one received order (events are expected in time order per medicine)"""
+        with self._lock:
+            s = self._slot(int(medicine_id))
+            ring = self.order_ring[s]
+            ring[:-1] = ring[1:]
+            ring[-1] = qty
+            self.order_count[s] += 1
+            self.order_sum[s] += qty
+            self.order_sumsq[s] += qty * qty
+            if not day <= self.last_order_day[s]:  # also true while it is NaN
+                self.last_order_day[s] = day
+            self.revision += 1
+
+    def record_sale(self, medicine_id: int, day: int, qty: float) -> None:
+        """Add one sale record to its Monday-start week (late records within the window are merged)"""
+        with self._lock:
+            s = self._slot(int(medicine_id))
+            week = day - (day + 3) % 7
+            starts = self.week_start[s]
+            qty_row, records_row = self.week_qty[s], self.week_records[s]
+
+            if week > starts[-1]:
+                # New latest week - drop the oldest
+                for row in (starts, qty_row, records_row):
+                    row[:-1] = row[1:]
+                starts[-1], qty_row[-1], records_row[-1] = week, 0.0, 0.0
+                k = WEEKLY_HISTORY - 1
+            else:
+                k = int(starts.searchsorted(week))
+                if starts[k] != week:
+                    if k == 0:
+                        # Older than every kept week, and the window is full - no feature sees it
+                        return
+                    # Missing week inside the window: shift older weeks left, insert at k - 1
+                    for row in (starts, qty_row, records_row):
+                        row[:k - 1] = row[1:k]
+                    k -= 1
+                    starts[k], qty_row[k], records_row[k] = week, 0.0, 0.0
+
+            qty_row[k] += qty
+            records_row[k] += 1
+            self.revision += 1
+
+    def order_history_stats(self, medicine_ids: Iterable[int], fallback):
+        """
+        (tail, total, mean, std, found) for a batch, like features.order_history_matrix.
+        Medicines with fewer than HISTORY_LENGTH receipts get the fallback
+        quantity repeated, same rule as request-supplied histories.
+        found flags medicines the store has receipts for.
+        """
+        import numpy as np
+
+        fallback = np.asarray(fallback, dtype=np.float64)
+        with self._lock:
+            slots = np.fromiter((self._slots.get(int(m), -1) for m in medicine_ids), dtype=np.int64)
+            found = slots >= 0
+            safe = np.where(found, slots, 0)
+            count = np.where(found, self.order_count[safe], 0)
+            tail = self.order_ring[safe].copy()
+            total = self.order_sum[safe].copy()
+            sumsq = self.order_sumsq[safe].copy()
+        found &= count > 0
+
+        full = count >= HISTORY_LENGTH
+        mean = np.where(full, total / np.maximum(count, 1), fallback)
+        std = np.where(full, np.sqrt(np.maximum(0.0, sumsq / np.maximum(count, 1) - mean ** 2)), 0.0)
+        tail[~full] = fallback[~full, None]
+        total = np.where(full, total, fallback * HISTORY_LENGTH)
+        return tail, total, mean, std, found
+
+    def weekly_history(self, medicine_ids: Iterable[int]):
+        """(Y, C, last_week, found) for features.weekly_demand_features, NaN where weeks are missing"""
+        import numpy as np
+
+        with self._lock:
+            slots = np.fromiter((self._slots.get(int(m), -1) for m in medicine_ids), dtype=np.int64)
+            safe = np.where(slots >= 0, slots, 0)
+            starts = self.week_start[safe]
+            Y = self.week_qty[safe].copy()
+            C = self.week_records[safe].copy()
+
+        missing = (starts == NO_WEEK) | (slots < 0)[:, None]
+        Y[missing] = np.nan
+        C[missing] = np.nan
+        found = ~missing[:, -1]
+        return Y, C, starts[:, -1], found
+
+    def snapshot(self, path: Path) -> None:
+        """Write the store to an .npz file atomically"""
+        import numpy as np
+
+        with self._lock:
+            n = len(self._slots)
+            ids = np.empty(n, dtype=np.int64)
+            for medicine_id, slot in self._slots.items():
+                ids[slot] = medicine_id
+            arrays = {name: getattr(self, name)[:n].copy() for name in self._array_names()}
+            revision = self.revision
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp_path, medicine_ids=ids, revision=np.int64(revision), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureStore":
+        """Restore a store written by snapshot()"""
+        import numpy as np
+
+        with np.load(path) as data:
+            ids = data["medicine_ids"]
+            store = cls(capacity=max(INITIAL_CAPACITY, 2 * len(ids)))
+            for name in cls._array_names():
+                getattr(store, name)[:len(ids)] = data[name]
+            store._slots = {int(m): i for i, m in enumerate(ids)}
+            store.revision = int(data["revision"])
+        return store
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"medicines": len(self._slots), "revision": self.revision}
+
+
+_store: Optional[FeatureStore] = None
+_store_lock = threading.Lock()
+_snapshot_stop = threading.Event()
+_snapshot_revision = -1
+
+
+def get_feature_store() -> Optional[FeatureStore]:
+    """The process-wide store (restored from the last snapshot), None if disabled"""
+    global _store
+    if not FEATURE_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore()
+            if FEATURE_STORE_PATH.exists():
+                try:
+                    _store = FeatureStore.load(FEATURE_STORE_PATH)
+                    logger.info(f"  [OK] Feature store restored: {len(_store)} medicines from {FEATURE_STORE_PATH.name}")
+                except Exception as e:
+                    logger.warning(f"  [FAIL] Could not restore feature store from {FEATURE_STORE_PATH}: {e}")
+        return _store
+
+
+def save_feature_store() -> bool:
+    """Snapshot the store to FEATURE_STORE_PATH if it changed. Returns True if written."""
+    global _snapshot_revision
+    store = _store
+    if store is None or store.revision == _snapshot_revision:
+        return False
+    revision = store.revision
+    try:
+        store.snapshot(FEATURE_STORE_PATH)
+    except Exception as e:
+        logger.error(f"Feature store snapshot failed: {e}")
+        return False
+    _snapshot_revision = revision
+    return True
+
+
+def start_snapshot_thread() -> Optional[threading.Thread]:
+    """Snapshot the store every SNAPSHOT_INTERVAL_SECONDS in the background"""
+    if not FEATURE_STORE_ENABLED or SNAPSHOT_INTERVAL_SECONDS <= 0:
+        return None
+    _snapshot_stop.clear()
+
+    def _run() -> None:
+        while not _snapshot_stop.wait(SNAPSHOT_INTERVAL_SECONDS):
+            save_feature_store()
+
+    thread = threading.Thread(target=_run, name="feature-store-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_snapshot_thread() -> None:
+    """Stop background snapshots and write a final one"""
+    _snapshot_stop.set()
+    save_feature_store()
@@ -0,0 +1,484 @@
+"""
+Feature Pipeline - Builds model feature matrices for whole batches with NumPy
+"""
+import json
+import logging
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.services.calendar_table import calendar_features, epoch_days
+
+logger = logging.getLogger(__name__)
+
+# Feature-list JSONs live next to the model artifacts
+FEATURES_PATH = Path(__file__).parent.parent.parent / "models"
+
+FEATURE_FILES = {
+    "inventory": "inventory_features.json",
+    "expiry": "expiry_features.json",
+    "demand": "demand_features.json",
+}
+
+# Columns each builder can compute (training order, used until the JSONs are loaded)
+DEFAULT_FEATURE_COLS: Dict[str, List[str]] = {
+    "inventory": [
+        'medicine_id', 'quantity_received', 'unit_cost', 'total_cost', 'days_until_expiry',
+        'day_of_week', 'day_of_month', 'month', 'quarter', 'is_weekend', 'is_month_start',
+        'is_month_end', 'is_quarter_start', 'is_quarter_end', 'days_since_last_order',
+        'qty_rolling_2orders_mean', 'qty_rolling_2orders_std', 'qty_rolling_2orders_max',
+        'qty_rolling_2orders_min', 'qty_rolling_3orders_mean', 'qty_rolling_3orders_std',
+        'qty_rolling_3orders_max', 'qty_rolling_3orders_min', 'qty_rolling_5orders_mean',
+        'qty_rolling_5orders_std', 'qty_rolling_5orders_max', 'qty_rolling_5orders_min',
+        'qty_lag_1', 'qty_lag_2', 'qty_lag_3', 'cumulative_qty', 'cumulative_cost',
+        'avg_order_cycle_days', 'estimated_daily_demand', 'avg_unit_cost', 'unit_cost_diff_from_avg',
+        'unit_cost_volatility', 'order_count', 'demand_cv', 'lead_time_days',
+        'demand_cost_interaction', 'volatility_lead_time', 'cost_per_day_inventory',
+        'stock_turnover_ratio', 'medicine_popularity'
+    ],
+    "expiry": [
+        'medicine_id', 'supplier', 'days_until_expiry', 'stock_quantity',
+        'unit_price', 'total_value', 'estimated_daily_usage', 'days_to_sellout',
+        'months_until_expiry', 'stock_rotation_ratio', 'is_fast_moving',
+        'is_expensive', 'is_large_batch', 'is_short_shelf_life'
+    ],
+    # Weekly demand models (demand_lgb and the stacking ensemble share this list)
+    "demand": [
+        "cost", "order_count", "medicine_count", "is_month_start", "is_month_end",
+        "is_quarter_start", "is_quarter_end", "week_of_month", "month",
+        "y_rolling_4w", "y_rolling_8w", "y_rolling_12w", "y_lag_1w", "y_lag_4w",
+        "order_count_trend", "avg_order_size", "y_volatility"
+    ],
+}
+
+# Rolling windows over the last N orders used by the inventory model
+ROLLING_WINDOWS = (2, 3, 5)
+HISTORY_LENGTH = max(ROLLING_WINDOWS)
+
+# Rolling windows (weeks) used by the weekly demand models
+WEEKLY_WINDOWS = (4, 8, 12)
+WEEKLY_HISTORY = max(WEEKLY_WINDOWS)
+
+_feature_cols: Dict[str, List[str]] = {name: list(cols) for name, cols in DEFAULT_FEATURE_COLS.items()}
+_feature_index: Dict[str, Dict[str, int]] = {
+    name: {col: j for j, col in enumerate(cols)} for name, cols in _feature_cols.items()
+}
+
+
+def load_feature_columns(models_path: Path = FEATURES_PATH) -> Dict[str, List[str]]:
+    """
+    Load model column order from the feature-list JSONs - call once at startup.
+    A list naming columns the builders can't compute is rejected (defaults kept).
+    """
+    for name, filename in FEATURE_FILES.items():
+        path = models_path / filename
+        if not path.exists():
+            logger.warning(f"  Feature list not found at {path}, using built-in order")
+            continue
+        try:
+            with open(path) as f:
+                cols = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"  [FAIL] Failed to read {filename}: {e}")
+            continue
+
+        unknown = sorted(set(cols) - set(DEFAULT_FEATURE_COLS[name]))
+        if unknown:
+            logger.error(f"  [FAIL] {filename} lists features the pipeline can't build: {unknown}")
+            continue
+
+        _feature_cols[name] = list(cols)
+        _feature_index[name] = {col: j for j, col in enumerate(cols)}
+        logger.info(f"  [OK] {len(cols)} {name} features loaded from {filename}")
+
+    return get_all_feature_columns()
+
+
+def get_feature_columns(name: str) -> List[str]:
+    """Get the model column order for 'inventory', 'expiry' or 'demand'"""
+    return list(_feature_cols[name])
+
+
+def get_all_feature_columns() -> Dict[str, List[str]]:
+    return {name: list(cols) for name, cols in _feature_cols.items()}
+
+
+# A batch is either a list of item dicts or, for columnar input, a dict of
+# equal-length arrays keyed like the item fields. In a columnar batch,
+# historical_qty_data is a (flat_values, lengths) pair of arrays.
+Batch = Union[List[Dict[str, Any]], Dict[str, Any]]
+
+
+def batch_size(items: Batch) -> int:
+    """Number of rows in a batch"""
+    if isinstance(items, dict):
+        return len(items["medicine_id"])
+    return len(items)
+
+
+def _column(items: Batch, key: str, default: Optional[float] = None):
+    import numpy as np
+
+    if isinstance(items, dict):
+        values = items.get(key)
+        if values is None:
+            if default is None:
+                raise KeyError(key)
+            return np.full(batch_size(items), default, dtype=np.float64)
+        return np.asarray(values, dtype=np.float64)
+
+    if default is None:
+        return np.fromiter((item[key] for item in items), dtype=np.float64, count=len(items))
+    return np.fromiter((item.get(key, default) for item in items), dtype=np.float64, count=len(items))
+
+
+def order_history_matrix(histories: List[Optional[List[float]]], fallback):
+    """
+    Stack order histories into per-item statistics.
+    Each history is oldest -> newest: the last entry is the most recent order
+    (qty_lag_1), as in the original single-item code. This is the orientation of
+    historical_qty_data on every path (JSON, columnar list column, catalog
+    ingestion) and of the feature store's ring.
+    Histories shorter than HISTORY_LENGTH are replaced by the fallback quantity
+    repeated HISTORY_LENGTH times (same rule as the original single-item code).
+    Returns (tail, total, mean, std): the last HISTORY_LENGTH orders (oldest -> newest)
+    as an (n, HISTORY_LENGTH) array, plus sum/mean/std over each full history.
+    """
+    import numpy as np
+
+    n = len(histories)
+    lengths = np.fromiter((len(h) if h else 0 for h in histories), dtype=np.int64, count=n)
+    padded = lengths < HISTORY_LENGTH
+
+    if np.all(lengths[~padded] == HISTORY_LENGTH):
+        # Common case (the Node API sends exactly 5 orders): one rectangular array
+        tail = np.empty((n, HISTORY_LENGTH), dtype=np.float64)
+        if (~padded).any():
+            tail[~padded] = np.array([histories[i] for i in np.flatnonzero(~padded)], dtype=np.float64)
+        tail[padded] = np.asarray(fallback, dtype=np.float64)[padded, None]
+        return tail, tail.sum(axis=1), tail.mean(axis=1), tail.std(axis=1)
+
+    # Ragged histories: one flat array with per-item lengths
+    flat = np.fromiter(
+        (value for h in histories if h for value in h), dtype=np.float64, count=int(lengths.sum())
+    )
+    return order_history_flat(flat, lengths, fallback)
+
+
+def order_history_flat(flat, lengths, fallback):
+    """
+    order_history_matrix for histories already stored as one flat array plus
+    per-item lengths (e.g. an Arrow list column). Same orientation, padding rule
+    and outputs.
+    """
+    import numpy as np
+
+    flat = np.asarray(flat, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    fallback = np.asarray(fallback, dtype=np.float64)
+    padded = lengths < HISTORY_LENGTH
+
+    if padded.any():
+        # Swap short histories for the fallback quantity repeated HISTORY_LENGTH times
+        new_lengths = np.where(padded, HISTORY_LENGTH, lengths)
+        new_offsets = np.cumsum(new_lengths) - new_lengths
+        out = np.empty(int(new_lengths.sum()), dtype=np.float64)
+
+        kept_lengths = lengths[~padded]
+        kept = flat[np.repeat(~padded, lengths)]
+        within = np.arange(len(kept)) - np.repeat(np.cumsum(kept_lengths) - kept_lengths, kept_lengths)
+        out[np.repeat(new_offsets[~padded], kept_lengths) + within] = kept
+
+        pad_idx = (new_offsets[padded][:, None] + np.arange(HISTORY_LENGTH)).ravel()
+        out[pad_idx] = np.repeat(fallback[padded], HISTORY_LENGTH)
+        flat, lengths = out, new_lengths
+
+    offsets = np.cumsum(lengths) - lengths
+    ends = offsets + lengths
+
+    tail = flat[(ends - HISTORY_LENGTH)[:, None] + np.arange(HISTORY_LENGTH)]
+    total = np.add.reduceat(flat, offsets)
+    mean = total / lengths
+    std = np.sqrt(np.add.reduceat((flat - np.repeat(mean, lengths)) ** 2, offsets) / lengths)
+    return tail, total, mean, std
+
+
+def build_inventory_matrix(
+    items: Batch,
+    as_of: Union[date, Any],
+    history_stats: Optional[Tuple[Any, Any, Any, Any]] = None
+) -> Tuple[Any, Any, Any]:
+    """
+    Build the inventory feature matrix for a batch in one vectorized pass.
+    Items take the keyword arguments of predict_inventory_optimization
+    (or are a columnar batch of the same fields). as_of is the scoring date -
+    one date (or datetime) for the whole batch, or an array of epoch days per
+    row (backfills). history_stats, when given,
+    replaces historical_qty_data with precomputed (tail, total, mean, std)
+    as returned by order_history_matrix (e.g. from the feature store).
+    Returns (X, quantity_received, estimated_daily_demand); X is a preallocated
+    float32 matrix in the loaded inventory_features.json order.
+    """
+    import numpy as np
+
+    n = batch_size(items)
+    index = _feature_index["inventory"]
+    X = np.empty((n, len(index)), dtype=np.float32)
+
+    def put(col: str, values: Any) -> None:
+        j = index.get(col)
+        if j is not None:
+            X[:, j] = values
+
+    quantity = _column(items, "quantity_received")
+    unit_cost = _column(items, "unit_cost")
+    days_since_last_order = _column(items, "days_since_last_order", 30)
+    order_count = _column(items, "order_count", 10)
+
+    # Use historical data if provided, otherwise use quantity_received as proxy
+    if history_stats is not None:
+        tail, cumulative_qty, hist_mean, hist_std = history_stats
+    elif isinstance(items, dict):
+        history = items.get("historical_qty_data")
+        flat, lengths = history if history is not None else ([], np.zeros(n, dtype=np.int64))
+        tail, cumulative_qty, hist_mean, hist_std = order_history_flat(flat, lengths, quantity)
+    else:
+        tail, cumulative_qty, hist_mean, hist_std = order_history_matrix(
+            [item.get("historical_qty_data") for item in items], quantity
+        )
+    demand_cv = np.where(hist_mean > 0, hist_std / np.where(hist_mean > 0, hist_mean, 1.0), 0.2)
+    estimated_daily_demand = np.where(quantity > 0, quantity / 30.0, 1.0)
+
+    put('medicine_id', _column(items, "medicine_id"))
+    put('quantity_received', quantity)
+    put('unit_cost', unit_cost)
+    put('total_cost', quantity * unit_cost)
+    put('days_until_expiry', _column(items, "days_until_expiry", 180))
+
+    # Calendar features from the precomputed table (one row broadcasts to the batch)
+    for col, values in calendar_features("inventory", np.atleast_1d(epoch_days(as_of))).items():
+        put(col, values)
+    put('days_since_last_order', days_since_last_order)
+
+    for window in ROLLING_WINDOWS:
+        recent = tail[:, HISTORY_LENGTH - window:]
+        put(f'qty_rolling_{window}orders_mean', recent.mean(axis=1))
+        put(f'qty_rolling_{window}orders_std', recent.std(axis=1))
+        put(f'qty_rolling_{window}orders_max', recent.max(axis=1))
+        put(f'qty_rolling_{window}orders_min', recent.min(axis=1))
+
+    put('qty_lag_1', tail[:, -1])
+    put('qty_lag_2', tail[:, -2])
+    put('qty_lag_3', tail[:, -3])
+    put('cumulative_qty', cumulative_qty)
+    put('cumulative_cost', cumulative_qty * unit_cost)
+    put('avg_order_cycle_days', days_since_last_order)
+    put('estimated_daily_demand', estimated_daily_demand)
+    put('avg_unit_cost', unit_cost)  # Using current as average
+    put('unit_cost_diff_from_avg', 0)  # No difference if we only have current
+    put('unit_cost_volatility', unit_cost * 0.05)  # Assume 5% volatility
+    put('order_count', order_count)
+    put('demand_cv', demand_cv)
+    put('lead_time_days', 7)  # Standard lead time assumption
+    put('demand_cost_interaction', estimated_daily_demand * unit_cost)
+    put('volatility_lead_time', demand_cv * 7)
+    put('cost_per_day_inventory', unit_cost / 30.0)
+    put('stock_turnover_ratio', np.where(estimated_daily_demand > 0, 12.0, 1.0))  # Monthly turnover
+    put('medicine_popularity', np.minimum(1.0, order_count / 20.0))  # Normalized popularity
+
+    return X, quantity, estimated_daily_demand
+
+
+def build_expiry_matrix(items: Batch):
+    """
+    Build the expiry feature matrix for a batch in one vectorized pass.
+    Items take the keyword arguments of predict_expiry_risk
+    (or are a columnar batch of the same fields).
+    Returns a float32 matrix in the loaded expiry_features.json order.
+    """
+    import numpy as np
+
+    index = _feature_index["expiry"]
+    X = np.empty((batch_size(items), len(index)), dtype=np.float32)
+
+    def put(col: str, values: Any) -> None:
+        j = index.get(col)
+        if j is not None:
+            X[:, j] = values
+
+    days_until_expiry = _column(items, "days_until_expiry")
+    stock_quantity = _column(items, "stock_quantity")
+    unit_price = _column(items, "unit_price")
+    daily_usage = _column(items, "estimated_daily_usage")
+
+    # Calculate derived features to match training exactly
+    days_to_sellout = np.where(daily_usage > 0, stock_quantity / np.where(daily_usage > 0, daily_usage, 1.0), 999.0)
+    stock_rotation_ratio = np.where(
+        days_to_sellout > 0, days_until_expiry / np.where(days_to_sellout > 0, days_to_sellout, 1.0), 0.0
+    )
+
+    put('medicine_id', _column(items, "medicine_id"))
+    put('supplier', _column(items, "supplier"))
+    put('days_until_expiry', days_until_expiry)
+    put('stock_quantity', stock_quantity)
+    put('unit_price', unit_price)
+    put('total_value', stock_quantity * unit_price)
+    put('estimated_daily_usage', daily_usage)
+    put('days_to_sellout', days_to_sellout)
+    put('months_until_expiry', days_until_expiry / 30.0)
+    put('stock_rotation_ratio', stock_rotation_ratio)
+
+    # Boolean features (as int)
+    put('is_fast_moving', daily_usage > 5)  # High daily usage
+    put('is_expensive', unit_price > 10)  # Price > 10 INR per tablet
+    put('is_large_batch', stock_quantity > 500)  # Large stock
+    put('is_short_shelf_life', days_until_expiry < 90)  # < 3 months
+
+    return X
+
+
+def _nanmean_rows(values):
+    """Row means ignoring NaN (rows are never all-NaN here)"""
+    import numpy as np
+
+    present = ~np.isnan(values)
+    return np.where(present, values, 0.0).sum(axis=1) / np.maximum(present.sum(axis=1), 1)
+
+
+def build_weekly_demand_matrix(series: List[List[Dict[str, Any]]], as_of: Optional[Any] = None):
+    """
+    Build next-week demand features for many medicines in one grouped pass.
+    Each series is one medicine's sales history ({'date', 'qty'} dicts, any order).
+    Sales are summed into Monday-start weeks, and the features describe the
+    week after the last observed one, from the last WEEKLY_HISTORY weeks.
+    as_of (a date, or epoch days per series) ignores sales dated after it, so
+    history can be re-scored as it looked on that day.
+    Returns (X, valid) - X is float32 in demand_features.json order, valid
+    flags series that had at least one (usable) sale record.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(series)
+    lengths = np.fromiter((len(records) for records in series), dtype=np.int64, count=n)
+
+    # Flatten every record once; series_idx maps rows back to their medicine
+    series_idx = np.repeat(np.arange(n), lengths)
+    dates = pd.to_datetime([record["date"] for records in series for record in records], errors="coerce")
+    qty = np.fromiter((record["qty"] for records in series for record in records), dtype=np.float64)
+    return build_weekly_demand_matrix_rows(n, series_idx, np.asarray(dates.values), qty, as_of)
+
+
+def build_weekly_demand_matrix_rows(n: int, series_idx, dates, qty, as_of: Optional[Any] = None):
+    """
+    build_weekly_demand_matrix for sales already flattened to rows (e.g. a
+    columnar batch): series_idx maps each row to its series (0..n-1), dates is
+    datetime64 (NaT where unparseable), qty is float. Rows may be in any order.
+    """
+    import numpy as np
+
+    index = _feature_index["demand"]
+    X = np.zeros((n, len(index)), dtype=np.float32)
+
+    series_idx = np.asarray(series_idx, dtype=np.int64)
+    dates = np.asarray(dates)
+    qty = np.asarray(qty, dtype=np.float64)
+    valid = np.bincount(series_idx, minlength=n) > 0
+    if not valid.any():
+        return X, valid
+
+    # A series with an unparseable date or non-finite qty is invalid as a whole
+    bad = np.isnat(dates) | ~np.isfinite(qty)
+    if bad.any():
+        valid[np.unique(series_idx[bad])] = False
+        keep = valid[series_idx]
+        series_idx, dates, qty = series_idx[keep], dates[keep], qty[keep]
+        if not valid.any():
+            return X, valid
+
+    # Monday of each date's week, as days since epoch (1970-01-01 was a Thursday)
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    if as_of is not None:
+        # Only the sales that had happened by the end of the as_of day
+        known = days <= np.broadcast_to(epoch_days(as_of), (n,))[series_idx]
+        if not known.all():
+            series_idx, days, qty = series_idx[known], days[known], qty[known]
+            valid &= np.bincount(series_idx, minlength=n) > 0
+            if not valid.any():
+                return X, valid
+    week = days - (days + 3) % 7
+
+    # Weekly aggregation for all series at once: sorted unique (series, week) keys
+    span = int(week.max() - week.min()) + 1
+    keys = series_idx * span + (week - week.min())
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    weekly_qty = np.bincount(inverse, weights=qty)
+    weekly_orders = np.bincount(inverse).astype(np.float64)
+    week_series = unique_keys // span
+    week_start = unique_keys % span + week.min()
+
+    # Position of each week counted from the series' last week (0 = last)
+    weeks_per_series = np.bincount(week_series, minlength=n)
+    last_row = np.cumsum(weeks_per_series) - 1
+    from_end = last_row[week_series] - np.arange(len(unique_keys))
+
+    # Last WEEKLY_HISTORY weeks per series (oldest -> newest), NaN where missing
+    recent = from_end < WEEKLY_HISTORY
+    Y = np.full((n, WEEKLY_HISTORY), np.nan)
+    C = np.full((n, WEEKLY_HISTORY), np.nan)
+    cols = WEEKLY_HISTORY - 1 - from_end[recent]
+    Y[week_series[recent], cols] = weekly_qty[recent]
+    C[week_series[recent], cols] = weekly_orders[recent]
+
+    rows = np.flatnonzero(valid)
+    X[rows] = weekly_demand_features(Y[rows], C[rows], week_start[last_row[rows]])
+    return X, valid
+
+
+def weekly_demand_features(Y, C, last_week):
+    """
+    Next-week demand features from the last WEEKLY_HISTORY observed weeks.
+    Y / C are (m, WEEKLY_HISTORY) units sold / sale records per week, oldest ->
+    newest, NaN where a series has fewer weeks; last_week is the Monday of each
+    series' last observed week in days since epoch. Returns a float32 block in
+    demand_features.json order.
+    """
+    import numpy as np
+
+    index = _feature_index["demand"]
+
+    # The predicted row is the week after the last observed one
+    target = calendar_features("demand", np.asarray(last_week, dtype=np.int64) + 7)
+
+    lag_1 = Y[:, -1]
+    lag_4 = np.nan_to_num(Y[:, -4], nan=0.0)
+
+    # Sample std (ddof=1) of the last 4 weeks, 0 with fewer than two weeks
+    last_4 = Y[:, -4:]
+    count_4 = (~np.isnan(last_4)).sum(axis=1)
+    mean_4 = _nanmean_rows(last_4)
+    squared = np.where(np.isnan(last_4), 0.0, (last_4 - mean_4[:, None]) ** 2).sum(axis=1)
+    volatility = np.where(count_4 > 1, np.sqrt(squared / np.maximum(count_4 - 1, 1)), 0.0)
+
+    block = np.zeros((len(Y), len(index)), dtype=np.float32)
+
+    def put_rows(col: str, values: Any) -> None:
+        j = index.get(col)
+        if j is not None:
+            block[:, j] = values
+
+    # Model was trained with 'cost' - kept at 0, revenue must NOT be fed (qty-only)
+    put_rows("cost", 0)
+    put_rows("order_count", 0)
+    put_rows("medicine_count", 1)
+    for col, values in target.items():
+        put_rows(col, values)
+    for window in WEEKLY_WINDOWS:
+        put_rows(f"y_rolling_{window}w", _nanmean_rows(Y[:, -window:]))
+    put_rows("y_lag_1w", lag_1)
+    put_rows("y_lag_4w", lag_4)
+    put_rows("order_count_trend", _nanmean_rows(C[:, -4:]))
+    put_rows("avg_order_size", lag_1 / np.where(C[:, -1] > 0, C[:, -1], 1.0))
+    put_rows("y_volatility", volatility)
+
+    return block
@@ -0,0 +1,82 @@
+"""
+Metrics - Prometheus counters and histograms for requests, inference stages and batches
+"""
+import time
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# Inference stages timed inside the predictors
+STAGE_VALIDATION = "validation"
+STAGE_FEATURE_BUILD = "feature_build"
+STAGE_PREDICT = "predict"
+STAGE_SERIALIZATION = "serialization"
+
+# Seconds - model calls range from sub-millisecond (one LightGBM row) to seconds (Prophet)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+REQUEST_LATENCY = Histogram(
+    "ml_request_duration_seconds", "HTTP request latency by endpoint",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ml_requests_in_flight", "HTTP requests currently being handled", ["endpoint"]
+)
+REQUEST_ERRORS = Counter(
+    "ml_request_errors_total", "HTTP requests answered with a 4xx/5xx status", ["endpoint", "status"]
+)
+STAGE_LATENCY = Histogram(
+    "ml_inference_stage_duration_seconds", "Time spent per inference stage and model",
+    ["model", "stage"], buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "ml_inference_batch_size", "Items scored per model call", ["model"], buckets=BATCH_SIZE_BUCKETS
+)
+INFERENCE_IN_FLIGHT = Gauge(
+    "ml_inference_in_flight", "Model calls currently running on the executor", ["model"]
+)
+INFERENCE_REJECTED = Counter(
+    "ml_inference_rejected_total", "Inference calls shed by the executor", ["model", "status"]
+)
+PREDICTION_ERRORS = Counter(
+    "ml_prediction_errors_total", "Items or calls that could not be scored", ["model", "reason"]
+)
+
+
+def observe_stage(model_key: str, stage: str, seconds: float) -> None:
+    """Record the duration of one inference stage"""
+    STAGE_LATENCY.labels(model=model_key, stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(model_key: str, stage: str) -> Iterator[None]:
+    """Time the enclosed block as one inference stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(model_key, stage, time.perf_counter() - started)
+
+
+def observe_batch_size(model_key: str, size: int) -> None:
+    """Record how many items one model call scored"""
+    BATCH_SIZE.labels(model=model_key).observe(size)
+
+
+def record_prediction_error(model_key: str, reason: str, count: int = 1) -> None:
+    """Count items (or whole calls) that came back without a prediction"""
+    if count > 0:
+        PREDICTION_ERRORS.labels(model=model_key, reason=reason).inc(count)
+
+
+def render_metrics() -> bytes:
+    """Current metrics in the Prometheus text format"""
+    return generate_latest()
+
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -2,141 +2,569 @@
 Integrated ML Service - Loads and runs ML models directly
 """
 import os
+import copy
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Tuple
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
+from app.services.features import (
+    build_inventory_matrix,
+    build_expiry_matrix,
+    build_weekly_demand_matrix,
+    build_weekly_demand_matrix_rows,
+    get_feature_columns,
+    load_feature_columns,
+    order_history_matrix,
+    weekly_demand_features
+)
+from app.services.feature_store import get_feature_store
+from app.services.calendar_table import epoch_day, epoch_days
+from app.services.router import record_inference_time
+from app.services.metrics import (
+    STAGE_VALIDATION,
+    STAGE_FEATURE_BUILD,
+    STAGE_SERIALIZATION,
+    observe_batch_size,
+    observe_stage,
+    record_prediction_error,
+    stage_timer
+)
+from app.services.model_io import (
+    MODEL_FORMAT,
+    joblib_mmap_enabled,
+    load_artifact,
+    native_path,
+    resolve_artifact,
+    validate_model
+)
+from app.services.model_versions import note_served, track_model_versions
+from app.services.tree_eval import predict_trees
+from app.services.prediction_cache import clear_prediction_cache, get_prediction_cache, prediction_key
+
 logger = logging.getLogger(__name__)
 
-# ML Models storage (loaded once at startup)
-_ml_models: Dict[str, Any] = {
+
+class ServedModel(NamedTuple):
+    """A model object and the version it was loaded as - swapped as one reference"""
+    model: Any
+    version: str
+
+
+# ML Models storage (loaded in parallel at startup or on first use, swapped in place on reload)
+_ml_models: Dict[str, Optional[ServedModel]] = {
     "demand_prophet": None,
     "demand_lgb": None,
+    "demand_stacking": None,
     "inventory_lgb": None,
     "expiry_xgb": None,
 }
 
-_models_loaded = False
+# Artifact file and display name of every model
+MODEL_FILES: Dict[str, Tuple[str, str]] = {
+    "demand_prophet": ("demand_forecasting_prophet.pkl", "Demand forecasting (Prophet)"),
+    "demand_lgb": ("demand_forecasting_lgb.pkl", "Demand forecasting (LightGBM)"),
+    "demand_stacking": ("demand_forecasting_stacking.pkl", "Demand forecasting (Stacking ensemble)"),
+    "inventory_lgb": ("inventory_optimization_lgb.pkl", "Inventory optimization"),
+    "expiry_xgb": ("expiry_prediction_xgb.pkl", "Expiry prediction"),
+}
+
+# Per-model load state: "not_loaded" | "loading" | "loaded" | "missing" | "failed"
+_model_state: Dict[str, Dict[str, Any]] = {
+    key: {"state": "not_loaded", "format": None, "artifact": None, "version": None, "load_seconds": None, "error": None,
+          "reload_error": None, "stale_artifact": None, "mmap": False, "inode": None}
+    for key in _ml_models
+}
+_model_locks: Dict[str, threading.Lock] = {key: threading.Lock() for key in _ml_models}
+_features_loaded = False
+
+# Versions each model has served, newest last (kept for /admin/models)
+MODEL_HISTORY_LENGTH = 5
+_model_history: Dict[str, List[Dict[str, Any]]] = {key: [] for key in _ml_models}
+
+# Models that must be loaded before /ready reports ready (comma separated)
+READY_MODELS = [
+    key.strip() for key in os.getenv("ML_READY_MODELS", "inventory_lgb,expiry_xgb").split(",")
+    if key.strip() in _ml_models
+]
+# false = only READY_MODELS load at startup, the rest on first request
+PRELOAD_ALL_MODELS = os.getenv("ML_PRELOAD_ALL_MODELS", "true").lower() in ("1", "true", "yes")
+# Seconds between checks of models/ for retrained artifacts (0 = reload only via the admin endpoint)
+MODEL_WATCH_SECONDS = float(os.getenv("ML_MODEL_WATCH_SECONDS", "30"))
+# An artifact must be unmodified this long before it is picked up (avoids half-copied files)
+MODEL_SETTLE_SECONDS = float(os.getenv("ML_MODEL_SETTLE_SECONDS", "2"))
+# Whether pickle arrays are memory-mapped (ML_JOBLIB_MMAP, see model_io)
+MMAP_PICKLES = joblib_mmap_enabled(MODEL_WATCH_SECONDS > 0)
+
+# Prophet forecast cache: (model identity, horizon, calendar day, uncertainty samples) -> rows
+# MAX_FORECAST_HORIZON matches the upper bound of DemandForecastRequest.periods
+MAX_FORECAST_HORIZON = 365
+_forecast_cache: Dict[Tuple[int, int, date, Optional[int]], List[Dict[str, Any]]] = {}
+_forecast_cache_lock = threading.Lock()
 
 # Model paths - relative to this file: apps/ml/app/services/ml_service.py -> apps/ml/models
 ML_MODELS_PATH = Path(__file__).parent.parent.parent / "models"
 
 
-def load_ml_models() -> bool:
-    """Load all ML models at startup - call this once when server starts"""
-    global _ml_models, _models_loaded
-    
-    if _models_loaded:
-        return True
-    
+def _ensure_feature_columns() -> None:
+    global _features_loaded
+    if not _features_loaded:
+        # Column order for the feature pipeline (inventory_features.json, expiry_features.json)
+        load_feature_columns(ML_MODELS_PATH)
+        _features_loaded = True
+
+
+def _artifact_version(path: Path) -> str:
+    """Identify one artifact build: file name plus modification time"""
+    return f"{path.name}@{path.stat().st_mtime_ns}"
+
+
+def _swap_model(key: str, model: Any, version: str, **state: Any) -> None:
+    """
+    Serve model as the new version of key (caller holds the model lock).
+    Requests already running keep the ServedModel they fetched, so they finish
+    on the previous version; every later get_model sees the new one.
+    """
+    _ml_models[key] = ServedModel(model, version)
+    # Results cached for the previous version are stale
+    clear_prediction_cache(key)
+    if key == "demand_prophet":
+        clear_forecast_cache()
+    _model_state[key].update(state="loaded", version=version, error=None, **state)
+
+    history = _model_history[key]
+    history.append({
+        "version": version,
+        "loaded_at": datetime.now().isoformat(timespec="seconds"),
+        "artifact": state.get("artifact"),
+        "load_seconds": state.get("load_seconds")
+    })
+    del history[:-MODEL_HISTORY_LENGTH]
+
+
+def _read_artifact(key: str) -> Tuple[Optional[Any], Optional[str], Dict[str, Any]]:
+    """
+    Load and validate the current artifact of key without serving it.
+    Returns (model, version, state fields); model is None with state["error"] set on failure.
+    """
+    filename, name = MODEL_FILES[key]
+    artifact = resolve_artifact(key, ML_MODELS_PATH, filename)
+    if artifact is None:
+        return None, None, {"error": f"not found at {ML_MODELS_PATH / filename}"}
+
+    path, fmt = artifact
+    version = _artifact_version(path)
+    state = {
+        "format": fmt,
+        "artifact": path.name,
+        "stale_artifact": None,
+        "mmap": fmt == "joblib" and MMAP_PICKLES,
+        "inode": path.stat().st_ino,
+    }
+    native = native_path(key, ML_MODELS_PATH)
+    if fmt == "joblib" and MODEL_FORMAT != "joblib" and native is not None and native.exists():
+        # The pickle is newer than its native export - re-run export_models.py
+        state["stale_artifact"] = native.name
+        logger.info(f"  {name} model: {path.name} is newer than {native.name}, loading the pickle")
+    started = time.perf_counter()
     try:
-        import joblib
-    except ImportError:
-        logger.warning("joblib not installed. Installing...")
-        os.system("pip install joblib")
-        try:
-            import joblib
-        except ImportError:
-            logger.error("Failed to install joblib. ML features disabled.")
-            return False
-    
-    models_count = 0
-    
-    # Load Prophet demand forecasting model
-    prophet_path = ML_MODELS_PATH / "demand_forecasting_prophet.pkl"
-    if prophet_path.exists():
-        try:
-            _ml_models["demand_prophet"] = joblib.load(prophet_path)
-            logger.info("  [OK] Demand forecasting (Prophet) model loaded")
-            models_count += 1
-        except Exception as e:
-            logger.warning(f"  [FAIL] Failed to load Prophet model: {e}")
-    else:
-        logger.warning(f"  Prophet model not found at {prophet_path}")
-    
-    # Load LightGBM demand model
-    lgb_demand_path = ML_MODELS_PATH / "demand_forecasting_lgb.pkl"
-    if lgb_demand_path.exists():
-        try:
-            _ml_models["demand_lgb"] = joblib.load(lgb_demand_path)
-            logger.info("  [OK] Demand forecasting (LightGBM) model loaded")
-            models_count += 1
-        except Exception as e:
-            logger.warning(f"  [FAIL] Failed to load LightGBM demand model: {e}")
-    
-    # Load Inventory optimization model
-    inv_path = ML_MODELS_PATH / "inventory_optimization_lgb.pkl"
-    if inv_path.exists():
-        try:
-            _ml_models["inventory_lgb"] = joblib.load(inv_path)
-            logger.info("  [OK] Inventory optimization model loaded")
-            models_count += 1
-        except Exception as e:
-            logger.warning(f"  [FAIL] Failed to load inventory model: {e}")
-    
-    # Load Expiry prediction model
-    expiry_path = ML_MODELS_PATH / "expiry_prediction_xgb.pkl"
-    if expiry_path.exists():
+        model = load_artifact(key, path, fmt, mmap=state["mmap"])
+    except Exception as e:
+        return None, version, {**state, "error": str(e)}
+    state["load_seconds"] = round(time.perf_counter() - started, 3)
+
+    problem = validate_model(key, model, ML_MODELS_PATH)
+    if problem:
+        return None, version, {**state, "error": f"failed validation: {problem}"}
+    return model, version, state
+
+
+def _load_model(key: str) -> Optional[ServedModel]:
+    """Deserialize one model (once - concurrent callers wait on the same load)"""
+    with _model_locks[key]:
+        if _ml_models[key] is not None:
+            return _ml_models[key]
+
+        state = _model_state[key]
+        if state["state"] in ("missing", "failed"):
+            return None
+
+        name = MODEL_FILES[key][1]
+        state["state"] = "loading"
+        model, version, fields = _read_artifact(key)
+        if model is None:
+            if version is None:
+                logger.warning(f"  {name} model {fields['error']}")
+                state.update(state="missing")
+            else:
+                logger.warning(f"  [FAIL] Failed to load {name} model: {fields['error']}")
+                state.update(state="failed", version=version, **fields)
+            return None
+
+        _swap_model(key, model, version, **fields)
+        logger.info(f"  [OK] {name} model loaded from {fields['artifact']} in {fields['load_seconds']}s")
+        return _ml_models[key]
+
+
+def get_served_model(key: str) -> Tuple[Optional[Any], Optional[str]]:
+    """(model, version) for key, loading it on first use; (None, None) if it can't be loaded"""
+    served = _ml_models.get(key)
+    if served is None:
+        _ensure_feature_columns()
+        served = _load_model(key)
+        if served is None:
+            return None, None
+    note_served(key, served.version)
+    return served
+
+
+def get_model(key: str) -> Optional[Any]:
+    """Get a model, loading it on first use. Returns None if it can't be loaded."""
+    return get_served_model(key)[0]
+
+
+def get_model_version(key: str) -> Optional[str]:
+    """Version currently served for key, None if it isn't loaded"""
+    served = _ml_models.get(key)
+    return served.version if served is not None else None
+
+
+def install_model(key: str, model: Any, version: str = "in-memory") -> None:
+    """Serve an already-built model object under key (e.g. a model trained in-process)"""
+    with _model_locks[key]:
+        _swap_model(key, model, version, format="memory", artifact=None, load_seconds=0.0)
+
+
+def _overwritten_in_place(key: str, path: Path) -> Optional[str]:
+    """
+    Error message if the memory-mapped pickle being served was rewritten in place
+    (changed, same inode) - such a file is skipped rather than loaded mid-copy.
+    """
+    state = _model_state[key]
+    if not state["mmap"] or state["artifact"] != path.name:
+        return None
+    try:
+        if path.stat().st_ino != state["inode"] or _artifact_version(path) == state["version"]:
+            return None
+    except OSError:
+        return None
+    return f"{path.name} was overwritten in place while memory-mapped - install it by renaming a new file over it"
+
+
+def reload_model(key: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Pick up a retrained artifact for key: load it next to the serving model,
+    validate it against the feature lists and swap it in. The old version keeps
+    serving if the new one can't be loaded or fails validation.
+    Returns {"model", "status": "reloaded" | "unchanged" | "rejected" | "missing", ...}.
+    """
+    filename, name = MODEL_FILES[key]
+    artifact = resolve_artifact(key, ML_MODELS_PATH, filename)
+    if artifact is None:
+        return {"model": key, "status": "missing", "version": get_model_version(key)}
+
+    # One reload per model at a time; requests keep reading _ml_models without the lock
+    with _model_locks[key]:
+        current = get_model_version(key)
+        if not force and current == _artifact_version(artifact[0]):
+            return {"model": key, "status": "unchanged", "version": current}
+        error = _overwritten_in_place(key, artifact[0])
+        if error:
+            logger.error(f"  [FAIL] Reload of {name} model rejected, still serving {current}: {error}")
+            _model_state[key]["reload_error"] = error
+            return {"model": key, "status": "rejected", "version": current, "error": error}
+
+        _ensure_feature_columns()
+        model, version, fields = _read_artifact(key)
+        if model is None:
+            logger.warning(f"  [FAIL] Reload of {name} model rejected, still serving {current}: {fields['error']}")
+            if current is None:
+                _model_state[key].update(state="failed", version=version, **fields)
+            else:
+                _model_state[key]["reload_error"] = fields["error"]
+            return {"model": key, "status": "rejected", "version": current, "error": fields["error"]}
+
+        _swap_model(key, model, version, reload_error=None, **fields)
+        logger.info(f"  [OK] {name} model reloaded: {current} -> {version} in {fields['load_seconds']}s")
+        return {"model": key, "status": "reloaded", "version": version, "previous_version": current}
+
+
+def reload_models(keys: Optional[List[str]] = None, force: bool = False) -> List[Dict[str, Any]]:
+    """reload_model for several models (all by default), in parallel"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    keys = list(keys) if keys is not None else list(_ml_models)
+    with ThreadPoolExecutor(max_workers=max(1, len(keys)), thread_name_prefix="model-reload") as pool:
+        return list(pool.map(lambda key: reload_model(key, force=force), keys))
+
+
+def _changed_artifacts() -> List[str]:
+    """Models whose artifact on disk is newer than the served version and has settled"""
+    changed = []
+    now = time.time()
+    for key, served in list(_ml_models.items()):
+        state = _model_state[key]
+        # Loaded models, plus ones that were missing or broken (a fixed artifact may have arrived)
+        if served is None and state["state"] not in ("missing", "failed"):
+            continue
+        if state["format"] == "memory":
+            continue
+        artifact = resolve_artifact(key, ML_MODELS_PATH, MODEL_FILES[key][0])
+        if artifact is None:
+            continue
+        path = artifact[0]
         try:
-            _ml_models["expiry_xgb"] = joblib.load(expiry_path)
-            logger.info("  [OK] Expiry prediction model loaded")
-            models_count += 1
-        except Exception as e:
-            logger.warning(f"  [FAIL] Failed to load expiry model: {e}")
-    
-    _models_loaded = models_count > 0
-    logger.info(f"ML Service: {models_count}/4 models loaded from {ML_MODELS_PATH}")
-    return _models_loaded
+            modified = path.stat().st_mtime
+        except OSError:
+            continue
+        error = _overwritten_in_place(key, path)
+        if error:
+            if state["reload_error"] != error:
+                logger.error(f"  [FAIL] Not reloading {MODEL_FILES[key][1]} model: {error}")
+                state["reload_error"] = error
+            continue
+        if _artifact_version(path) != state["version"] and now - modified >= MODEL_SETTLE_SECONDS:
+            changed.append(key)
+    return changed
+
+
+_watch_stop = threading.Event()
+
+
+def start_model_watcher() -> Optional[threading.Thread]:
+    """Reload models whose artifacts change in models/, polling every MODEL_WATCH_SECONDS"""
+    if MODEL_WATCH_SECONDS <= 0:
+        return None
+    _watch_stop.clear()
+
+    def _run() -> None:
+        while not _watch_stop.wait(MODEL_WATCH_SECONDS):
+            changed = _changed_artifacts()
+            if changed:
+                reload_models(changed)
+
+    thread = threading.Thread(target=_run, name="model-watcher", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_model_watcher() -> None:
+    _watch_stop.set()
+
+
+def init_worker() -> None:
+    """Process-executor worker setup: load the models and watch for retrained ones"""
+    load_ml_models()
+    start_model_watcher()
+
+
+def is_model_available(key: str) -> bool:
+    """True if the model is loaded or can still be loaded on demand"""
+    if _ml_models.get(key) is not None:
+        return True
+    state = _model_state[key]["state"]
+    return state not in ("missing", "failed") and resolve_artifact(key, ML_MODELS_PATH, MODEL_FILES[key][0]) is not None
+
+
+def load_ml_models(keys: Optional[List[str]] = None) -> bool:
+    """
+    Load ML models in parallel (all of them by default) and wait for them.
+    Already-loaded models are skipped. Returns True if any model is loaded.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    _ensure_feature_columns()
+    keys = list(keys) if keys is not None else list(_ml_models)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(keys)), thread_name_prefix="model-load") as pool:
+        list(pool.map(_load_model, keys))
+
+    loaded = sum(1 for model in _ml_models.values() if model is not None)
+    logger.info(
+        f"ML Service: {loaded}/{len(_ml_models)} models loaded from {ML_MODELS_PATH} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return loaded > 0
+
+
+def start_background_loading() -> threading.Thread:
+    """
+    Load models without blocking startup: READY_MODELS first, then (unless
+    ML_PRELOAD_ALL_MODELS=false) everything else. Requests for a model that
+    isn't loaded yet load it on demand.
+    """
+    def _run() -> None:
+        load_ml_models(READY_MODELS)
+        if PRELOAD_ALL_MODELS:
+            load_ml_models()
+
+    thread = threading.Thread(target=_run, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """True once every model in READY_MODELS is loaded"""
+    return all(_ml_models[key] is not None for key in READY_MODELS)
+
+
+def get_model_states() -> Dict[str, Dict[str, Any]]:
+    """Get per-model load state and load time"""
+    return {key: dict(state) for key, state in _model_state.items()}
+
+
+def get_model_registry() -> Dict[str, Dict[str, Any]]:
+    """Per-model state plus the versions it has served (newest last)"""
+    return {
+        key: {**dict(state), "history": [dict(entry) for entry in _model_history[key]]}
+        for key, state in _model_state.items()
+    }
 
 
 def get_ml_status() -> Dict[str, Any]:
     """Get status of all ML models"""
     return {
-        "ml_available": _models_loaded,
+        "ml_available": any(model is not None for model in _ml_models.values()),
         "demand_prophet_loaded": _ml_models["demand_prophet"] is not None,
         "demand_lgb_loaded": _ml_models["demand_lgb"] is not None,
+        "demand_stacking_loaded": _ml_models["demand_stacking"] is not None,
         "inventory_loaded": _ml_models["inventory_lgb"] is not None,
         "expiry_loaded": _ml_models["expiry_xgb"] is not None,
+        "models": get_model_states(),
         "models_path": str(ML_MODELS_PATH),
         "models_exist": ML_MODELS_PATH.exists()
     }
 
 
-def predict_demand(periods: int = 28) -> Optional[List[Dict[str, Any]]]:
+def clear_forecast_cache() -> None:
+    """Drop all cached Prophet forecasts (call after models change)"""
+    with _forecast_cache_lock:
+        _forecast_cache.clear()
+
+
+def _run_prophet_forecast(
+    model: Any,
+    periods: int,
+    uncertainty_samples: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run Prophet for the next N periods only and format the rows.
+    uncertainty_samples overrides the model's setting (0 disables bounds).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if uncertainty_samples is not None and uncertainty_samples != model.uncertainty_samples:
+        # Shallow copy so the shared model keeps its own setting
+        model = copy.copy(model)
+        model.uncertainty_samples = uncertainty_samples
+
+    # Future dates only - same grid as make_future_dataframe, without the history
+    last_date = model.history_dates.max()
+    dates = pd.date_range(start=last_date, periods=periods + 1, freq='D')
+    dates = dates[dates > last_date][:periods]
+    started = time.perf_counter()
+    forecast = model.predict(pd.DataFrame({'ds': dates}))
+    record_inference_time("demand_prophet", time.perf_counter() - started, len(dates))
+
+    yhat = np.maximum(0, forecast['yhat'].to_numpy(dtype=np.float64))
+    if 'yhat_lower' in forecast:
+        lower = np.maximum(0, forecast['yhat_lower'].to_numpy(dtype=np.float64))
+        upper = np.maximum(0, forecast['yhat_upper'].to_numpy(dtype=np.float64))
+    else:
+        # No uncertainty sampling - bounds collapse onto the point forecast
+        lower = upper = yhat
+
+    return [
+        {
+            "date": ds,
+            "predicted_demand": demand,
+            "lower_bound": lo,
+            "upper_bound": hi
+        }
+        for ds, demand, lo, hi in zip(
+            forecast['ds'].dt.strftime('%Y-%m-%d').tolist(),
+            yhat.tolist(), lower.tolist(), upper.tolist()
+        )
+    ]
+
+
+def predict_demand(
+    periods: int = 28,
+    uncertainty_samples: Optional[int] = None
+) -> Optional[List[Dict[str, Any]]]:
     """
     Predict demand using Prophet model
     Returns list of predictions for next N periods (days)
+
+    The model is static once loaded, so the longest supported horizon is
+    forecast once per calendar day and shorter horizons are slices of it.
+    Pass uncertainty_samples=0 to skip bound sampling when bounds aren't needed.
+    Only 0 and the model's own setting are cached; any other sample count
+    forecasts just the requested periods, outside the cache lock.
     """
-    model = _ml_models.get("demand_prophet")
+    model = get_model("demand_prophet")
     if model is None:
         logger.debug("Prophet model not loaded")
         return None
     
     try:
-        # Create future dataframe for prediction
-        future = model.make_future_dataframe(periods=periods)
-        forecast = model.predict(future)
-        
-        # Get only future predictions (last N rows)
-        future_forecast = forecast.tail(periods)
-        
-        predictions = []
-        for _, row in future_forecast.iterrows():
-            predictions.append({
-                "date": row['ds'].strftime('%Y-%m-%d'),
-                "predicted_demand": max(0, float(row['yhat'])),
-                "lower_bound": max(0, float(row['yhat_lower'])),
-                "upper_bound": max(0, float(row['yhat_upper']))
-            })
-        
-        return predictions
+        if uncertainty_samples is None:
+            uncertainty_samples = model.uncertainty_samples
+        if periods > MAX_FORECAST_HORIZON or uncertainty_samples not in (0, model.uncertainty_samples):
+            return _run_prophet_forecast(model, periods, uncertainty_samples)
+
+        today = datetime.now().date()
+        key = (id(model), MAX_FORECAST_HORIZON, today, uncertainty_samples)
+        with _forecast_cache_lock:
+            cached = _forecast_cache.get(key)
+            if cached is None:
+                cached = _run_prophet_forecast(model, MAX_FORECAST_HORIZON, uncertainty_samples)
+                # Only today's entries are ever read again
+                for stale in [k for k in _forecast_cache if k[2] != today]:
+                    del _forecast_cache[stale]
+                _forecast_cache[key] = cached
+
+        return [dict(p) for p in cached[:periods]]
     
     except Exception as e:
         logger.error(f"Error in demand prediction: {e}")
+        record_prediction_error("demand_prophet", "exception")
         return None
 
 
+def _cached_predictions(
+    model_key: str,
+    version: str,
+    items: List[Dict[str, Any]],
+    score_fn: Callable[[List[Dict[str, Any]]], List[Optional[Dict[str, Any]]]],
+    day: Optional[str] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Serve items from the model's prediction cache and score only the misses
+    (in one score_fn call). Keys cover the input fields, the serving model
+    version and, when given, the calendar day.
+    """
+    cache = get_prediction_cache(model_key)
+    if cache is None:
+        return score_fn(items)
+
+    keys = [prediction_key(version, item, day) for item in items]
+    results = [cache.get(key) for key in keys]
+
+    missing = [i for i, res in enumerate(results) if res is None]
+    if missing:
+        scored = score_fn([items[i] for i in missing])
+        for i, res in zip(missing, scored):
+            results[i] = res
+            if res is not None:
+                cache.put(keys[i], res)
+    return results
+
+
 def predict_inventory_optimization(
     medicine_id: int,
     quantity_received: int,
@@ -144,126 +572,220 @@ def predict_inventory_optimization(
     days_until_expiry: int = 180,
     days_since_last_order: int = 30,
     order_count: int = 10,
-    historical_qty_data: Optional[List[float]] = None
+    historical_qty_data: Optional[List[float]] = None,
+    as_of: Optional[Any] = None,
+    stored_order_history: Optional[Dict[str, Any]] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Predict optimal inventory levels using LightGBM model.
-    Features MUST match training data: inventory_features.json (43 features)
+    Features MUST match training data: inventory_features.json (45 features)
+    historical_qty_data is oldest first, the last entry the most recent order.
+    as_of (date or 'YYYY-MM-DD') scores the item as of that day instead of today.
+    stored_order_history is set by attach_stored_order_history.
     """
-    model = _ml_models.get("inventory_lgb")
-    if model is None:
-        return None
-    
+    item = {
+        "medicine_id": medicine_id,
+        "quantity_received": quantity_received,
+        "unit_cost": unit_cost,
+        "days_until_expiry": days_until_expiry,
+        "days_since_last_order": days_since_last_order,
+        "order_count": order_count,
+        "historical_qty_data": historical_qty_data
+    }
+    if as_of is not None:
+        item["as_of"] = str(as_of)
+    if stored_order_history is not None:
+        item["stored_order_history"] = stored_order_history
+    return predict_inventory_optimization_batch([item])[0]
+
+
+def predict_inventory_optimization_batch(
+    items: List[Dict[str, Any]],
+    as_of: Optional[Any] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Predict optimal inventory levels for many medicines with a single model call.
+    Each item takes the keyword arguments of predict_inventory_optimization
+    (an item's own as_of wins over the batch's; both default to today).
+    Returns one result per item, None where that item could not be scored.
+    """
+    model, version = get_served_model("inventory_lgb")
+    if model is None or not items:
+        return [None] * len(items)
+
+    # Calendar features come from the scoring date, so cached results only hold for that day
+    day = str(as_of)[:10] if as_of is not None else date.today().isoformat()
+    return _cached_predictions(
+        "inventory_lgb", version, items,
+        lambda batch: _score_inventory_batch(model, version, batch, day), day=day
+    )
+
+
+def _score_inventory_batch(
+    model: Any,
+    version: str,
+    items: List[Dict[str, Any]],
+    day: str
+) -> List[Optional[Dict[str, Any]]]:
+    """Score inventory items with one model call (no cache)"""
     try:
-        import pandas as pd
         import numpy as np
-        
-        now = datetime.now()
-        
-        # Use historical data if provided, otherwise use quantity_received as proxy
-        if historical_qty_data and len(historical_qty_data) >= 5:
-            hist = historical_qty_data
-        else:
-            # Create synthetic history based on quantity_received
-            hist = [float(quantity_received)] * 5
-        
-        # Calculate rolling statistics
-        qty_2 = hist[-2:] if len(hist) >= 2 else hist
-        qty_3 = hist[-3:] if len(hist) >= 3 else hist
-        qty_5 = hist[-5:] if len(hist) >= 5 else hist
-        
-        total_cost = quantity_received * unit_cost
-        cumulative_qty = sum(hist) if hist else quantity_received
-        cumulative_cost = cumulative_qty * unit_cost
-        avg_unit_cost = unit_cost  # Using current as average
-        estimated_daily_demand = quantity_received / 30.0 if quantity_received > 0 else 1
-        demand_cv = np.std(hist) / np.mean(hist) if np.mean(hist) > 0 else 0.2
-        
-        # Prepare ALL 43 features in EXACT order from inventory_features.json
-        features = pd.DataFrame([{
-            'medicine_id': medicine_id,
-            'quantity_received': quantity_received,
-            'unit_cost': unit_cost,
-            'total_cost': total_cost,
-            'days_until_expiry': days_until_expiry,
-            'day_of_week': now.weekday(),
-            'day_of_month': now.day,
-            'month': now.month,
-            'quarter': (now.month - 1) // 3 + 1,
-            'is_weekend': 1 if now.weekday() >= 5 else 0,
-            'is_month_start': 1 if now.day <= 3 else 0,
-            'is_month_end': 1 if now.day >= 28 else 0,
-            'is_quarter_start': 1 if now.month in [1, 4, 7, 10] and now.day <= 3 else 0,
-            'is_quarter_end': 1 if now.month in [3, 6, 9, 12] and now.day >= 28 else 0,
-            'days_since_last_order': days_since_last_order,
-            'qty_rolling_2orders_mean': np.mean(qty_2),
-            'qty_rolling_2orders_std': np.std(qty_2) if len(qty_2) > 1 else 0,
-            'qty_rolling_2orders_max': np.max(qty_2),
-            'qty_rolling_2orders_min': np.min(qty_2),
-            'qty_rolling_3orders_mean': np.mean(qty_3),
-            'qty_rolling_3orders_std': np.std(qty_3) if len(qty_3) > 1 else 0,
-            'qty_rolling_3orders_max': np.max(qty_3),
-            'qty_rolling_3orders_min': np.min(qty_3),
-            'qty_rolling_5orders_mean': np.mean(qty_5),
-            'qty_rolling_5orders_std': np.std(qty_5) if len(qty_5) > 1 else 0,
-            'qty_rolling_5orders_max': np.max(qty_5),
-            'qty_rolling_5orders_min': np.min(qty_5),
-            'qty_lag_1': hist[-1] if len(hist) >= 1 else quantity_received,
-            'qty_lag_2': hist[-2] if len(hist) >= 2 else quantity_received,
-            'qty_lag_3': hist[-3] if len(hist) >= 3 else quantity_received,
-            'cumulative_qty': cumulative_qty,
-            'cumulative_cost': cumulative_cost,
-            'avg_order_cycle_days': days_since_last_order,
-            'estimated_daily_demand': estimated_daily_demand,
-            'avg_unit_cost': avg_unit_cost,
-            'unit_cost_diff_from_avg': 0,  # No difference if we only have current
-            'unit_cost_volatility': unit_cost * 0.05,  # Assume 5% volatility
-            'order_count': order_count,
-            'demand_cv': demand_cv,
-            'lead_time_days': 7,  # Standard lead time assumption
-            'demand_cost_interaction': estimated_daily_demand * unit_cost,
-            'volatility_lead_time': demand_cv * 7,
-            'cost_per_day_inventory': unit_cost / 30.0,
-            'stock_turnover_ratio': 12.0 if estimated_daily_demand > 0 else 1.0,  # Monthly turnover
-            'medicine_popularity': min(1.0, order_count / 20.0)  # Normalized popularity
-        }])
-        
-        # Ensure column order matches training
-        feature_cols = [
-            'medicine_id', 'quantity_received', 'unit_cost', 'total_cost', 'days_until_expiry',
-            'day_of_week', 'day_of_month', 'month', 'quarter', 'is_weekend', 'is_month_start',
-            'is_month_end', 'is_quarter_start', 'is_quarter_end', 'days_since_last_order',
-            'qty_rolling_2orders_mean', 'qty_rolling_2orders_std', 'qty_rolling_2orders_max',
-            'qty_rolling_2orders_min', 'qty_rolling_3orders_mean', 'qty_rolling_3orders_std',
-            'qty_rolling_3orders_max', 'qty_rolling_3orders_min', 'qty_rolling_5orders_mean',
-            'qty_rolling_5orders_std', 'qty_rolling_5orders_max', 'qty_rolling_5orders_min',
-            'qty_lag_1', 'qty_lag_2', 'qty_lag_3', 'cumulative_qty', 'cumulative_cost',
-            'avg_order_cycle_days', 'estimated_daily_demand', 'avg_unit_cost', 'unit_cost_diff_from_avg',
-            'unit_cost_volatility', 'order_count', 'demand_cv', 'lead_time_days',
-            'demand_cost_interaction', 'volatility_lead_time', 'cost_per_day_inventory',
-            'stock_turnover_ratio', 'medicine_popularity'
-        ]
-        features = features[feature_cols]
-        
-        # Make prediction
-        optimal_stock = float(model.predict(features)[0])
-        
-        # Ensure reasonable bounds
-        optimal_stock = max(0, optimal_stock)
-        
-        return {
-            "medicine_id": medicine_id,
-            "current_stock": quantity_received,
-            "optimal_stock": round(optimal_stock),
-            "reorder_quantity": max(0, round(optimal_stock - quantity_received)),
-            "days_of_stock": round(quantity_received / estimated_daily_demand) if estimated_daily_demand > 0 else 999,
-            "source": "ML Model (LightGBM)"
-        }
-    
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+        # Reject malformed items up front so one bad row doesn't fail the batch
+        started = time.perf_counter()
+        valid_idx = []
+        for i, item in enumerate(items):
+            try:
+                hist = item.get("historical_qty_data") or []
+                values = [item["medicine_id"], item["quantity_received"], item["unit_cost"], *hist]
+                if item.get("as_of"):
+                    epoch_day(item["as_of"])
+                if np.all(np.isfinite(np.asarray(values, dtype=np.float64))):
+                    valid_idx.append(i)
+                else:
+                    logger.warning(f"Skipping inventory item {i}: non-finite input")
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping inventory item {i}: {e}")
+        observe_stage("inventory_lgb", STAGE_VALIDATION, time.perf_counter() - started)
+        record_prediction_error("inventory_lgb", "invalid_input", len(items) - len(valid_idx))
+
+        if not valid_idx:
+            return results
+
+        valid_items = [items[i] for i in valid_idx]
+        with stage_timer("inventory_lgb", STAGE_FEATURE_BUILD):
+            per_item = [item.get("as_of") for item in valid_items]
+            as_of = epoch_days([d or day for d in per_item]) if any(per_item) else date.fromisoformat(day)
+            X, quantity, estimated_daily_demand = build_inventory_matrix(
+                valid_items, as_of, history_stats=_stored_order_history(valid_items)
+            )
+        observe_batch_size("inventory_lgb", len(valid_idx))
+
+        # Make prediction (one call for the whole batch)
+        started = time.perf_counter()
+        predictions = predict_trees("inventory_lgb", model, X, model.predict)
+        record_inference_time("inventory_lgb", time.perf_counter() - started, len(X))
+
+        started = time.perf_counter()
+        for k, i in enumerate(valid_idx):
+            # Ensure reasonable bounds
+            optimal_stock = max(0, float(predictions[k]))
+            quantity_received = items[i]["quantity_received"]
+            daily_demand = float(estimated_daily_demand[k])
+
+            results[i] = {
+                "medicine_id": items[i]["medicine_id"],
+                "current_stock": quantity_received,
+                "optimal_stock": round(optimal_stock),
+                "reorder_quantity": max(0, round(optimal_stock - quantity_received)),
+                "days_of_stock": round(quantity_received / daily_demand) if daily_demand > 0 else 999,
+                "source": "ML Model (LightGBM)",
+                "model_version": version
+            }
+        observe_stage("inventory_lgb", STAGE_SERIALIZATION, time.perf_counter() - started)
+
+        return results
+
     except Exception as e:
-        logger.error(f"Error in inventory prediction: {e}")
+        logger.error(f"Error in batch inventory prediction: {e}")
+        record_prediction_error("inventory_lgb", "exception", len(items))
+        return [None] * len(items)
+
+
+def attach_stored_order_history(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fill in the feature store's order history for items sent without
+    historical_qty_data, as a "stored_order_history" entry (tail oldest ->
+    newest, total, mean, std). Call it where the store is updated - the API
+    process - before handing items to the executor: with ML_EXECUTOR_KIND=process
+    each worker only has its own stale copy of the store. The entry is part of
+    the prediction cache key, so cached results follow the store. Backdated
+    (as_of) items are left alone - the store only holds the current history.
+    Returns items (updated in place).
+    """
+    store = get_feature_store()
+    missing = [
+        i for i, item in enumerate(items) if not item.get("historical_qty_data") and not item.get("as_of")
+    ]
+    if store is None or not missing or len(store) == 0:
+        return items
+
+    import numpy as np
+
+    fallback = np.fromiter((items[i]["quantity_received"] for i in missing), dtype=np.float64, count=len(missing))
+    tail, total, mean, std, found = store.order_history_stats((items[i]["medicine_id"] for i in missing), fallback)
+    for k in np.flatnonzero(found):
+        items[missing[k]]["stored_order_history"] = {
+            "tail": tail[k].tolist(), "total": float(total[k]), "mean": float(mean[k]), "std": float(std[k])
+        }
+    return items
+
+
+def _stored_order_history(items: List[Dict[str, Any]]) -> Optional[Tuple[Any, Any, Any, Any]]:
+    """
+    Order-history statistics with attach_stored_order_history's entries filling
+    in for historical_qty_data. None (build from the items as usual) when no
+    item has one.
+    """
+    rows = [i for i, item in enumerate(items) if item.get("stored_order_history")]
+    if not rows:
         return None
 
+    import numpy as np
+
+    fallback = np.fromiter((item["quantity_received"] for item in items), dtype=np.float64, count=len(items))
+    tail, total, mean, std = order_history_matrix([item.get("historical_qty_data") for item in items], fallback)
+    for i in rows:
+        stored = items[i]["stored_order_history"]
+        tail[i], total[i], mean[i], std[i] = stored["tail"], stored["total"], stored["mean"], stored["std"]
+    return tail, total, mean, std
+
+
+def predict_inventory_optimization_columns(
+    columns: Dict[str, Any],
+    served: Optional[Tuple[Any, Optional[str]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Columnar variant of predict_inventory_optimization_batch: takes a dict of
+    equal-length arrays (historical_qty_data as (flat_values, lengths)) and
+    returns result arrays, without building per-row Python objects. An
+    optional "as_of" array of epoch days scores every row as of its own day
+    (one batch can backfill a whole catalog over a year of days).
+    served is the (model, version) from get_served_model to score with, for
+    callers that report the version (default: the model served now).
+    Rows must already be validated. Returns None if the model is unavailable.
+    """
+    model, _ = served or get_served_model("inventory_lgb")
+    if model is None:
+        return None
+
+    import numpy as np
+
+    with stage_timer("inventory_lgb", STAGE_FEATURE_BUILD):
+        as_of = columns.get("as_of")
+        X, quantity, estimated_daily_demand = build_inventory_matrix(
+            columns, date.today() if as_of is None else as_of
+        )
+    observe_batch_size("inventory_lgb", len(X))
+
+    started = time.perf_counter()
+    predictions = np.asarray(predict_trees("inventory_lgb", model, X, model.predict), dtype=np.float64)
+    record_inference_time("inventory_lgb", time.perf_counter() - started, len(X))
+
+    optimal_stock = np.maximum(0, predictions)
+    # Whole units, like the JSON path's round()
+    days_of_stock = np.where(estimated_daily_demand > 0, np.round(quantity / estimated_daily_demand), 999)
+    return {
+        "medicine_id": np.asarray(columns["medicine_id"]),
+        "current_stock": quantity.astype(np.int64),
+        "optimal_stock": np.round(optimal_stock).astype(np.int64),
+        "reorder_quantity": np.maximum(0, np.round(optimal_stock - quantity)).astype(np.int64),
+        "days_of_stock": days_of_stock.astype(np.int64),
+        **({"as_of": np.asarray(as_of, dtype=np.int64).astype("datetime64[D]")} if as_of is not None else {}),
+    }
+
 
 def predict_expiry_risk(
     medicine_id: int,
@@ -277,217 +799,383 @@ def predict_expiry_risk(
     Predict expiry/waste risk using XGBoost model.
     Features MUST match training data: expiry_features.json
     """
-    model = _ml_models.get("expiry_xgb")
-    if model is None:
-        return None
-    
+    return predict_expiry_risk_batch([{
+        "medicine_id": medicine_id,
+        "supplier": supplier,
+        "days_until_expiry": days_until_expiry,
+        "stock_quantity": stock_quantity,
+        "unit_price": unit_price,
+        "estimated_daily_usage": estimated_daily_usage
+    }])[0]
+
+
+def _expiry_probabilities(model, X):
+    """Score an expiry feature matrix in one call, returning P(expire) per row"""
+    return predict_trees("expiry_xgb", model, X, lambda X: _native_expiry_probabilities(model, X))
+
+
+def _native_expiry_probabilities(model, X):
+    """P(expire) per row from the model library itself"""
+    import numpy as np
+
+    if hasattr(model, 'get_booster'):
+        # Skip the sklearn wrapper: inplace_predict scores the raw array
+        # without building a DMatrix. Honour early stopping like predict_proba does.
+        try:
+            iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+        probs = np.asarray(model.get_booster().inplace_predict(X, iteration_range=iteration_range))
+        return probs[:, 1] if probs.ndim == 2 else probs
+
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)[:, 1]
+
+    # Model may return class directly
+    prediction = np.asarray(model.predict(X), dtype=np.float64)
+    return np.where((prediction >= 0) & (prediction <= 1), prediction, np.where(prediction > 0.5, 1.0, 0.0))
+
+
+def predict_expiry_risk_batch(
+    items: List[Dict[str, Any]]
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Predict expiry/waste risk for many medicines with a single model call.
+    Each item takes the keyword arguments of predict_expiry_risk.
+    Returns one result per item, None where that item could not be scored.
+    """
+    model, version = get_served_model("expiry_xgb")
+    if model is None or not items:
+        return [None] * len(items)
+
+    return _cached_predictions("expiry_xgb", version, items, lambda batch: _score_expiry_batch(model, version, batch))
+
+
+def _score_expiry_batch(model: Any, version: str, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Score expiry items with one model call (no cache)"""
     try:
-        import pandas as pd
-        
-        # Calculate derived features to match training exactly
-        total_value = stock_quantity * unit_price
-        days_to_sellout = stock_quantity / estimated_daily_usage if estimated_daily_usage > 0 else 999
-        months_until_expiry = days_until_expiry / 30.0
-        stock_rotation_ratio = days_until_expiry / days_to_sellout if days_to_sellout > 0 else 0
-        
-        # Boolean features (as int)
-        is_fast_moving = 1 if estimated_daily_usage > 5 else 0  # High daily usage
-        is_expensive = 1 if unit_price > 10 else 0  # Price > 10 INR per tablet
-        is_large_batch = 1 if stock_quantity > 500 else 0  # Large stock
-        is_short_shelf_life = 1 if days_until_expiry < 90 else 0  # < 3 months
-        
-        # Prepare features in EXACT order from expiry_features.json
-        features = pd.DataFrame([{
-            'medicine_id': medicine_id,
-            'supplier': supplier,
-            'days_until_expiry': days_until_expiry,
-            'stock_quantity': stock_quantity,
-            'unit_price': unit_price,
-            'total_value': total_value,
-            'estimated_daily_usage': estimated_daily_usage,
-            'days_to_sellout': days_to_sellout,
-            'months_until_expiry': months_until_expiry,
-            'stock_rotation_ratio': stock_rotation_ratio,
-            'is_fast_moving': is_fast_moving,
-            'is_expensive': is_expensive,
-            'is_large_batch': is_large_batch,
-            'is_short_shelf_life': is_short_shelf_life
-        }])
-        
-        # Ensure column order matches training
-        feature_cols = [
-            'medicine_id', 'supplier', 'days_until_expiry', 'stock_quantity',
-            'unit_price', 'total_value', 'estimated_daily_usage', 'days_to_sellout',
-            'months_until_expiry', 'stock_rotation_ratio', 'is_fast_moving',
-            'is_expensive', 'is_large_batch', 'is_short_shelf_life'
-        ]
-        features = features[feature_cols]
-        
-        # Make prediction
-        if hasattr(model, 'predict_proba'):
-            risk_prob = float(model.predict_proba(features)[0][1])
-        else:
-            # Model may return class directly
-            prediction = float(model.predict(features)[0])
-            risk_prob = prediction if 0 <= prediction <= 1 else (1.0 if prediction > 0.5 else 0.0)
-        
-        # Determine risk level from probability
-        if risk_prob > 0.7:
-            risk_level = "HIGH"
-            recommendation = "Urgent: Apply discount or return to supplier"
-        elif risk_prob > 0.4:
-            risk_level = "MEDIUM"
-            recommendation = "Consider promotional pricing"
-        else:
-            risk_level = "LOW"
-            recommendation = "Stock is moving well"
-        
-        return {
-            "risk_probability": round(risk_prob, 3),
-            "risk_level": risk_level,
-            "recommendation": recommendation,
-            "days_to_expiry": days_until_expiry,
-            "expected_units_sold": round(estimated_daily_usage * days_until_expiry),
-            "potential_waste": max(0, stock_quantity - round(estimated_daily_usage * days_until_expiry)),
-            "source": "ML Model (XGBoost)"
-        }
-    
+        import numpy as np
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+        # Reject malformed items up front so one bad row doesn't fail the batch
+        started = time.perf_counter()
+        valid_idx = []
+        for i, item in enumerate(items):
+            try:
+                values = [item[key] for key in (
+                    "medicine_id", "supplier", "days_until_expiry",
+                    "stock_quantity", "unit_price", "estimated_daily_usage"
+                )]
+                if np.all(np.isfinite(np.asarray(values, dtype=np.float64))):
+                    valid_idx.append(i)
+                else:
+                    logger.warning(f"Skipping expiry item {i}: non-finite input")
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping expiry item {i}: {e}")
+        observe_stage("expiry_xgb", STAGE_VALIDATION, time.perf_counter() - started)
+        record_prediction_error("expiry_xgb", "invalid_input", len(items) - len(valid_idx))
+
+        if not valid_idx:
+            return results
+
+        with stage_timer("expiry_xgb", STAGE_FEATURE_BUILD):
+            X = build_expiry_matrix([items[i] for i in valid_idx])
+        observe_batch_size("expiry_xgb", len(valid_idx))
+
+        # Make prediction (one call for the whole batch)
+        started = time.perf_counter()
+        risk_probs = _expiry_probabilities(model, X)
+        record_inference_time("expiry_xgb", time.perf_counter() - started, len(X))
+
+        started = time.perf_counter()
+        for k, i in enumerate(valid_idx):
+            item = items[i]
+            risk_prob = float(risk_probs[k])
+
+            # Determine risk level from probability
+            if risk_prob > 0.7:
+                risk_level = "HIGH"
+                recommendation = "Urgent: Apply discount or return to supplier"
+            elif risk_prob > 0.4:
+                risk_level = "MEDIUM"
+                recommendation = "Consider promotional pricing"
+            else:
+                risk_level = "LOW"
+                recommendation = "Stock is moving well"
+
+            expected_units_sold = round(item["estimated_daily_usage"] * item["days_until_expiry"])
+            results[i] = {
+                "risk_probability": round(risk_prob, 3),
+                "risk_level": risk_level,
+                "recommendation": recommendation,
+                "days_to_expiry": item["days_until_expiry"],
+                "expected_units_sold": expected_units_sold,
+                "potential_waste": max(0, item["stock_quantity"] - expected_units_sold),
+                "source": "ML Model (XGBoost)",
+                "model_version": version
+            }
+        observe_stage("expiry_xgb", STAGE_SERIALIZATION, time.perf_counter() - started)
+
+        return results
+
     except Exception as e:
-        logger.error(f"Error in expiry prediction: {e}")
+        logger.error(f"Error in batch expiry prediction: {e}")
+        record_prediction_error("expiry_xgb", "exception", len(items))
+        return [None] * len(items)
+
+
+def predict_expiry_risk_columns(
+    columns: Dict[str, Any],
+    served: Optional[Tuple[Any, Optional[str]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Columnar variant of predict_expiry_risk_batch: dict of equal-length arrays
+    in, result arrays out. Rows must already be validated. served is as for
+    predict_inventory_optimization_columns.
+    Returns None if the model is unavailable.
+    """
+    model, _ = served or get_served_model("expiry_xgb")
+    if model is None:
         return None
 
+    import numpy as np
 
-def predict_demand_lgb(sales_history: List[Dict[str, Any]]) -> Optional[float]:
+    with stage_timer("expiry_xgb", STAGE_FEATURE_BUILD):
+        X = build_expiry_matrix(columns)
+    observe_batch_size("expiry_xgb", len(X))
+
+    started = time.perf_counter()
+    risk_prob = np.asarray(_expiry_probabilities(model, X), dtype=np.float64)
+    record_inference_time("expiry_xgb", time.perf_counter() - started, len(X))
+
+    # Determine risk level from probability
+    high, medium = risk_prob > 0.7, risk_prob > 0.4
+    risk_level = np.select([high, medium], ["HIGH", "MEDIUM"], "LOW")
+    recommendation = np.select(
+        [high, medium],
+        ["Urgent: Apply discount or return to supplier", "Consider promotional pricing"],
+        "Stock is moving well"
+    )
+
+    days_until_expiry = np.asarray(columns["days_until_expiry"], dtype=np.float64)
+    stock_quantity = np.asarray(columns["stock_quantity"], dtype=np.float64)
+    expected_units_sold = np.round(np.asarray(columns["estimated_daily_usage"], dtype=np.float64) * days_until_expiry)
+    return {
+        "medicine_id": np.asarray(columns["medicine_id"]),
+        "risk_probability": np.round(risk_prob, 3),
+        "risk_level": risk_level,
+        "recommendation": recommendation,
+        "days_to_expiry": days_until_expiry,
+        "expected_units_sold": expected_units_sold.astype(np.int64),
+        "potential_waste": np.maximum(0, stock_quantity - expected_units_sold).astype(np.int64),
+    }
+
+
+def predict_demand_lgb(
+    sales_history: List[Dict[str, Any]],
+    model_key: str = "demand_lgb",
+    as_of: Optional[Any] = None
+) -> Optional[float]:
     """Predict daily demand using LightGBM model (qty-only).
 
     IMPORTANT (enforced): This function must NOT use revenue/amount/price fields.
     Input expects dicts with at least: {'date': 'YYYY-MM-DD', 'qty': int|float}
+    model_key selects "demand_lgb" or the "demand_stacking" ensemble (same 17 features).
+    Features are built by the same NumPy pipeline as predict_demand_lgb_batch
+    (weekly aggregation, rolling windows, calendar table); as_of ignores sales
+    dated after it.
     """
-    model = _ml_models.get("demand_lgb")
-    if model is None or not sales_history:
+    if not sales_history:
         return None
-        
-    try:
+    return predict_demand_lgb_batch([sales_history], model_key=model_key, as_of=as_of)[0]
+
+
+def predict_weekly_demand(
+    sales_history: List[Dict[str, Any]],
+    model_key: str,
+    as_of: Optional[Any] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Next-week demand from one medicine's sales history with the routed model
+    (see router.choose_demand_model). Reports which model served the request.
+    """
+    started = time.perf_counter()
+    predicted_daily, versions = track_model_versions(
+        predict_demand_lgb, sales_history, model_key=model_key, as_of=as_of
+    )
+    if predicted_daily is None:
+        return None
+
+    return {
+        "predicted_daily": round(predicted_daily, 2),
+        "predicted_weekly": round(predicted_daily * 7, 1),
+        "model": model_key,
+        "model_version": versions.get(model_key),
+        "source": "ML Model (Stacking Ensemble)" if model_key == "demand_stacking" else "ML Model (LightGBM)",
+        "inference_ms": round((time.perf_counter() - started) * 1000.0, 3)
+    }
+
+
+def _predict_weekly_demand(model_key: str, model: Any, X: Any):
+    """Predicted units per day (>= 0) for a weekly demand feature matrix, one model call"""
+    import numpy as np
+
+    if hasattr(model, "feature_names_in_"):
+        # sklearn estimators (stacking ensemble) were fitted on a named DataFrame
         import pandas as pd
+        X = pd.DataFrame(X, columns=get_feature_columns("demand"))
+
+    started = time.perf_counter()
+    predicted_weekly = np.asarray(predict_trees(model_key, model, X, model.predict), dtype=np.float64)
+    record_inference_time(model_key, time.perf_counter() - started, len(X))
+    return np.maximum(0.0, predicted_weekly / 7.0)
+
+
+def predict_demand_lgb_batch(
+    series: List[List[Dict[str, Any]]],
+    model_key: str = "demand_lgb",
+    as_of: Optional[Any] = None
+) -> List[Optional[float]]:
+    """
+    Predict daily demand for many medicines with a single model call.
+    Each series is one medicine's sales history as taken by predict_demand_lgb
+    (qty-only). as_of (a date, or one per series) ignores later sales.
+    Returns one daily demand per series, None where it had no usable history.
+    """
+    model = get_model(model_key)
+    if model is None or not series:
+        return [None] * len(series)
+
+    try:
         import numpy as np
-        
-        # Convert history to DataFrame
-        df = pd.DataFrame(sales_history)
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
-        
-        # Aggregate to weekly (matching training data)
-        df['week_start'] = df['date'].dt.to_period('W').dt.start_time
-        weekly = df.groupby('week_start').agg({
-            'qty': 'sum',
-            'date': 'count'
-        }).reset_index()
-
-        # Model was trained with a column called 'cost'. We keep feature shape but MUST NOT
-        # feed revenue-derived values. So we set 'cost' to 0 for all rows.
-        weekly['cost'] = 0
-        weekly.columns = ['ds', 'y', 'order_count', 'cost']
-        weekly = weekly[['ds', 'y', 'cost', 'order_count']]
-        weekly['medicine_count'] = 1
-        
-        # Add future row for prediction
-        last_date = weekly['ds'].max()
-        future_date = last_date + timedelta(days=7)
-        future_row = pd.DataFrame([{
-            'ds': future_date,
-            'y': np.nan, # Target to predict
-            'cost': 0,
-            'order_count': 0,
-            'medicine_count': 1
-        }])
-        
-        # Combine for feature engineering
-        combined = pd.concat([weekly, future_row], ignore_index=True)
-        
-        # Feature Engineering (must match training/preprocess_zenith.py)
-        combined['is_month_start'] = combined['ds'].dt.is_month_start.astype(int)
-        combined['is_month_end'] = combined['ds'].dt.is_month_end.astype(int)
-        combined['is_quarter_start'] = combined['ds'].dt.is_quarter_start.astype(int)
-        combined['is_quarter_end'] = combined['ds'].dt.is_quarter_end.astype(int)
-        combined['week_of_month'] = combined['ds'].dt.day // 7 + 1
-        combined['month'] = combined['ds'].dt.month
-        
-        # Rolling features (shift=1 to use past data for current row)
-        # Note: In training, we use shift() to get past values. 
-        # For the future row, we want features based on previous rows.
-        # The standard rolling() includes the current row by default. 
-        # We need to be careful.
-        # Training: y_rolling_4w at row T is mean(y[T-3]...y[T]). 
-        # Wait, preprocess_zenith.py: 'y_rolling_4w' = rolling(window=4).mean()
-        # This includes the current 'y'. But 'y' is the target!
-        # Ah, preprocess_zenith.py calculates these on the raw data.
-        # If 'y' is included in the feature, it's data leakage!
-        # Let's check preprocess_zenith.py again.
-        # It calculates 'y_rolling_4w' on 'y'.
-        # Then it saves to CSV.
-        # Then train_demand_lgb.py loads it.
-        # Does it drop 'y' from features?
-        # Yes: "drop_cols = ['ds', 'y']".
-        # BUT 'y_rolling_4w' is KEPT.
-        # If 'y_rolling_4w' includes 'y' (the target), then the model learns to just read 'y' from the rolling mean.
-        # This is a classic leakage.
-        # UNLESS 'y' in the training data is shifted?
-        # No, 'y' is 'weekly_demand['Qty_Received']'.
-        # 'y_rolling_4w' is 'y'.rolling(4).mean().
-        # So 'y_rolling_4w' at time T contains y_T.
-        # If the model uses this to predict y_T, it's cheating.
-        # However, I must follow the existing model.
-        # If the model was trained with leakage, I must provide the "leaked" feature (which I can't because I don't know y_T).
-        # Wait, maybe I should look at 'y_lag_1w'.
-        # 'y_lag_1w' = shift(1). So at T, it has y_{T-1}. This is safe.
-        # If the model relies on 'y_rolling_4w', it's broken for inference.
-        # BUT, let's assume the user wants me to use the model "as is".
-        # If I can't provide y_T, I can't calculate y_rolling_4w correctly.
-        # I will use the *previous* known values for the rolling mean.
-        # i.e. for Future Row, y_rolling_4w = mean(last 4 known weeks).
-        
-        # Lag features
-        combined['y_lag_1w'] = combined['y'].shift(1).fillna(0)
-        combined['y_lag_4w'] = combined['y'].shift(4).fillna(0)
-        
-        # Rolling features (using shift(1) to ensure we only use past data)
-        # We calculate rolling on the shifted series to avoid leakage/NaNs for future row
-        y_shifted = combined['y'].shift(1)
-        combined['y_rolling_4w'] = y_shifted.rolling(window=4, min_periods=1).mean()
-        combined['y_rolling_8w'] = y_shifted.rolling(window=8, min_periods=1).mean()
-        combined['y_rolling_12w'] = y_shifted.rolling(window=12, min_periods=1).mean()
-        combined['y_volatility'] = y_shifted.rolling(window=4, min_periods=1).std().fillna(0)
-        
-        combined['order_count_trend'] = combined['order_count'].shift(1).rolling(window=4, min_periods=1).mean()
-        combined['avg_order_size'] = combined['y_lag_1w'] / combined['order_count'].shift(1).replace(0, 1)
-        
-        # Fill NaNs
-        combined = combined.fillna(0)
-        
-        # Select features for the future row
-        future_features = combined.iloc[[-1]].copy()
-        
-        # Ensure columns match model expectation
-        feature_cols = [
-            "cost", "order_count", "medicine_count", "is_month_start", "is_month_end", 
-            "is_quarter_start", "is_quarter_end", "week_of_month", "month", 
-            "y_rolling_4w", "y_rolling_8w", "y_rolling_12w", "y_lag_1w", "y_lag_4w", 
-            "order_count_trend", "avg_order_size", "y_volatility"
-        ]
-        
-        # Filter/Order columns
-        X = future_features[feature_cols]
-        
-        # Predict
-        predicted_weekly = float(model.predict(X)[0])
-        predicted_daily = max(0, predicted_weekly / 7.0)
-        
-        return predicted_daily
-        
+
+        with stage_timer(model_key, STAGE_FEATURE_BUILD):
+            X, valid = build_weekly_demand_matrix(series, as_of)
+        results: List[Optional[float]] = [None] * len(series)
+        rows = np.flatnonzero(valid)
+        record_prediction_error(model_key, "invalid_input", len(series) - len(rows))
+        if len(rows) == 0:
+            return results
+        observe_batch_size(model_key, len(rows))
+
+        for row, daily in zip(rows, _predict_weekly_demand(model_key, model, X[rows])):
+            results[row] = float(daily)
+        return results
+
     except Exception as e:
-        logger.error(f"Error in LightGBM demand prediction: {e}")
+        logger.error(f"Error in {model_key} batch demand prediction: {e}")
+        record_prediction_error(model_key, "exception", len(series))
+        return [None] * len(series)
+
+
+def predict_demand_lgb_columns(
+    columns: Dict[str, Any],
+    model_key: str = "demand_lgb",
+    as_of: Optional[Any] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Columnar variant of predict_demand_lgb_batch: one sale per row
+    ("medicine_id", "date" as datetime64, "qty"), grouped by medicine_id.
+    Returns per-medicine result arrays (sorted by medicine_id; NaN where a
+    medicine had no usable history), None if the model is unavailable.
+    """
+    model = get_model(model_key)
+    if model is None:
         return None
 
+    import numpy as np
+
+    with stage_timer(model_key, STAGE_FEATURE_BUILD):
+        medicine_ids, series_idx = np.unique(np.asarray(columns["medicine_id"]), return_inverse=True)
+        X, valid = build_weekly_demand_matrix_rows(
+            len(medicine_ids), series_idx, columns["date"], columns["qty"], as_of
+        )
+    rows = np.flatnonzero(valid)
+    record_prediction_error(model_key, "invalid_input", len(medicine_ids) - len(rows))
+    predicted_daily = np.full(len(medicine_ids), np.nan)
+    if len(rows):
+        observe_batch_size(model_key, len(rows))
+        predicted_daily[rows] = _predict_weekly_demand(model_key, model, X[rows])
+    return {
+        "medicine_id": medicine_ids,
+        "predicted_daily": np.round(predicted_daily, 2),
+        "predicted_weekly": np.round(predicted_daily * 7, 1),
+    }
+
+
+def predict_stored_weekly_demand_batch(
+    medicine_ids: List[int],
+    model_key: str,
+    history: Optional[Tuple[Any, Any, Any, Any]] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Next-week demand for many medicines from the feature store's weekly
+    statistics (no sales history in the request). history is
+    FeatureStore.weekly_history(medicine_ids), read by the caller in the
+    process that owns the store (process-pool workers only hold a stale copy);
+    without it this process's store is read. None where the store has no sales
+    for a medicine.
+    """
+    model, version = get_served_model(model_key)
+    if history is None:
+        store = get_feature_store()
+        history = store.weekly_history(medicine_ids) if store is not None and medicine_ids else None
+    if history is None or model is None or not medicine_ids:
+        return [None] * len(medicine_ids)
+
+    try:
+        import numpy as np
+
+        with stage_timer(model_key, STAGE_FEATURE_BUILD):
+            Y, C, last_week, found = history
+            rows = np.flatnonzero(found)
+            X = weekly_demand_features(Y[rows], C[rows], last_week[rows])
+        results: List[Optional[Dict[str, Any]]] = [None] * len(medicine_ids)
+        if len(rows) == 0:
+            return results
+        observe_batch_size(model_key, len(rows))
+
+        source = "ML Model (Stacking Ensemble)" if model_key == "demand_stacking" else "ML Model (LightGBM)"
+        for row, daily in zip(rows, _predict_weekly_demand(model_key, model, X)):
+            predicted_daily = float(daily)
+            results[row] = {
+                "medicine_id": medicine_ids[row],
+                "predicted_daily": round(predicted_daily, 2),
+                "predicted_weekly": round(predicted_daily * 7, 1),
+                "model": model_key,
+                "model_version": version,
+                "source": source
+            }
+        return results
+
+    except Exception as e:
+        logger.error(f"Error in {model_key} stored demand prediction: {e}")
+        record_prediction_error(model_key, "exception", len(medicine_ids))
+        return [None] * len(medicine_ids)
+
+
+def predict_weekly_demand_batch(
+    series: List[List[Dict[str, Any]]],
+    model_key: str,
+    as_of: Optional[Any] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """Next-week demand for many medicines with the routed model (one predict call)"""
+    source = "ML Model (Stacking Ensemble)" if model_key == "demand_stacking" else "ML Model (LightGBM)"
+    predictions, versions = track_model_versions(
+        predict_demand_lgb_batch, series, model_key=model_key, as_of=as_of
+    )
+    return [
+        None if predicted_daily is None else {
+            "predicted_daily": round(predicted_daily, 2),
+            "predicted_weekly": round(predicted_daily * 7, 1),
+            "model": model_key,
+            "model_version": versions.get(model_key),
+            "source": source
+        }
+        for predicted_daily in predictions
+    ]
+
 
 def get_demand_forecast_for_medicine(
     avg_daily_sales: float,
@@ -497,57 +1185,82 @@ def get_demand_forecast_for_medicine(
     Get 4-week demand forecast for a medicine using ML predictions only.
     Returns empty list if ML model not available.
     """
+    return get_demand_forecast_for_catalog([avg_daily_sales], [std_deviation])[0]
+
+
+def get_demand_forecast_for_catalog(
+    avg_daily_sales: List[float],
+    std_deviation: List[float]
+) -> List[List[Dict[str, Any]]]:
+    """
+    Get 4-week demand forecasts for N medicines from one Prophet profile.
+    The 28-day Prophet curve is shared by every medicine - only the scale
+    factor differs - so all N x 4 weeks are computed in one broadcast.
+    Returns one (possibly empty) weekly list per medicine.
+    """
+    import numpy as np
+
     today = datetime.now()
-    weekly_forecast = []
+    n = len(avg_daily_sales)
     
     # Try to get ML predictions
     ml_predictions = predict_demand(periods=28)
     
-    if ml_predictions and len(ml_predictions) >= 28:
-        # Calculate global baseline from Prophet (average of the 28 days)
-        total_prophet_demand = sum(p["predicted_demand"] for p in ml_predictions)
-        prophet_avg_daily = total_prophet_demand / 28 if total_prophet_demand > 0 else 1.0
-        
-        # Scale factor to convert global Prophet scale to medicine scale
-        # We want the average of our forecast to match the medicine's average daily sales
-        scale_factor = avg_daily_sales / prophet_avg_daily if prophet_avg_daily > 0 else 0
-        
-        for week in range(1, 5):
-            week_start_idx = (week - 1) * 7
-            week_end_idx = week * 7
-            week_predictions = ml_predictions[week_start_idx:week_end_idx]
-            
-            if week_predictions:
-                week_start = today + timedelta(days=(week - 1) * 7)
-                
-                # Sum up Prophet's daily predictions for this week
-                week_prophet_demand = sum(p["predicted_demand"] for p in week_predictions)
-                week_prophet_avg = week_prophet_demand / 7
-                
-                # Apply scaling
-                predicted_daily = week_prophet_avg * scale_factor
-                predicted_weekly = predicted_daily * 7
-                
-                # Calculate trend factor for UI/Debug
-                trend_factor = week_prophet_avg / prophet_avg_daily if prophet_avg_daily > 0 else 1.0
-                
-                # Bounds
-                week_prophet_lower = sum(p["lower_bound"] for p in week_predictions)
-                week_prophet_upper = sum(p["upper_bound"] for p in week_predictions)
-                lower_bound = (week_prophet_lower / 7) * scale_factor * 7
-                upper_bound = (week_prophet_upper / 7) * scale_factor * 7
-                
-                weekly_forecast.append({
-                    "week": week,
-                    "week_start": week_start.strftime('%Y-%m-%d'),
-                    "week_label": f"Week {week}",
-                    "predicted_daily": round(predicted_daily, 1),
-                    "predicted_weekly": round(predicted_weekly),
-                    "lower_bound": max(0, round(lower_bound)),
-                    "upper_bound": round(upper_bound),
-                    "trend_factor": round(trend_factor, 2),
-                    "source": "ML Model (Prophet)"
-                })
-    
     # No fallback - return empty if ML not available
-    return weekly_forecast
+    if not ml_predictions or len(ml_predictions) < 28:
+        return [[] for _ in range(n)]
+
+    daily = np.array([[p["predicted_demand"], p["lower_bound"], p["upper_bound"]] for p in ml_predictions[:28]])
+    # (3, 4) weekly sums of Prophet's demand, lower and upper bounds
+    weekly_prophet = daily.T.reshape(3, 4, 7).sum(axis=2)
+
+    # Calculate global baseline from Prophet (average of the 28 days)
+    total_prophet_demand = weekly_prophet[0].sum()
+    prophet_avg_daily = total_prophet_demand / 28 if total_prophet_demand > 0 else 1.0
+
+    # Scale factor to convert global Prophet scale to each medicine's scale, so the
+    # average of the forecast matches the medicine's average daily sales
+    sales = np.asarray(avg_daily_sales, dtype=np.float64)
+    scale_factor = sales / prophet_avg_daily if prophet_avg_daily > 0 else np.zeros(n)
+
+    # (n, 4) weekly forecasts
+    predicted_daily = np.outer(scale_factor, weekly_prophet[0] / 7)
+    predicted_weekly = predicted_daily * 7
+    lower_bound = np.outer(scale_factor, weekly_prophet[1])
+    upper_bound = np.outer(scale_factor, weekly_prophet[2])
+
+    # Trend factor for UI/Debug (shared by all medicines)
+    trend_factor = (weekly_prophet[0] / 7 / prophet_avg_daily if prophet_avg_daily > 0 else np.ones(4)).round(2)
+
+    weeks = [
+        {
+            "week": week,
+            "week_start": (today + timedelta(days=(week - 1) * 7)).strftime('%Y-%m-%d'),
+            "week_label": f"Week {week}",
+            "trend_factor": float(trend_factor[week - 1]),
+        }
+        for week in range(1, 5)
+    ]
+
+    daily_rounded = predicted_daily.round(1).tolist()
+    weekly_rounded = predicted_weekly.round().astype(np.int64).tolist()
+    lower_rounded = np.maximum(0, lower_bound.round()).astype(np.int64).tolist()
+    upper_rounded = upper_bound.round().astype(np.int64).tolist()
+
+    return [
+        [
+            {
+                "week": week["week"],
+                "week_start": week["week_start"],
+                "week_label": week["week_label"],
+                "predicted_daily": daily_rounded[i][w],
+                "predicted_weekly": weekly_rounded[i][w],
+                "lower_bound": lower_rounded[i][w],
+                "upper_bound": upper_rounded[i][w],
+                "trend_factor": week["trend_factor"],
+                "source": "ML Model (Prophet)"
+            }
+            for w, week in enumerate(weeks)
+        ]
+        for i in range(n)
+    ]
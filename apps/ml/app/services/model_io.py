@@ -0,0 +1,182 @@
+"""
+Model I/O - Native model formats and memory-mapped loading
+"""
+import os
+import re
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.features import FEATURE_FILES, get_feature_columns
+
+logger = logging.getLogger(__name__)
+
+# Native artifacts written by export_models.py, preferred over the pickles when present.
+# LightGBM boosters load from their text model file, XGBoost from UBJSON and Prophet
+# from its JSON serialization - all parsed natively instead of unpickled.
+NATIVE_FILES: Dict[str, str] = {
+    "demand_prophet": "demand_forecasting_prophet.json",
+    "demand_lgb": "demand_forecasting_lgb.txt",
+    "inventory_lgb": "inventory_optimization_lgb.txt",
+    "expiry_xgb": "expiry_prediction_xgb.ubj",
+}
+
+# ML_MODEL_FORMAT: "auto" (native export unless the pickle is newer) or "joblib" (pickles only)
+MODEL_FORMAT = os.getenv("ML_MODEL_FORMAT", "auto").lower()
+# Memory-map the NumPy arrays joblib stored raw inside the pickles: "false" (default),
+# "true", or "auto" (only when the model-file watcher is off). This does not make
+# workers share the models: the boosters (LightGBM, XGBoost, CatBoost) are pickled
+# blobs that are still unpickled into every process, and the shipped pickles hold
+# almost no raw arrays - loading the stacking ensemble adds ~12 MB RSS per process
+# with or without mmap, against ~260 MB for the imported model libraries.
+# A mapped model keeps reading its arrays from the pickle while it serves, so the file
+# must never be overwritten in place (cp onto it) - write a temp file and rename it over
+# the old one instead.
+JOBLIB_MMAP = os.getenv("ML_JOBLIB_MMAP", "false").lower()
+
+
+def joblib_mmap_enabled(watching: bool) -> bool:
+    """Whether pickles are memory-mapped, given whether models/ is watched for retrained files"""
+    if JOBLIB_MMAP == "auto":
+        return not watching
+    return JOBLIB_MMAP in ("1", "true", "yes")
+
+
+def native_path(key: str, models_path: Path) -> Optional[Path]:
+    """Path of a model's native artifact, None if it has no native format"""
+    filename = NATIVE_FILES.get(key)
+    return models_path / filename if filename else None
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def resolve_artifact(key: str, models_path: Path, pickle_name: str) -> Optional[Tuple[Path, str]]:
+    """
+    Pick the artifact to load: (path, "native" | "joblib"), None if neither exists.
+    The native export wins unless the pickle is newer - a retrained pickle copied
+    in after export_models.py ran is served instead of the stale export.
+    """
+    pickle_path = models_path / pickle_name
+    pickle_mtime = _mtime(pickle_path)
+    native = native_path(key, models_path)
+    if MODEL_FORMAT != "joblib" and native is not None:
+        native_mtime = _mtime(native)
+        if native_mtime is not None and (pickle_mtime is None or native_mtime >= pickle_mtime):
+            return native, "native"
+    if pickle_mtime is not None:
+        return pickle_path, "joblib"
+    return None
+
+
+def load_artifact(key: str, path: Path, fmt: str, mmap: bool = False) -> Any:
+    """Load a model artifact in the given format (mmap: memory-map a pickle's arrays)"""
+    if fmt == "joblib":
+        import joblib
+        # mmap_mode only affects arrays joblib stored raw; the rest is unpickled as usual
+        return joblib.load(path, mmap_mode="r" if mmap else None)
+
+    if key in ("demand_lgb", "inventory_lgb"):
+        import lightgbm as lgb
+        return lgb.Booster(model_file=str(path))
+
+    if key == "expiry_xgb":
+        import xgboost as xgb
+        model = xgb.XGBClassifier()
+        model.load_model(str(path))
+        return model
+
+    if key == "demand_prophet":
+        from prophet.serialize import model_from_json
+        with open(path) as f:
+            return model_from_json(f.read())
+
+    raise ValueError(f"No native format for model '{key}'")
+
+
+# Feature list each model was trained on (see features.FEATURE_FILES)
+MODEL_FEATURE_LISTS: Dict[str, str] = {
+    "demand_lgb": "demand",
+    "demand_stacking": "demand",
+    "inventory_lgb": "inventory",
+    "expiry_xgb": "expiry",
+}
+
+# Names LightGBM / XGBoost make up when a model was fitted on a bare array
+_GENERATED_NAME = re.compile(r"^(Column_\d+|f\d+)$")
+
+
+def _model_feature_names(model: Any) -> Tuple[Optional[List[str]], Optional[int]]:
+    """(feature names, feature count) a fitted model reports, None where it doesn't say"""
+    if hasattr(model, "feature_name") and hasattr(model, "num_feature"):
+        # lightgbm.Booster
+        return list(model.feature_name()), int(model.num_feature())
+    names = getattr(model, "feature_names_in_", None)
+    count = getattr(model, "n_features_in_", None)
+    if names is None and hasattr(model, "get_booster"):
+        # XGBoost sklearn wrapper loaded from a native file
+        booster = model.get_booster()
+        names = booster.feature_names
+        count = count if count is not None else booster.num_features()
+    return (list(names) if names is not None else None), (int(count) if count is not None else None)
+
+
+def validate_model(key: str, model: Any, models_path: Path) -> Optional[str]:
+    """
+    Check a freshly loaded model against the feature list it will be fed.
+    Returns a description of the mismatch, None if the model fits.
+    """
+    if key == "demand_prophet":
+        return None if hasattr(model, "predict") and hasattr(model, "history_dates") else "not a fitted Prophet model"
+
+    feature_list = MODEL_FEATURE_LISTS.get(key)
+    if feature_list is None:
+        return None
+    expected = get_feature_columns(feature_list)
+
+    # The pipeline builds columns in the order loaded at startup; a changed JSON needs a restart
+    path = models_path / FEATURE_FILES[feature_list]
+    if path.exists():
+        try:
+            listed = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            return f"cannot read {path.name}: {e}"
+        if listed != expected:
+            return f"{path.name} changed since startup - restart the service to pick up the new feature list"
+
+    names, count = _model_feature_names(model)
+    if count is not None and count != len(expected):
+        return f"model expects {count} features, {path.name} lists {len(expected)}"
+    if names and not all(_GENERATED_NAME.match(str(name)) for name in names) and list(names) != expected:
+        return f"model feature names differ from {path.name}"
+    return None
+
+
+def export_model(key: str, model: Any, models_path: Path) -> Optional[Path]:
+    """Write a loaded model in its native format. Returns the path, None if unsupported."""
+    path = native_path(key, models_path)
+    if path is None:
+        return None
+
+    # Write to a temp file first so loaders never see a half-written artifact
+    tmp_path = path.with_name(path.name + ".tmp")
+    if key in ("demand_lgb", "inventory_lgb"):
+        model.save_model(str(tmp_path))
+    elif key == "expiry_xgb":
+        # XGBoost picks the format from the extension
+        tmp_path = path.with_name(path.stem + ".tmp" + path.suffix)
+        model.save_model(str(tmp_path))
+    elif key == "demand_prophet":
+        from prophet.serialize import model_to_json
+        with open(tmp_path, "w") as f:
+            f.write(model_to_json(model))
+    else:
+        return None
+
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,56 @@
+"""
+Model Versions - Track which model versions served a request
+"""
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Versions noted by get_model on the thread running an inference call
+_thread_versions = threading.local()
+# Versions collected for the current HTTP request (set by the API middleware)
+_request_versions: ContextVar[Optional[Dict[str, str]]] = ContextVar("model_versions", default=None)
+
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+
+def note_served(model_key: str, version: Optional[str]) -> None:
+    """Record that model_key at version is serving the current call (no-op outside track_model_versions)"""
+    versions = getattr(_thread_versions, "versions", None)
+    if versions is not None and version is not None:
+        versions[model_key] = version
+
+
+def track_model_versions(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, Dict[str, str]]:
+    """
+    Run fn and return (result, {model key: version}) for every model it used.
+    Module-level so it pickles for the process executor; nested calls merge
+    into the outer one.
+    """
+    outer = getattr(_thread_versions, "versions", None)
+    versions: Dict[str, str] = {}
+    _thread_versions.versions = versions
+    try:
+        return fn(*args, **kwargs), versions
+    finally:
+        if outer is not None:
+            outer.update(versions)
+        _thread_versions.versions = outer
+
+
+def begin_request() -> Dict[str, str]:
+    """Start collecting versions for the current request; returns the dict that fills up"""
+    versions: Dict[str, str] = {}
+    _request_versions.set(versions)
+    return versions
+
+
+def record_request_versions(versions: Dict[str, str]) -> None:
+    """Add versions used by one inference call to the current request (if collecting)"""
+    collected = _request_versions.get()
+    if collected is not None:
+        collected.update(versions)
+
+
+def format_versions(versions: Dict[str, str]) -> str:
+    """Header value: 'model=version' pairs, comma separated"""
+    return ",".join(f"{key}={version}" for key, version in sorted(versions.items()))
@@ -0,0 +1,127 @@
+"""
+Prediction Cache - Bounded LRU/TTL cache of per-item inference results
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (environment overridable)
+CACHE_ENABLED = os.getenv("ML_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Max cached results per model before the least recently used are evicted
+CACHE_MAX_ENTRIES = int(os.getenv("ML_CACHE_MAX_ENTRIES", "10000"))
+# Seconds a cached result stays valid, per model
+CACHE_TTL_SECONDS: Dict[str, float] = {
+    "inventory_lgb": float(os.getenv("ML_CACHE_INVENTORY_TTL", "900")),
+    "expiry_xgb": float(os.getenv("ML_CACHE_EXPIRY_TTL", "3600")),
+}
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a fixed TTL, used by one model's predictors"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may add fields to the result - hand out a copy
+        return dict(value)
+
+    def put(self, key: Hashable, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+_caches: Dict[str, PredictionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_prediction_cache(model_key: str) -> Optional[PredictionCache]:
+    """Get the result cache of a model, None if caching is disabled or not configured for it"""
+    if not CACHE_ENABLED or model_key not in CACHE_TTL_SECONDS:
+        return None
+    with _caches_lock:
+        cache = _caches.get(model_key)
+        if cache is None:
+            cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS[model_key])
+            _caches[model_key] = cache
+        return cache
+
+
+def prediction_key(model_version: str, item: Dict[str, Any], day: Optional[str] = None) -> str:
+    """
+    Canonical hash of one item's input fields plus the model version.
+    Pass day (ISO date) for predictors whose features depend on the calendar.
+    """
+    payload = json.dumps([model_version, day, item], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def clear_prediction_cache(model_key: Optional[str] = None) -> None:
+    """Drop cached results of one model (or all of them), e.g. after a model reload"""
+    with _caches_lock:
+        if model_key is None:
+            caches = list(_caches.values())
+        else:
+            caches = [_caches[model_key]] if model_key in _caches else []
+    for cache in caches:
+        cache.clear()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters and size of every prediction cache"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {
+        "enabled": CACHE_ENABLED,
+        "models": {key: cache.stats() for key, cache in caches.items()},
+    }
@@ -0,0 +1,116 @@
+"""
+Model Router - Tracks per-model inference timings and picks the demand model
+"""
+import logging
+import os
+import random
+import threading
+from typing import Dict, Optional
+
+from app.services.metrics import STAGE_PREDICT, observe_stage
+
+logger = logging.getLogger(__name__)
+
+# Quality tiers accepted by the weekly demand endpoint
+QUALITY_FAST = "fast"          # always the single LightGBM
+QUALITY_BALANCED = "balanced"  # stacking ensemble when it fits the latency budget
+QUALITY_BEST = "best"          # always the stacking ensemble
+QUALITY_TIERS = (QUALITY_FAST, QUALITY_BALANCED, QUALITY_BEST)
+
+FAST_DEMAND_MODEL = "demand_lgb"
+ACCURATE_DEMAND_MODEL = "demand_stacking"
+
+# Expected latency (ms) of a one-row call until real timings have been observed
+DEFAULT_EXPECTED_MS: Dict[str, float] = {
+    FAST_DEMAND_MODEL: 2.0,
+    ACCURATE_DEMAND_MODEL: 25.0,
+}
+
+# Weight of the newest sample in the moving average
+EWMA_ALPHA = 0.2
+# Share of over-budget 'balanced' requests still sent to the stacking ensemble,
+# so its latency estimate keeps tracking the model instead of freezing
+EXPLORE_FRACTION = float(os.getenv("ML_ROUTER_EXPLORE_FRACTION", "0.05"))
+
+_timings: Dict[str, Dict[str, float]] = {}
+_timings_lock = threading.Lock()
+
+
+def record_inference_time(model_key: str, seconds: float, rows: int = 1) -> None:
+    """
+    Record one model call's latency over rows inputs. One-row calls and
+    batches are averaged separately (ewma_ms per call, ewma_row_ms per row of
+    a batch), since a batch amortises the per-call overhead.
+    """
+    observe_stage(model_key, STAGE_PREDICT, seconds)
+    ms = seconds * 1000.0
+    rows = max(1, rows)
+    field, sample = ("ewma_ms", ms) if rows == 1 else ("ewma_row_ms", ms / rows)
+    with _timings_lock:
+        stats = _timings.setdefault(model_key, {"calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["rows"] += rows
+        stats["total_ms"] += ms
+        stats["avg_ms"] = stats["total_ms"] / stats["calls"]
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        stats[field] = sample if field not in stats else stats[field] + EWMA_ALPHA * (sample - stats[field])
+
+
+def expected_latency_ms(model_key: str, rows: int = 1) -> float:
+    """
+    Recent latency of a model call over rows inputs, from the matching
+    (one-row or per-row batch) average; the one-row default scaled by rows
+    before any such calls
+    """
+    with _timings_lock:
+        stats = _timings.get(model_key) or {}
+        if rows <= 1 and "ewma_ms" in stats:
+            return stats["ewma_ms"]
+        if rows > 1 and "ewma_row_ms" in stats:
+            return stats["ewma_row_ms"] * rows
+    return DEFAULT_EXPECTED_MS.get(model_key, 0.0) * max(1, rows)
+
+
+def get_model_timings() -> Dict[str, Dict[str, float]]:
+    """Get per-model inference timings (calls, rows, avg/max ms per call, ewma ms per call / per batch row)"""
+    with _timings_lock:
+        return {
+            key: {name: round(value, 3) for name, value in stats.items()}
+            for key, stats in _timings.items()
+        }
+
+
+def choose_demand_model(
+    loaded: Dict[str, bool],
+    quality: str = QUALITY_BALANCED,
+    latency_budget_ms: Optional[float] = None,
+    rows: int = 1
+) -> Optional[str]:
+    """
+    Pick the weekly demand model for a request of rows medicines.
+    'fast' and 'best' pin a model; 'balanced' uses the stacking ensemble unless
+    its recent latency for rows exceeds latency_budget_ms (EXPLORE_FRACTION of
+    those requests still take it, to keep its timings fresh). Falls back to
+    whichever model is loaded. Returns None if neither is.
+    """
+    fast_ok = loaded.get(FAST_DEMAND_MODEL, False)
+    accurate_ok = loaded.get(ACCURATE_DEMAND_MODEL, False)
+    if not fast_ok and not accurate_ok:
+        return None
+    if not accurate_ok:
+        return FAST_DEMAND_MODEL
+    if not fast_ok:
+        return ACCURATE_DEMAND_MODEL
+
+    if quality == QUALITY_FAST:
+        return FAST_DEMAND_MODEL
+    if quality == QUALITY_BEST:
+        return ACCURATE_DEMAND_MODEL
+
+    if (
+        latency_budget_ms is not None
+        and expected_latency_ms(ACCURATE_DEMAND_MODEL, rows) > latency_budget_ms
+        and random.random() >= EXPLORE_FRACTION
+    ):
+        return FAST_DEMAND_MODEL
+    return ACCURATE_DEMAND_MODEL
@@ -0,0 +1,99 @@
+"""
+Scenarios - What-if grids over one base item, scored with a single model call
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.calendar_table import epoch_day
+from app.services.ml_service import (
+    get_served_model,
+    predict_expiry_risk_columns,
+    predict_inventory_optimization_columns
+)
+
+logger = logging.getLogger(__name__)
+
+# Result arrays returned for each model (the rest repeat the base item)
+INVENTORY_OUTPUTS = ("optimal_stock", "reorder_quantity", "days_of_stock")
+EXPIRY_OUTPUTS = ("risk_probability", "potential_waste")
+
+Axes = List[Tuple[str, Sequence[float]]]
+
+
+def grid_columns(base: Dict[str, Any], axes: Axes) -> Tuple[Dict[str, Any], Tuple[int, ...]]:
+    """
+    Expand a base item and per-key value axes into a columnar batch holding the
+    Cartesian grid (first axis varies slowest). Keys that don't vary are
+    broadcast views of the base value, so only the axes take memory.
+    Returns (columns, grid shape).
+    """
+    import numpy as np
+
+    shape = tuple(len(values) for _, values in axes)
+    n = int(np.prod(shape)) if shape else 1
+    grid = np.meshgrid(*(np.asarray(values, dtype=np.float64) for _, values in axes), indexing="ij")
+
+    columns: Dict[str, Any] = {
+        key: np.broadcast_to(np.float64(value), (n,))
+        for key, value in base.items()
+        if value is not None and key not in ("historical_qty_data", "as_of")
+    }
+    for (key, _), values in zip(axes, grid):
+        columns[key] = values.ravel()
+
+    history = base.get("historical_qty_data")
+    if history:
+        columns["historical_qty_data"] = (np.tile(np.asarray(history, dtype=np.float64), n), np.full(n, len(history)))
+    if base.get("as_of"):
+        columns["as_of"] = np.full(n, epoch_day(base["as_of"]), dtype=np.int64)
+    return columns, shape
+
+
+def _surface(
+    version: Optional[str], results: Dict[str, Any], outputs: Sequence[str], axes: Axes, shape: Tuple[int, ...]
+) -> Dict[str, Any]:
+    """Compact response: the axes once, then one flat row-major array per output"""
+    return {
+        "model_version": version,
+        "axes": [{"name": key, "values": list(values)} for key, values in axes],
+        "shape": list(shape),
+        "points": int(len(results[outputs[0]])),
+        "values": {name: results[name].tolist() for name in outputs},
+    }
+
+
+def inventory_scenarios(base: Dict[str, Any], axes: Axes) -> Optional[Dict[str, Any]]:
+    """
+    Inventory optimization over a what-if grid. base takes the keyword
+    arguments of predict_inventory_optimization; axes are (key, values) pairs
+    over the same keys. None if the model is unavailable or scoring fails.
+    """
+    # Resolve the model once so the reported version is the one that scored
+    served = get_served_model("inventory_lgb")
+    try:
+        columns, shape = grid_columns(base, axes)
+        results = predict_inventory_optimization_columns(columns, served)
+    except Exception as e:
+        logger.error(f"Error in inventory scenarios: {e}")
+        return None
+    if results is None:
+        return None
+    return _surface(served[1], results, INVENTORY_OUTPUTS, axes, shape)
+
+
+def expiry_scenarios(base: Dict[str, Any], axes: Axes) -> Optional[Dict[str, Any]]:
+    """
+    Expiry risk over a what-if grid. base takes the keyword arguments of
+    predict_expiry_risk; axes are (key, values) pairs over the same keys.
+    None if the model is unavailable or scoring fails.
+    """
+    served = get_served_model("expiry_xgb")
+    try:
+        columns, shape = grid_columns(base, axes)
+        results = predict_expiry_risk_columns(columns, served)
+    except Exception as e:
+        logger.error(f"Error in expiry scenarios: {e}")
+        return None
+    if results is None:
+        return None
+    return _surface(served[1], results, EXPIRY_OUTPUTS, axes, shape)
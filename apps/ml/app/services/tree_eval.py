@@ -0,0 +1,333 @@
+"""
+Tree Evaluator - LightGBM / XGBoost forests flattened into NumPy node arrays
+
+For a handful of rows the native predict calls are dominated by fixed costs
+(input conversion, DMatrix / DataFrame checks, thread-pool start-up). Walking
+the flattened trees with vectorized NumPy indexing is cheaper there, so
+small batches use this evaluator and large ones the native library.
+"""
+import os
+import json
+import math
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ML_TREE_BACKEND: "auto" (flattened trees up to ML_TREE_BACKEND_MAX_ROWS rows, native above),
+#                  "numpy" (always flattened) or "native" (never)
+TREE_BACKEND = os.getenv("ML_TREE_BACKEND", "auto").lower()
+TREE_BACKEND_MAX_ROWS = int(os.getenv("ML_TREE_BACKEND_MAX_ROWS", "64"))
+
+# How a split treats missing values (LightGBM's missing_type; XGBoost always uses NaN)
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+_LGB_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+# LightGBM's kZeroThreshold: |x| up to this counts as zero. It is the float
+# literal 1e-35f, i.e. 1.0000000180025095e-35 as a double - also the threshold
+# LightGBM writes for zero splits, so the rounding matters on those.
+ZERO_THRESHOLD = 1.0000000180025095e-35
+
+
+class UnsupportedModel(ValueError):
+    """The model uses something the flattened evaluator doesn't implement"""
+
+
+class FlatForest:
+    """
+    One model's trees as flat node arrays. Leaves point to themselves, so every
+    row can take the same number of steps: after `depth` steps each row of
+    every tree sits on its leaf.
+    """
+
+    def __init__(
+        self,
+        nodes: "_NodeBuilder",
+        roots: List[int],
+        depth: int,
+        n_features: int,
+        base_score: float = 0.0,
+        scale: float = 1.0,
+        transform: str = "identity",
+        sigmoid: float = 1.0,
+        strict: bool = False,
+        float32: bool = False
+    ):
+        import numpy as np
+
+        self.dtype = np.float32 if float32 else np.float64
+        self.feature = np.asarray(nodes.feature, dtype=np.intp)
+        self.threshold = np.asarray(nodes.threshold, dtype=self.dtype)
+        self.left = np.asarray(nodes.left, dtype=np.intp)
+        self.right = np.asarray(nodes.right, dtype=np.intp)
+        self.value = np.asarray(nodes.value, dtype=np.float64)
+        self.default_left = np.asarray(nodes.default_left, dtype=bool)
+        self.missing_type = np.asarray(nodes.missing_type, dtype=np.int8)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.n_features = n_features
+        self.base_score = base_score
+        self.scale = scale
+        self.transform = transform
+        self.sigmoid = sigmoid
+        # XGBoost goes left on x < threshold, LightGBM on x <= threshold
+        self.strict = strict
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def raw_score(self, X) -> Any:
+        """Sum of leaf values (plus base score) per row, before the objective's transform"""
+        import numpy as np
+
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got shape {X.shape}")
+
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.depth):
+            if self.is_leaf[node].all():
+                break
+            x = X[rows, self.feature[node]]
+            threshold = self.threshold[node]
+            missing = self.missing_type[node]
+            is_nan = np.isnan(x)
+            # LightGBM compares NaN as 0 unless the split tracks NaN separately
+            x = np.where(is_nan & (missing != MISSING_NAN), 0, x)
+            go_left = x < threshold if self.strict else x <= threshold
+            use_default = (is_nan & (missing == MISSING_NAN)) | (
+                (missing == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD)
+            )
+            go_left = np.where(use_default, self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].sum(axis=1) * self.scale + self.base_score
+
+    def predict(self, X) -> Any:
+        """Model output per row, like the native predict (probability for classifiers)"""
+        import numpy as np
+
+        score = self.raw_score(X)
+        if self.transform == "sigmoid":
+            return 1.0 / (1.0 + np.exp(-self.sigmoid * score))
+        if self.transform == "exp":
+            return np.exp(score)
+        return score
+
+
+class _NodeBuilder:
+    """Growable node arrays shared by the two converters"""
+
+    def __init__(self):
+        self.feature: List[int] = []
+        self.threshold: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.value: List[float] = []
+        self.default_left: List[bool] = []
+        self.missing_type: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.feature)
+
+    def add(self) -> int:
+        index = len(self.feature)
+        self.feature.append(0)
+        self.threshold.append(0.0)
+        self.left.append(index)
+        self.right.append(index)
+        self.value.append(0.0)
+        self.default_left.append(True)
+        self.missing_type.append(MISSING_NONE)
+        return index
+
+    def split(self, index: int, feature: int, threshold: float, left: int, right: int,
+              default_left: bool, missing_type: int) -> None:
+        self.feature[index] = feature
+        self.threshold[index] = threshold
+        self.left[index] = left
+        self.right[index] = right
+        self.default_left[index] = default_left
+        self.missing_type[index] = missing_type
+
+
+def _lightgbm_transform(objective: str) -> Tuple[str, float]:
+    """(transform, sigmoid scale) for a LightGBM objective string such as 'binary sigmoid:1'"""
+    tokens = objective.split()
+    name = tokens[0] if tokens else ""
+    if "sqrt" in tokens:
+        raise UnsupportedModel(f"objective '{objective}'")
+    if name.startswith("regression") or name in ("huber", "fair", "quantile", "mape"):
+        return "identity", 1.0
+    if name in ("poisson", "gamma", "tweedie"):
+        return "exp", 1.0
+    if name == "binary":
+        scale = next((float(t.split(":", 1)[1]) for t in tokens if t.startswith("sigmoid:")), 1.0)
+        return "sigmoid", scale
+    raise UnsupportedModel(f"objective '{objective}'")
+
+
+def from_lightgbm(booster: Any) -> FlatForest:
+    """Flatten a lightgbm.Booster (same iterations as Booster.predict uses by default)"""
+    dump = booster.dump_model()
+    if dump.get("num_tree_per_iteration", 1) != 1:
+        raise UnsupportedModel("multiclass model")
+    transform, sigmoid = _lightgbm_transform(dump.get("objective", ""))
+
+    nodes = _NodeBuilder()
+
+    def add(tree: Dict[str, Any], depth: int) -> Tuple[int, int]:
+        index = nodes.add()
+        if "leaf_value" in tree:
+            if "leaf_coeff" in tree:
+                raise UnsupportedModel("linear trees")
+            nodes.value[index] = tree["leaf_value"]
+            return index, depth
+        if tree.get("decision_type") != "<=":
+            raise UnsupportedModel("categorical splits")
+        left, left_depth = add(tree["left_child"], depth + 1)
+        right, right_depth = add(tree["right_child"], depth + 1)
+        nodes.split(
+            index, tree["split_feature"], tree["threshold"], left, right,
+            bool(tree["default_left"]), _LGB_MISSING_TYPES[tree["missing_type"]]
+        )
+        return index, max(left_depth, right_depth)
+
+    roots, depth = [], 0
+    for info in dump["tree_info"]:
+        root, tree_depth = add(info["tree_structure"], 0)
+        roots.append(root)
+        depth = max(depth, tree_depth)
+
+    # Random-forest boosting averages the trees instead of summing them
+    scale = 1.0 / len(roots) if dump.get("average_output") and roots else 1.0
+    return FlatForest(
+        nodes, roots, depth, dump["max_feature_idx"] + 1,
+        scale=scale, transform=transform, sigmoid=sigmoid
+    )
+
+
+def from_xgboost(model: Any) -> FlatForest:
+    """Flatten an XGBoost Booster or sklearn wrapper (honouring best_iteration like predict_proba)"""
+    import numpy as np
+
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise UnsupportedModel(f"booster '{gbm['name']}'")
+    params = learner["learner_model_param"]
+    if int(params.get("num_class", "0")) > 1:
+        raise UnsupportedModel("multiclass model")
+
+    objective = learner["objective"]["name"]
+    # base_score is stored in output space ("5E-1", or "[5E-1]" in newer releases)
+    base = float(str(params["base_score"]).strip("[]"))
+    if objective in ("binary:logistic", "reg:logistic"):
+        transform, base_score = "sigmoid", math.log(base / (1.0 - base))
+    elif objective in ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror"):
+        transform, base_score = "identity", base
+    else:
+        raise UnsupportedModel(f"objective '{objective}'")
+
+    trees = gbm["model"]["trees"]
+    try:
+        parallel = int(gbm["model"]["gbtree_model_param"]["num_parallel_tree"])
+        trees = trees[:(model.best_iteration + 1) * parallel]
+    except AttributeError:
+        pass
+
+    nodes = _NodeBuilder()
+    roots, depth = [], 0
+    for tree in trees:
+        if any(tree.get("split_type", [])):
+            raise UnsupportedModel("categorical splits")
+        left = np.asarray(tree["left_children"], dtype=np.intp)
+        right = np.asarray(tree["right_children"], dtype=np.intp)
+        features = tree["split_indices"]
+        conditions = tree["split_conditions"]
+        default_left = tree["default_left"]
+
+        offset = len(nodes)
+        for _ in range(len(left)):
+            nodes.add()
+        # Leaves keep their value in split_conditions
+        stack = [(0, 0)]
+        while stack:
+            i, node_depth = stack.pop()
+            if left[i] == -1:
+                nodes.value[offset + i] = conditions[i]
+                depth = max(depth, node_depth)
+                continue
+            nodes.split(
+                offset + i, features[i], conditions[i], offset + left[i], offset + right[i],
+                bool(default_left[i]), MISSING_NAN
+            )
+            stack.append((left[i], node_depth + 1))
+            stack.append((right[i], node_depth + 1))
+        roots.append(offset)
+
+    n_features = int(params.get("num_feature", "0")) or booster.num_features()
+    return FlatForest(
+        nodes, roots, depth, n_features,
+        base_score=base_score, transform=transform, strict=True, float32=True
+    )
+
+
+def compile_forest(model: Any) -> FlatForest:
+    """Flatten a LightGBM or XGBoost model; raises UnsupportedModel for anything else"""
+    # sklearn LightGBM wrappers hold their Booster in booster_
+    booster = getattr(model, "booster_", model)
+    if hasattr(booster, "dump_model"):
+        return from_lightgbm(booster)
+    if hasattr(model, "get_booster") or hasattr(model, "save_raw"):
+        return from_xgboost(model)
+    raise UnsupportedModel(type(model).__name__)
+
+
+# model key -> (model the forest was built from, forest or None if it can't be flattened)
+_forests: Dict[str, Tuple[Any, Optional[FlatForest]]] = {}
+_forests_lock = threading.Lock()
+
+
+def get_forest(model_key: str, model: Any) -> Optional[FlatForest]:
+    """Flattened trees of the serving model (built once per model object), None if unsupported"""
+    entry = _forests.get(model_key)
+    if entry is not None and entry[0] is model:
+        return entry[1]
+
+    with _forests_lock:
+        entry = _forests.get(model_key)
+        if entry is not None and entry[0] is model:
+            return entry[1]
+        try:
+            forest: Optional[FlatForest] = compile_forest(model)
+            logger.info(f"  [OK] {model_key} flattened: {forest.n_trees} trees, depth {forest.depth}")
+        except Exception as e:
+            forest = None
+            logger.info(f"  {model_key} stays on the native backend ({e})")
+        # A reloaded model replaces the entry, releasing the old one
+        _forests[model_key] = (model, forest)
+        return forest
+
+
+def use_flat_forest(n_rows: int) -> bool:
+    """True if a batch of n_rows should go to the flattened trees"""
+    return TREE_BACKEND == "numpy" or (TREE_BACKEND == "auto" and n_rows <= TREE_BACKEND_MAX_ROWS)
+
+
+def predict_trees(model_key: str, model: Any, X: Any, native: Callable[[Any], Any]) -> Any:
+    """
+    Model outputs for X: flattened trees for small batches when the model
+    supports it, native(X) otherwise.
+    """
+    if use_flat_forest(len(X)):
+        forest = get_forest(model_key, model)
+        if forest is not None:
+            return forest.predict(X)
+    return native(X)
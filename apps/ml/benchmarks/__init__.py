@@ -0,0 +1,3 @@
+"""
+Benchmarks for the ML service prediction paths (run with `python -m benchmarks.run` from apps/ml)
+"""
@@ -0,0 +1,63 @@
+"""
+Dummy models - small stand-ins trained in-process when the .pkl artifacts are unavailable
+"""
+import logging
+from typing import Any
+
+import numpy as np
+
+from app.services.features import get_feature_columns
+
+logger = logging.getLogger(__name__)
+
+TRAIN_ROWS = 2000
+N_ESTIMATORS = 100
+
+
+def _regression_data(n_features: int, seed: int):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 100, (TRAIN_ROWS, n_features)).astype(np.float32)
+    y = X[:, : min(5, n_features)].sum(axis=1) + rng.normal(0, 5, TRAIN_ROWS)
+    return X, y
+
+
+def train_lgb_regressor(feature_set: str, seed: int = 0) -> Any:
+    """LightGBM booster over the feature set's columns (same object type as the artifacts)"""
+    import lightgbm as lgb
+
+    X, y = _regression_data(len(get_feature_columns(feature_set)), seed)
+    model = lgb.LGBMRegressor(n_estimators=N_ESTIMATORS, num_leaves=31, verbose=-1, random_state=seed)
+    model.fit(X, y)
+    return model.booster_
+
+
+def train_expiry_classifier(seed: int = 0) -> Any:
+    """XGBoost classifier over the expiry feature columns"""
+    import xgboost as xgb
+
+    X, y = _regression_data(len(get_feature_columns("expiry")), seed)
+    model = xgb.XGBClassifier(n_estimators=N_ESTIMATORS, max_depth=6, random_state=seed)
+    model.fit(X, (y > np.median(y)).astype(int))
+    return model
+
+
+def train_prophet(seed: int = 0) -> Any:
+    """Prophet fitted on a year of synthetic daily sales"""
+    import pandas as pd
+    from prophet import Prophet
+
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range("2024-01-01", periods=365, freq="D")
+    weekly = 5 * np.sin(2 * np.pi * ds.dayofweek / 7)
+    y = 50 + weekly + rng.normal(0, 3, len(ds))
+    model = Prophet(daily_seasonality=False)
+    model.fit(pd.DataFrame({"ds": ds, "y": y}))
+    return model
+
+
+TRAINERS = {
+    "inventory_lgb": lambda: train_lgb_regressor("inventory"),
+    "demand_lgb": lambda: train_lgb_regressor("demand"),
+    "expiry_xgb": train_expiry_classifier,
+    "demand_prophet": train_prophet,
+}
@@ -0,0 +1,110 @@
+"""
+Crossover timing for the flattened tree evaluator (app/services/tree_eval.py).
+
+For inventory_lgb, demand_lgb and expiry_xgb it times the flattened trees and
+the native library per batch size, which is what ML_TREE_BACKEND_MAX_ROWS
+should be set from. Prediction parity with the native libraries (NaNs, zeros,
+extremes, exact split thresholds, each split rule) is covered by
+tests/test_tree_eval.py.
+
+Usage (from apps/ml):
+    python -m benchmarks.parity [--models auto|artifacts|dummy] [--sizes 1 8 32 64 256 1024]
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.services import ml_service
+from app.services.features import build_expiry_matrix, build_inventory_matrix, build_weekly_demand_matrix
+from app.services.tree_eval import compile_forest
+from benchmarks import payloads
+from benchmarks.run import prepare_models
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("benchmarks.parity")
+
+DEFAULT_SIZES = [1, 8, 32, 64, 256, 1024]
+TIMING_REPEAT = 20
+
+
+def feature_matrix(model_key: str, n: int) -> np.ndarray:
+    """A realistic feature matrix for the model, built by the serving pipeline"""
+    if model_key == "inventory_lgb":
+        return build_inventory_matrix(payloads.inventory_items(n), datetime.now())[0]
+    if model_key == "demand_lgb":
+        X, valid = build_weekly_demand_matrix(payloads.sales_histories(n))
+        return X[valid]
+    return build_expiry_matrix(payloads.expiry_items(n))
+
+
+def native_predictor(model_key: str, model: Any) -> Callable[[np.ndarray], Any]:
+    if model_key == "expiry_xgb":
+        return lambda X: ml_service._native_expiry_probabilities(model, X)
+    return model.predict
+
+
+def _median_ms(fn: Callable[[], Any]) -> float:
+    fn()
+    timings = []
+    for _ in range(TIMING_REPEAT):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000.0
+
+
+def time_backends(model_key: str, model: Any, sizes: List[int]) -> Dict[str, Any]:
+    """Median call time of both backends per batch size, and the largest size where flattened wins"""
+    forest = compile_forest(model)
+    native = native_predictor(model_key, model)
+    X = feature_matrix(model_key, max(sizes))
+    timings: Dict[str, Dict[str, float]] = {}
+    crossover: Optional[int] = None
+    for n in sizes:
+        batch = X[:n]
+        flat_ms = _median_ms(lambda: forest.predict(batch))
+        native_ms = _median_ms(lambda: native(batch))
+        timings[str(n)] = {"flat_ms": round(flat_ms, 4), "native_ms": round(native_ms, 4)}
+        if flat_ms < native_ms:
+            crossover = n
+        logger.info(f"  {model_key:<14}{n:>7} rows   flat {flat_ms:8.3f} ms   native {native_ms:8.3f} ms")
+    return {"timings": timings, "flat_faster_up_to": crossover}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the flattened tree evaluator against the native models")
+    parser.add_argument("--models", choices=["auto", "artifacts", "dummy"], default="auto")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--output", type=Path, default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    sources = prepare_models(args.models)
+    report: Dict[str, Any] = {}
+    failed = False
+    for model_key in ("inventory_lgb", "demand_lgb", "expiry_xgb"):
+        model = ml_service.get_model(model_key)
+        if sources.get(model_key) == "unavailable" or model is None:
+            report[model_key] = {"skipped": "model unavailable"}
+            continue
+        try:
+            report[model_key] = {"source": sources[model_key], **time_backends(model_key, model, sorted(args.sizes))}
+        except Exception as e:
+            logger.error(f"  [FAIL] {model_key}: {e}")
+            report[model_key] = {"source": sources[model_key], "error": str(e)}
+            failed = True
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        logger.info(f"Report written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,66 @@
+"""
+Synthetic payloads - schema-valid inputs for every prediction path, seeded for reproducibility
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Days of daily sales per medicine (12 weeks, the longest rolling window)
+SALES_HISTORY_DAYS = 84
+
+
+def inventory_items(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Keyword arguments of predict_inventory_optimization, one dict per medicine"""
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(0, 500, n)
+    return [
+        {
+            "medicine_id": int(i + 1),
+            "quantity_received": int(quantity[i]),
+            "unit_cost": float(rng.uniform(1, 200)),
+            "days_until_expiry": int(rng.integers(0, 720)),
+            "days_since_last_order": int(rng.integers(0, 120)),
+            "order_count": int(rng.integers(0, 50)),
+            "historical_qty_data": rng.integers(0, 500, 5).astype(float).tolist(),
+        }
+        for i in range(n)
+    ]
+
+
+def expiry_items(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Keyword arguments of predict_expiry_risk, one dict per medicine"""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "medicine_id": int(i + 1),
+            "supplier": int(rng.integers(0, 20)),
+            "days_until_expiry": int(rng.integers(0, 720)),
+            "stock_quantity": int(rng.integers(0, 1000)),
+            "unit_price": float(rng.uniform(1, 200)),
+            "estimated_daily_usage": float(rng.uniform(0, 30)),
+        }
+        for i in range(n)
+    ]
+
+
+def sales_histories(n: int, seed: int = 0, days: int = SALES_HISTORY_DAYS) -> List[List[Dict[str, Any]]]:
+    """Daily qty-only sales histories as taken by predict_demand_lgb, one list per medicine"""
+    rng = np.random.default_rng(seed)
+    start = date(2024, 1, 1)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    qty = rng.poisson(rng.uniform(1, 40, (n, 1)), (n, days))
+    return [
+        [{"date": day, "qty": int(q)} for day, q in zip(dates, row)]
+        for row in qty
+    ]
+
+
+def sales_profiles(n: int, seed: int = 0) -> Dict[str, List[float]]:
+    """avg_daily_sales / std_deviation arrays for the catalog forecast"""
+    rng = np.random.default_rng(seed)
+    avg = rng.uniform(0, 40, n)
+    return {
+        "avg_daily_sales": avg.round(2).tolist(),
+        "std_deviation": (avg * rng.uniform(0.1, 0.5, n)).round(2).tolist(),
+    }
@@ -0,0 +1,252 @@
+"""
+Benchmark every prediction path: single-item latency and batch throughput.
+
+Models come from the artifacts in models/ when they load, otherwise small
+dummy models are trained in-process (--models dummy forces that, --models
+artifacts never trains). Results are written as JSON and compared against
+a stored baseline; any case slower than the baseline by more than
+--tolerance fails the run (exit code 1). A missing baseline also fails,
+so a CI job can't pass without comparing anything, unless
+--allow-missing-baseline is given.
+
+Baselines are machine-specific. In CI, record one on the runner type the
+comparison job uses - a job on the main branch runs with --save-baseline
+and keeps benchmarks/baseline.json as an artifact / cache entry, and the
+pull request job restores it before running with the default flags. The
+first run on a new runner (nothing to restore yet) passes
+--allow-missing-baseline.
+
+Usage (from apps/ml):
+    python -m benchmarks.run [--sizes 1 10 100 10000] [--output benchmarks/results.json]
+    python -m benchmarks.run --save-baseline      # record benchmarks/baseline.json
+"""
+import os
+
+# Measure the predictors, not the result cache
+os.environ.setdefault("ML_CACHE_ENABLED", "false")
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from app.services import ml_service
+from benchmarks import payloads
+from benchmarks.dummy_models import TRAINERS
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("benchmarks")
+
+BENCHMARKS_PATH = Path(__file__).parent
+DEFAULT_OUTPUT = BENCHMARKS_PATH / "results.json"
+DEFAULT_BASELINE = BENCHMARKS_PATH / "baseline.json"
+DEFAULT_SIZES = [1, 10, 100, 10000]
+WARMUP_CALLS = 3
+
+
+def prepare_models(mode: str) -> Dict[str, str]:
+    """Load or train every benchmarked model. Returns key -> "artifact" | "dummy" | "unavailable"."""
+    sources: Dict[str, str] = {}
+    for key, train in TRAINERS.items():
+        if mode != "dummy" and ml_service.get_model(key) is not None:
+            sources[key] = "artifact"
+            continue
+        if mode == "artifacts":
+            sources[key] = "unavailable"
+            continue
+        try:
+            started = time.perf_counter()
+            ml_service.install_model(key, train(), version="dummy")
+            sources[key] = "dummy"
+            logger.info(f"  [OK] Trained dummy {key} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            sources[key] = "unavailable"
+            logger.warning(f"  [FAIL] Could not train dummy {key}: {e}")
+    return sources
+
+
+def _time_calls(fn: Callable[[], Any], repeat: int) -> List[float]:
+    for _ in range(WARMUP_CALLS):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+        if result is None or (isinstance(result, list) and result and all(r is None for r in result)):
+            raise RuntimeError("prediction returned no result")
+    return timings
+
+
+def measure_latency(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Single-item latency over repeat calls (ms)"""
+    ms = np.array(_time_calls(fn, repeat)) * 1000.0
+    return {
+        "calls": repeat,
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+    }
+
+
+def measure_throughput(fn: Callable[[], Any], size: int, repeat: int) -> Dict[str, float]:
+    """Batch call time and items/second at one batch size"""
+    ms = statistics.median(_time_calls(fn, repeat)) * 1000.0
+    return {
+        "calls": repeat,
+        "batch_size": size,
+        "p50_ms": round(ms, 4),
+        "items_per_second": round(size / (ms / 1000.0), 1),
+    }
+
+
+def build_cases(sizes: List[int]) -> List[Dict[str, Any]]:
+    """Every benchmark case: name, model, kind (latency / throughput) and the call to time"""
+    inventory = payloads.inventory_items(max(sizes))
+    expiry = payloads.expiry_items(max(sizes))
+    histories = payloads.sales_histories(max(sizes))
+    profiles = payloads.sales_profiles(max(sizes))
+
+    def cold_forecast():
+        ml_service.clear_forecast_cache()
+        return ml_service.predict_demand(periods=28)
+
+    cases = [
+        {"name": "predict_demand[cold]", "model": "demand_prophet", "kind": "latency", "fn": cold_forecast},
+        {"name": "predict_demand[cached]", "model": "demand_prophet", "kind": "latency",
+         "fn": lambda: ml_service.predict_demand(periods=28)},
+        {"name": "get_demand_forecast_for_medicine", "model": "demand_prophet", "kind": "latency",
+         "fn": lambda: ml_service.get_demand_forecast_for_medicine(12.5, 3.0)},
+        {"name": "predict_demand_lgb", "model": "demand_lgb", "kind": "latency",
+         "fn": lambda: ml_service.predict_demand_lgb(histories[0])},
+        {"name": "predict_inventory_optimization", "model": "inventory_lgb", "kind": "latency",
+         "fn": lambda: ml_service.predict_inventory_optimization(**inventory[0])},
+        {"name": "predict_expiry_risk", "model": "expiry_xgb", "kind": "latency",
+         "fn": lambda: ml_service.predict_expiry_risk(**expiry[0])},
+    ]
+
+    for n in sizes:
+        cases += [
+            {"name": f"get_demand_forecast_for_catalog[{n}]", "model": "demand_prophet", "kind": "throughput",
+             "size": n, "fn": lambda n=n: ml_service.get_demand_forecast_for_catalog(
+                 profiles["avg_daily_sales"][:n], profiles["std_deviation"][:n])},
+            {"name": f"predict_demand_lgb_batch[{n}]", "model": "demand_lgb", "kind": "throughput",
+             "size": n, "fn": lambda n=n: ml_service.predict_demand_lgb_batch(histories[:n])},
+            {"name": f"predict_inventory_optimization_batch[{n}]", "model": "inventory_lgb", "kind": "throughput",
+             "size": n, "fn": lambda n=n: ml_service.predict_inventory_optimization_batch(inventory[:n])},
+            {"name": f"predict_expiry_risk_batch[{n}]", "model": "expiry_xgb", "kind": "throughput",
+             "size": n, "fn": lambda n=n: ml_service.predict_expiry_risk_batch(expiry[:n])},
+        ]
+    return cases
+
+
+def run_cases(cases: List[Dict[str, Any]], sources: Dict[str, str], repeat: int, batch_repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for case in cases:
+        source = sources.get(case["model"], "unavailable")
+        if source == "unavailable":
+            results[case["name"]] = {"model": case["model"], "skipped": "model unavailable"}
+            continue
+        try:
+            if case["kind"] == "latency":
+                stats = measure_latency(case["fn"], repeat)
+            else:
+                stats = measure_throughput(case["fn"], case["size"], batch_repeat)
+        except Exception as e:
+            logger.error(f"  [FAIL] {case['name']}: {e}")
+            results[case["name"]] = {"model": case["model"], "source": source, "error": str(e)}
+            continue
+        results[case["name"]] = {"model": case["model"], "source": source, "kind": case["kind"], **stats}
+        summary = f"{stats['p50_ms']:.3f} ms p50"
+        if case["kind"] == "throughput":
+            summary += f", {stats['items_per_second']:.0f} items/s"
+        logger.info(f"  {case['name']:<48} {summary}")
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every case that is slower than the baseline by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or "p50_ms" not in base or "p50_ms" not in current:
+            continue
+        if base.get("source") != current.get("source"):
+            # Dummy vs artifact timings aren't comparable
+            continue
+        if current["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {current['p50_ms']:.3f} ms vs baseline {base['p50_ms']:.3f} ms "
+                f"(+{(current['p50_ms'] / base['p50_ms'] - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ML service prediction paths")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per single-item case")
+    parser.add_argument("--batch-repeat", type=int, default=5, help="Calls per batch-size case")
+    parser.add_argument("--models", choices=["auto", "artifacts", "dummy"], default="auto")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument(
+        "--allow-missing-baseline", action="store_true",
+        help="Pass (with a warning) when there is no baseline to compare against"
+    )
+    args = parser.parse_args()
+
+    sources = prepare_models(args.models)
+    results = run_cases(build_cases(sorted(set(args.sizes))), sources, args.repeat, args.batch_repeat)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "models": sources,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Results written to {args.output}")
+
+    failed = [name for name, res in results.items() if "error" in res]
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        logger.info(f"Baseline written to {args.baseline}")
+        return 1 if failed else 0
+
+    if not args.baseline.exists():
+        if args.allow_missing_baseline:
+            logger.warning(f"No baseline at {args.baseline} - run with --save-baseline to record one")
+            return 1 if failed else 0
+        logger.error(
+            f"  [FAIL] No baseline at {args.baseline} - record one with --save-baseline, "
+            f"or pass --allow-missing-baseline"
+        )
+        return 1
+
+    baseline = json.loads(args.baseline.read_text()).get("results", {})
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for line in regressions:
+        logger.error(f"  [REGRESSION] {line}")
+    if not regressions:
+        logger.info(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,291 @@
+"""
+Offline bulk scoring: run the models over a CSV or Parquet file without the HTTP service.
+
+The input is streamed in fixed-size chunks, which are scored on a process pool
+(every worker loads the models once) and written in input order to a Parquet file,
+so memory stays bounded by the chunk size times the number of chunks in flight.
+
+Input columns are the same as the columnar batch endpoints:
+    inventory  medicine_id, current_stock, avg_daily_sales, price, [days_until_expiry,
+               days_since_last_order, order_count, historical_qty_data (Parquet only), as_of]
+    expiry     medicine_id, days_until_expiry, stock_quantity, avg_daily_sales, unit_price, [supplier_id]
+    demand     medicine_id, date, qty - one sale per row, rows of a medicine contiguous
+               (e.g. exported ORDER BY medicine_id); one output row per medicine
+Inventory and expiry write one output row per input row, in input order, with an
+error column for rows that failed validation.
+
+Usage (from apps/ml):
+    python bulk_score.py inventory batches.parquet inventory_scores.parquet --workers 8
+    python bulk_score.py demand sales.csv demand.parquet --as-of 2024-06-30 --chunk-size 200000
+"""
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.services import ml_service
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("bulk_score")
+
+DEFAULT_CHUNK_ROWS = 100_000
+# Chunks queued per worker beyond the one it is scoring
+CHUNKS_AHEAD = 2
+# Bytes per CSV read block (chunks are re-cut to --chunk-size rows)
+CSV_BLOCK_BYTES = 16 << 20
+# Seconds between progress lines
+PROGRESS_SECONDS = 10.0
+
+MODEL_KEYS = {"inventory": "inventory_lgb", "expiry": "expiry_xgb"}
+
+# Set per worker process by _init_worker
+_job: Dict[str, Any] = {}
+
+
+def output_schema(kind: str, with_as_of: bool):
+    """Fixed output schema, so chunks where every row failed still line up"""
+    import pyarrow as pa
+
+    number, units = pa.float64(), pa.int64()
+    if kind == "inventory":
+        fields = [("current_stock", units), ("optimal_stock", units), ("reorder_quantity", units),
+                  ("days_of_stock", units)]
+        if with_as_of:
+            fields.append(("as_of", pa.date32()))
+    elif kind == "expiry":
+        fields = [("risk_probability", number), ("risk_level", pa.string()), ("recommendation", pa.string()),
+                  ("days_to_expiry", number), ("expected_units_sold", units), ("potential_waste", units)]
+    else:
+        fields = [("predicted_daily", number), ("predicted_weekly", number)]
+    return pa.schema([("medicine_id", pa.int64()), *fields, ("error", pa.string())])
+
+
+def _conform(table, schema):
+    """Cast a chunk's results to the output schema (missing columns become nulls)"""
+    import pyarrow as pa
+
+    return pa.table({
+        field.name: table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    })
+
+
+def read_chunks(path: Path, chunk_rows: int) -> Iterator[Any]:
+    """Stream a CSV or Parquet file as Arrow tables of chunk_rows rows (the last may be shorter)"""
+    import pyarrow as pa
+
+    if path.suffix.lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    else:
+        import pyarrow.csv as pv
+        batches = pv.open_csv(path, read_options=pv.ReadOptions(block_size=CSV_BLOCK_BYTES))
+
+    pending: List[Any] = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_rows)
+            rest = table.slice(chunk_rows)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
+
+
+def group_chunks(chunks: Iterator[Any]) -> Iterator[Any]:
+    """
+    Re-cut demand chunks at medicine boundaries so each medicine's sales land in
+    one chunk. Fails if the rows of a medicine are not contiguous.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    carry = None
+    done: set = set()
+    for table in chunks:
+        if carry is not None:
+            table = pa.concat_tables([carry, table])
+        ids = table.column("medicine_id").to_numpy(zero_copy_only=False).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        runs = ids[starts].tolist()
+        if len(set(runs)) != len(runs) or not done.isdisjoint(runs):
+            raise ValueError("demand input must have the sales of each medicine_id on contiguous rows")
+        # The last medicine may continue in the next chunk
+        cut = int(starts[-1])
+        if cut == 0:
+            carry = table
+            continue
+        carry = table.slice(cut)
+        done.update(runs[:-1])
+        yield table.slice(0, cut)
+    if carry is not None and carry.num_rows:
+        yield carry
+
+
+def _specs(kind: str):
+    from app.api.columnar import EXPIRY_COLUMNS, INVENTORY_COLUMNS
+    return INVENTORY_COLUMNS if kind == "inventory" else EXPIRY_COLUMNS
+
+
+def _init_worker(kind: str, model_key: str, as_of: Optional[str], threads: Optional[int]) -> None:
+    """Load the model once per worker process"""
+    if threads:
+        # One process per core: keep LightGBM / XGBoost from starting a thread per core each
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+    _job.update(kind=kind, model_key=model_key, as_of=as_of)
+    if not ml_service.load_ml_models([model_key]):
+        raise RuntimeError(f"Model '{model_key}' could not be loaded")
+
+
+def score_chunk(table) -> Any:
+    """Score one chunk in the current process; returns the result table for it"""
+    import numpy as np
+    import pyarrow as pa
+
+    from app.api.columnar import read_columns, result_table
+    from app.services.calendar_table import epoch_day
+
+    kind, model_key, as_of = _job["kind"], _job["model_key"], _job["as_of"]
+
+    if kind == "demand":
+        dates = table.column("date").cast(pa.date32()).to_numpy(zero_copy_only=False)
+        columns = {
+            "medicine_id": table.column("medicine_id").to_numpy(zero_copy_only=False).astype(np.int64),
+            "date": dates.astype("datetime64[D]"),
+            "qty": table.column("qty").cast(pa.float64()).to_numpy(zero_copy_only=False),
+        }
+        results = ml_service.predict_demand_lgb_columns(columns, model_key, as_of)
+        if results is None:
+            raise RuntimeError(f"Model '{model_key}' not available")
+        failed = np.isnan(results["predicted_daily"])
+        return pa.table({
+            **{name: pa.array(values) for name, values in results.items()},
+            "error": pa.array(np.where(failed, "No usable sales history", None), type=pa.string()),
+        })
+
+    inventory = kind == "inventory"
+    columns, valid = read_columns(table, _specs(kind), with_history=inventory, with_as_of=inventory)
+    results: Dict[str, Any] = {}
+    if valid.any():
+        if inventory and as_of and "as_of" not in columns:
+            columns["as_of"] = np.full(int(valid.sum()), epoch_day(as_of), dtype=np.int64)
+        if inventory:
+            results = ml_service.predict_inventory_optimization_columns(columns)
+        else:
+            results = ml_service.predict_expiry_risk_columns(columns)
+        if results is None:
+            raise RuntimeError(f"Model '{model_key}' not available")
+    return result_table(table, results, valid)
+
+
+def _start_pool(args: argparse.Namespace, model_key: str) -> Optional[Executor]:
+    """Process pool with the model loaded in every worker, None to score inline (--workers 1)"""
+    if args.workers <= 1:
+        _init_worker(args.model, model_key, args.as_of, args.threads_per_worker)
+        return None
+    return ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(args.model, model_key, args.as_of, args.threads_per_worker or 1),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Score a CSV / Parquet file with the ML models, offline")
+    parser.add_argument("model", choices=["inventory", "expiry", "demand"])
+    parser.add_argument("input", type=Path, help="CSV or Parquet file")
+    parser.add_argument("output", type=Path, help="Parquet file to write")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes (1 = inline)")
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=None,
+        help="Model library threads per process (default 1 with a pool, library default inline)"
+    )
+    parser.add_argument("--as-of", default=None, help="Score as of this day (YYYY-MM-DD): inventory, demand")
+    parser.add_argument("--demand-model", choices=["demand_lgb", "demand_stacking"], default="demand_lgb")
+    args = parser.parse_args()
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("bulk_score needs pyarrow installed")
+        return 1
+    if args.as_of:
+        date.fromisoformat(args.as_of)
+
+    model_key = args.demand_model if args.model == "demand" else MODEL_KEYS[args.model]
+    chunks = read_chunks(args.input, max(1, args.chunk_size))
+    first = next(chunks, None)
+    if first is None:
+        logger.error(f"  [FAIL] {args.input} has no rows")
+        return 1
+    required = {"demand": ["medicine_id", "date", "qty"]}.get(args.model) or [
+        spec.name for spec in _specs(args.model) if spec.default is None
+    ]
+    missing = [name for name in required if name not in first.column_names]
+    if missing:
+        logger.error(f"  [FAIL] {args.input} is missing required columns: {', '.join(missing)}")
+        return 1
+
+    def all_chunks() -> Iterator[Any]:
+        yield first
+        yield from chunks
+
+    work = group_chunks(all_chunks()) if args.model == "demand" else all_chunks()
+    schema = output_schema(args.model, args.model == "inventory" and (bool(args.as_of) or "as_of" in first.column_names))
+
+    started = time.perf_counter()
+    pool = _start_pool(args, model_key)
+    rows_in = rows_out = 0
+    last_progress = started
+    try:
+        with pq.ParquetWriter(args.output, schema) as writer:
+            def write(result) -> None:
+                nonlocal rows_out, last_progress
+                writer.write_table(_conform(result, schema))
+                rows_out += result.num_rows
+                now = time.perf_counter()
+                if now - last_progress >= PROGRESS_SECONDS:
+                    last_progress = now
+                    logger.info(f"  {rows_in} rows read, {rows_out} written ({now - started:.0f}s)")
+
+            if pool is None:
+                for table in work:
+                    rows_in += table.num_rows
+                    write(score_chunk(table))
+            else:
+                # Bounded window of chunks in flight, written back in input order
+                in_flight: deque = deque()
+                for table in work:
+                    rows_in += table.num_rows
+                    in_flight.append(pool.submit(score_chunk, table))
+                    if len(in_flight) >= args.workers * (1 + CHUNKS_AHEAD):
+                        write(in_flight.popleft().result())
+                while in_flight:
+                    write(in_flight.popleft().result())
+    except Exception as e:
+        logger.error(f"  [FAIL] {model_key}: {getattr(e, 'detail', e)}")
+        return 1
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"  [OK] {model_key}: {rows_in} rows in, {rows_out} rows out to {args.output} "
+        f"in {elapsed:.1f}s ({rows_in / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,55 @@
+"""
+Export the pickled models to native formats.
+
+LightGBM boosters are written as text model files, the XGBoost classifier as
+UBJSON and Prophet as JSON (see app/services/model_io.py). The service loads
+these instead of the pickles when present, which is faster and avoids
+unpickling arbitrary objects. The stacking ensemble has no single native
+format and stays a joblib pickle (its arrays are memory-mapped on load).
+
+Usage (from apps/ml):
+    python export_models.py [--models-dir models] [--models inventory_lgb expiry_xgb]
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from app.services.ml_service import ML_MODELS_PATH, MODEL_FILES
+from app.services.model_io import NATIVE_FILES, export_model
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("export_models")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export ML models to native formats")
+    parser.add_argument("--models-dir", type=Path, default=ML_MODELS_PATH)
+    parser.add_argument("--models", nargs="*", default=list(NATIVE_FILES), choices=list(NATIVE_FILES))
+    args = parser.parse_args()
+
+    import joblib
+
+    failures = 0
+    for key in args.models:
+        pickle_path = args.models_dir / MODEL_FILES[key][0]
+        if not pickle_path.exists():
+            logger.warning(f"  [SKIP] {key}: {pickle_path.name} not found")
+            continue
+        try:
+            started = time.perf_counter()
+            model = joblib.load(pickle_path)
+            path = export_model(key, model, args.models_dir)
+            logger.info(
+                f"  [OK] {key}: {pickle_path.name} -> {path.name} "
+                f"({path.stat().st_size / 1024:.0f} KB, {time.perf_counter() - started:.2f}s)"
+            )
+        except Exception as e:
+            failures += 1
+            logger.error(f"  [FAIL] {key}: {e}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,3 @@
+"""
+HTTP load testing for the ML service or its mock (run with `python -m loadtest.run` from apps/ml)
+"""
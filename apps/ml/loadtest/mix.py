@@ -0,0 +1,92 @@
+"""
+Call mixes - weighted request templates replaying what the Node API sends
+"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class CallSpec(NamedTuple):
+    """One kind of request in a mix"""
+    name: str
+    method: str
+    path: str
+    weight: float
+    payload: Optional[Callable[[random.Random], Dict[str, Any]]] = None
+
+
+def demand_forecast_payload(rng: random.Random) -> Dict[str, Any]:
+    # MLService.getDemandForecast (default horizon of the dashboard chart)
+    return {"periods": 30}
+
+
+def inventory_payload(rng: random.Random) -> Dict[str, Any]:
+    # MLService.optimizeInventory - one medicine's stock, sales and last 5 orders
+    avg_daily_sales = round(rng.uniform(0, 40), 2)
+    return {
+        "medicine_id": rng.randint(1, 5000),
+        "current_stock": rng.randint(0, 800),
+        "avg_daily_sales": avg_daily_sales,
+        "price": round(rng.uniform(1, 200), 2),
+        "days_until_expiry": rng.randint(0, 720),
+        "days_since_last_order": rng.randint(0, 120),
+        "order_count": rng.randint(0, 30),
+        "historical_qty_data": [rng.randint(0, 500) for _ in range(5)],
+    }
+
+
+def expiry_payload(rng: random.Random) -> Dict[str, Any]:
+    # MLService.predictExpiryRisk
+    medicine_id = rng.randint(1, 5000)
+    return {
+        "medicine_id": medicine_id,
+        "medicine_name": f"Medicine {medicine_id}",
+        "days_until_expiry": rng.randint(0, 720),
+        "stock_quantity": rng.randint(0, 1000),
+        "avg_daily_sales": round(rng.uniform(0, 40), 2),
+        "unit_price": round(rng.uniform(1, 200), 2),
+        "supplier_id": 0,
+    }
+
+
+def batch_payload(item_payload: Callable[[random.Random], Dict[str, Any]], size: int):
+    def make(rng: random.Random) -> Dict[str, Any]:
+        return {"medicines": [item_payload(rng) for _ in range(size)]}
+    return make
+
+
+CALLS: Dict[str, CallSpec] = {
+    "demand_forecast": CallSpec("demand_forecast", "POST", "/forecast/demand", 1, demand_forecast_payload),
+    "inventory": CallSpec("inventory", "POST", "/inventory/optimize", 1, inventory_payload),
+    "expiry": CallSpec("expiry", "POST", "/expiry/predict", 1, expiry_payload),
+    "inventory_batch": CallSpec(
+        "inventory_batch", "POST", "/inventory/optimize/batch", 1, batch_payload(inventory_payload, 100)
+    ),
+    "expiry_batch": CallSpec(
+        "expiry_batch", "POST", "/expiry/predict/batch", 1, batch_payload(expiry_payload, 100)
+    ),
+    "health": CallSpec("health", "GET", "/health", 1),
+}
+
+# Weights per call name. "node" mirrors the dashboard: every page load asks
+# for inventory and expiry per medicine, the forecast chart loads less often.
+MIXES: Dict[str, Dict[str, float]] = {
+    "node": {"inventory": 45, "expiry": 45, "demand_forecast": 10},
+    "single": {"inventory": 50, "expiry": 50},
+    "batch": {"inventory_batch": 50, "expiry_batch": 50},
+    "forecast": {"demand_forecast": 100},
+}
+
+
+def load_mix(name_or_path: str) -> List[CallSpec]:
+    """A named mix, or a JSON file of {call name: weight}"""
+    if name_or_path in MIXES:
+        weights = MIXES[name_or_path]
+    else:
+        weights = json.loads(Path(name_or_path).read_text())
+
+    unknown = [name for name in weights if name not in CALLS]
+    if unknown:
+        raise ValueError(f"Unknown calls in mix: {', '.join(unknown)} (known: {', '.join(CALLS)})")
+    return [CALLS[name]._replace(weight=float(weight)) for name, weight in weights.items() if weight > 0]
@@ -0,0 +1,252 @@
+"""
+HTTP load test for the ML service: replays a weighted call mix at a fixed
+concurrency (closed loop) or a fixed arrival rate (open loop, Poisson
+arrivals) and reports throughput, p50/p95/p99 latency and error rates.
+
+Targets an already running service (--target) or spawns one with uvicorn
+(--spawn app.main:app for the real models, --spawn mock_main:app for the
+deterministic mock - its latency / failure profile comes from ML_MOCK_PROFILE).
+
+Usage (from apps/ml):
+    python -m loadtest.run --spawn mock_main:app --concurrency 32 --duration 30
+    python -m loadtest.run --target http://localhost:8000 --rate 200 --mix node --output loadtest.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest.mix import CallSpec, MIXES, load_mix
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("loadtest")
+
+ML_APP_PATH = Path(__file__).parent.parent
+SPAWN_READY_TIMEOUT = 120.0
+
+
+class Recorder:
+    """Latency samples and outcomes per call name (after warmup)"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, outcome: str, seconds: float) -> None:
+        self.outcomes[name][outcome] += 1
+        if outcome == "ok":
+            self.latencies[name].append(seconds)
+
+
+async def _send(client: httpx.AsyncClient, call: CallSpec, rng: random.Random) -> str:
+    """Send one request; returns "ok", an HTTP status code, "timeout" or "connect_error"""
+    try:
+        payload = call.payload(rng) if call.payload else None
+        response = await client.request(call.method, call.path, json=payload)
+    except httpx.TimeoutException:
+        return "timeout"
+    except httpx.TransportError:
+        return "connect_error"
+    return "ok" if response.status_code < 400 else str(response.status_code)
+
+
+async def run_load(
+    target: str,
+    calls: List[CallSpec],
+    duration: float,
+    warmup: float,
+    concurrency: int,
+    rate: Optional[float],
+    timeout: float,
+    seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    weights = [call.weight for call in calls]
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        measure_from = started + warmup
+        stop_at = measure_from + duration
+
+        async def one(call: CallSpec, scheduled: float) -> None:
+            outcome = await _send(client, call, rng)
+            finished = time.perf_counter()
+            if measure_from <= scheduled < stop_at:
+                # Only requests scheduled inside the window count. Open loop measures
+                # from the scheduled arrival, so queueing behind a slow server counts
+                # against latency (no coordinated omission)
+                recorder.record(call.name, outcome, finished - scheduled)
+
+        if rate is None:
+            # Closed loop: `concurrency` clients, each sends its next request when the last returns
+            async def worker() -> None:
+                while time.perf_counter() < stop_at:
+                    await one(rng.choices(calls, weights)[0], time.perf_counter())
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            # Open loop: Poisson arrivals at `rate`/s, at most `concurrency` in flight
+            slots = asyncio.Semaphore(concurrency)
+            tasks = set()
+
+            async def limited(call: CallSpec, scheduled: float) -> None:
+                async with slots:
+                    await one(call, scheduled)
+
+            next_at = time.perf_counter()
+            while next_at < stop_at:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(limited(rng.choices(calls, weights)[0], next_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                next_at += rng.expovariate(rate)
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        # The window, not the drain of requests still in flight at stop_at
+        elapsed = min(time.perf_counter(), stop_at) - measure_from
+
+    return summarize(recorder, elapsed)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000.0, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000.0, 3)}
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles and error rates, per call and overall"""
+    def block(outcomes: Dict[str, int], latencies: List[float]) -> Dict[str, Any]:
+        total = sum(outcomes.values())
+        errors = total - outcomes.get("ok", 0)
+        return {
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "errors": {k: v for k, v in outcomes.items() if k != "ok"},
+            **_percentiles(latencies),
+        }
+
+    overall_outcomes: Dict[str, int] = defaultdict(int)
+    overall_latencies: List[float] = []
+    per_call = {}
+    for name, outcomes in recorder.outcomes.items():
+        per_call[name] = block(outcomes, recorder.latencies[name])
+        for outcome, count in outcomes.items():
+            overall_outcomes[outcome] += count
+        overall_latencies.extend(recorder.latencies[name])
+
+    return {"elapsed_seconds": round(elapsed, 2), "overall": block(overall_outcomes, overall_latencies), "calls": per_call}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_service(app_path: str, workers: int) -> Tuple[subprocess.Popen, str]:
+    """Start uvicorn on a free port and wait until it answers /live"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ML_APP_PATH,
+        env=os.environ.copy(),
+    )
+    target = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SPAWN_READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{app_path} exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{target}/live", timeout=1.0).status_code == 200:
+                return process, target
+        except httpx.TransportError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"{app_path} did not come up within {SPAWN_READY_TIMEOUT:.0f}s")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    header = f"  {'call':<18}{'requests':>10}{'rps':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    logger.info(header)
+    rows = [*report["calls"].items(), ("overall", report["overall"])]
+    for name, stats in rows:
+        def fmt(value: Optional[float]) -> str:
+            return f"{value:>10.2f}" if value is not None else f"{'-':>10}"
+        logger.info(
+            f"  {name:<18}{stats['requests']:>10}{stats['throughput_rps']:>10.1f}{stats['error_rate']:>9.1%}"
+            f"{fmt(stats['p50_ms'])}{fmt(stats['p95_ms'])}{fmt(stats['p99_ms'])}"
+        )
+        if stats["errors"]:
+            logger.info(f"    errors: {dict(stats['errors'])}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the ML service")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--target", help="Base URL of a running service")
+    target.add_argument("--spawn", help="uvicorn app to start, e.g. app.main:app or mock_main:app")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when spawning")
+    parser.add_argument("--mix", default="node", help=f"Call mix: {', '.join(MIXES)} or a JSON file of weights")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients (closed loop) or max in flight (open loop)")
+    parser.add_argument("--rate", type=float, default=None, help="Arrivals per second (open loop); omit for closed loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Client timeout per request (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    calls = load_mix(args.mix)
+    process = None
+    try:
+        if args.spawn:
+            process, base_url = spawn_service(args.spawn, args.workers)
+        else:
+            base_url = args.target.rstrip("/")
+
+        mode = f"open loop at {args.rate}/s" if args.rate else "closed loop"
+        logger.info(f"Load testing {base_url}: mix '{args.mix}', {mode}, concurrency {args.concurrency}, {args.duration:.0f}s")
+        report = asyncio.run(run_load(
+            base_url, calls, args.duration, args.warmup, args.concurrency, args.rate, args.timeout, args.seed
+        ))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report["config"] = {
+        "target": args.spawn or args.target, "mix": args.mix, "concurrency": args.concurrency,
+        "rate": args.rate, "duration": args.duration, "timeout": args.timeout, "seed": args.seed,
+    }
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        logger.info(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,11 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+import asyncio
+import json
+import math
+import os
 import random
 from datetime import datetime, timedelta
 
@@ -34,6 +39,43 @@ class ExpiryPredictionRequest(BaseModel):
 class BatchExpiryRequest(BaseModel):
     medicines: List[ExpiryPredictionRequest]
 
+class MockProfile(BaseModel):
+    """Injected latency and failures for one endpoint (or the default for all)"""
+    latency_ms: float = Field(default=0, ge=0, description="Median added latency")
+    jitter_ms: float = Field(default=0, ge=0, description="Std deviation of the added latency")
+    failure_rate: float = Field(default=0, ge=0, le=1, description="Share of requests answered with failure_status")
+    failure_status: int = Field(default=503, ge=400, le=599)
+    hang_rate: float = Field(default=0, ge=0, le=1, description="Share of requests that stall for hang_ms (client timeouts)")
+    hang_ms: float = Field(default=30000, ge=0)
+
+class MockProfiles(BaseModel):
+    default: MockProfile = MockProfile()
+    endpoints: Dict[str, MockProfile] = {}
+
+# --- Mock behaviour (environment overridable) ---
+# ML_MOCK_SEED: responses are a pure function of the seed and the request, so runs are repeatable
+# ML_MOCK_PROFILE: JSON (inline or a file path) shaped like MockProfiles, e.g.
+#   {"default": {"latency_ms": 20, "jitter_ms": 5}, "endpoints": {"/forecast/demand": {"failure_rate": 0.05}}}
+
+MOCK_SEED = int(os.getenv("ML_MOCK_SEED", "42"))
+
+def _load_profiles() -> MockProfiles:
+    raw = os.getenv("ML_MOCK_PROFILE", "")
+    if not raw:
+        return MockProfiles()
+    if os.path.exists(raw):
+        with open(raw) as f:
+            raw = f.read()
+    return MockProfiles.model_validate(json.loads(raw))
+
+_profiles = _load_profiles()
+# Drives injected latency / failures only - response values come from _rng_for
+_fault_rng = random.Random(MOCK_SEED)
+
+def _rng_for(*key: Any) -> random.Random:
+    """RNG seeded by the request inputs: same input, same mock answer"""
+    return random.Random(f"{MOCK_SEED}:{key}")
+
 # --- Mock App ---
 
 app = FastAPI(
@@ -42,6 +84,44 @@ app = FastAPI(
     version="1.0.0-mock"
 )
 
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    """Apply the endpoint's latency / failure profile before handling the request"""
+    if request.url.path.startswith("/mock/"):
+        return await call_next(request)
+
+    profile = _profiles.endpoints.get(request.url.path, _profiles.default)
+    roll = _fault_rng.random()
+    if roll < profile.hang_rate:
+        await asyncio.sleep(profile.hang_ms / 1000.0)
+    elif profile.latency_ms or profile.jitter_ms:
+        delay_ms = max(0.0, _fault_rng.gauss(profile.latency_ms, profile.jitter_ms))
+        await asyncio.sleep(delay_ms / 1000.0)
+
+    if _fault_rng.random() < profile.failure_rate:
+        return JSONResponse(status_code=profile.failure_status, content={"detail": "Injected mock failure"})
+    return await call_next(request)
+
+@app.get("/mock/profile")
+async def get_mock_profile():
+    """Current latency / failure profiles"""
+    return _profiles
+
+@app.put("/mock/profile")
+async def set_mock_profile(profiles: MockProfiles):
+    """Swap the latency / failure profiles without restarting"""
+    global _profiles
+    _profiles = profiles
+    return _profiles
+
+@app.get("/live")
+async def liveness_check():
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check():
+    return {"ready": True}
+
 @app.get("/health")
 async def health_check():
     return {
@@ -60,13 +140,14 @@ async def forecast_demand_endpoint(request: DemandForecastRequest):
     # Generate a mock forecast
     forecast_data = []
     today = datetime.now()
+    rng = _rng_for("forecast", request.periods)
     
     # Create a trend with some seasonality and noise
     base_value = 100
     for i in range(request.periods):
         date = today + timedelta(days=i)
         # Simple sine wave + random noise
-        value = base_value + (random.sin(i * 0.5) * 20) + random.uniform(-10, 10)
+        value = base_value + (math.sin(i * 0.5) * 20) + rng.uniform(-10, 10)
         forecast_data.append({
             "ds": date.strftime("%Y-%m-%d"),
             "yhat": max(0, round(value, 2)),
@@ -93,7 +174,7 @@ async def optimize_inventory_endpoint(request: InventoryOptimizationRequest):
         "recommended_stock": round(recommended_stock, 2),
         "reorder_point": round(reorder_point, 2),
         "action": action,
-        "confidence_score": round(random.uniform(0.8, 0.99), 2),
+        "confidence_score": round(_rng_for("inventory", request.medicine_id).uniform(0.8, 0.99), 2),
         "reason": f"Mock analysis based on daily sales of {request.avg_daily_sales}"
     }
 
@@ -116,7 +197,7 @@ async def batch_optimize_inventory_endpoint(request: BatchInventoryRequest):
             "recommended_stock": round(recommended_stock, 2),
             "reorder_point": round(reorder_point, 2),
             "action": action,
-            "confidence_score": round(random.uniform(0.8, 0.99), 2),
+            "confidence_score": round(_rng_for("inventory", item.medicine_id).uniform(0.8, 0.99), 2),
             "reason": f"Mock analysis based on daily sales of {item.avg_daily_sales}"
         })
     return {"results": results}
@@ -124,13 +205,14 @@ async def batch_optimize_inventory_endpoint(request: BatchInventoryRequest):
 @app.post("/expiry/predict")
 async def predict_expiry_endpoint(request: ExpiryPredictionRequest):
     # Mock logic: higher risk if closer to expiry
+    rng = _rng_for("expiry", request.medicine_id, request.days_until_expiry)
     risk_score = 0.0
     if request.days_until_expiry < 30:
-        risk_score = random.uniform(0.7, 0.95)
+        risk_score = rng.uniform(0.7, 0.95)
     elif request.days_until_expiry < 90:
-        risk_score = random.uniform(0.3, 0.6)
+        risk_score = rng.uniform(0.3, 0.6)
     else:
-        risk_score = random.uniform(0.0, 0.2)
+        risk_score = rng.uniform(0.0, 0.2)
         
     return {
         "medicine_id": request.medicine_id,
@@ -143,13 +225,14 @@ async def predict_expiry_endpoint(request: ExpiryPredictionRequest):
 async def batch_predict_expiry_endpoint(request: BatchExpiryRequest):
     results = []
     for item in request.medicines:
+        rng = _rng_for("expiry", item.medicine_id, item.days_until_expiry)
         risk_score = 0.0
         if item.days_until_expiry < 30:
-            risk_score = random.uniform(0.7, 0.95)
+            risk_score = rng.uniform(0.7, 0.95)
         elif item.days_until_expiry < 90:
-            risk_score = random.uniform(0.3, 0.6)
+            risk_score = rng.uniform(0.3, 0.6)
         else:
-            risk_score = random.uniform(0.0, 0.2)
+            risk_score = rng.uniform(0.0, 0.2)
             
         results.append({
             "medicine_id": item.medicine_id,
@@ -0,0 +1,73 @@
+"""
+Arrow IPC bodies on the batch endpoints.
+"""
+import asyncio
+
+import httpx
+import pyarrow as pa
+
+from app import main
+from app.api.columnar import ARROW_STREAM_MEDIA_TYPE, EXPIRY_COLUMNS, INVENTORY_COLUMNS, read_columns
+
+ROWS = {"medicine_id": [1.0, 2.5, 3.0], "current_stock": [10.0, 10.0, 10.0],
+        "avg_daily_sales": [1.0, 1.0, 1.0], "price": [2.0, 2.0, 2.0]}
+
+
+def _post_arrow(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/inventory/optimize/batch",
+                content=sink.getvalue().to_pybytes(),
+                headers={"content-type": ARROW_STREAM_MEDIA_TYPE},
+            )
+
+    response = asyncio.run(post())
+    return response, pa.ipc.open_stream(response.content).read_all()
+
+
+def test_non_integer_medicine_id_is_invalid():
+    columns, valid = read_columns(pa.table(ROWS), INVENTORY_COLUMNS, with_history=False)
+    assert valid.tolist() == [True, False, True]
+    assert columns["medicine_id"].tolist() == [1, 3]
+
+    # Every int field of the Pydantic schemas is checked the same way
+    for name in ("days_until_expiry", "days_since_last_order", "order_count"):
+        table = pa.table({**ROWS, "medicine_id": [1.0, 2.0, 3.0], name: [1.0, 1.5, 2.0]})
+        _, valid = read_columns(table, INVENTORY_COLUMNS, with_history=False)
+        assert valid.tolist() == [True, False, True], name
+
+    expiry = pa.table({"medicine_id": [1.0, 2.0, 3.0], "days_until_expiry": [30.0, 30.5, 30.0],
+                       "stock_quantity": [5.0, 5.0, 5.0], "avg_daily_sales": [1.0, 1.0, 1.0],
+                       "unit_price": [2.0, 2.0, 2.0], "supplier_id": [1.0, 1.0, 1.5]})
+    _, valid = read_columns(expiry, EXPIRY_COLUMNS, with_history=False)
+    assert valid.tolist() == [True, False, False]
+
+
+def test_scoring_failure_returns_error_rows(monkeypatch):
+    def broken(columns):
+        raise ValueError("feature mismatch")
+
+    monkeypatch.setattr(main, "predict_inventory_optimization_columns", broken)
+    response, table = _post_arrow(pa.table(ROWS))
+    assert response.status_code == 200
+    assert table.column("error").to_pylist() == ["Prediction failed", "Invalid input row", "Prediction failed"]
+
+
+def test_unit_outputs_are_integers(monkeypatch):
+    import numpy as np
+    from types import SimpleNamespace
+
+    from app.services import ml_service
+
+    model = SimpleNamespace(predict=lambda X: np.full(len(X), 12.4))
+    monkeypatch.setattr(ml_service, "get_served_model", lambda key: (model, "test"))
+    _, table = _post_arrow(pa.table(ROWS))
+    for name in ("current_stock", "optimal_stock", "reorder_quantity", "days_of_stock"):
+        assert table.schema.field(name).type == pa.int64()
+    assert table.column("optimal_stock").to_pylist() == [12, None, 12]
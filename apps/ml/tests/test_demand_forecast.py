@@ -0,0 +1,35 @@
+"""
+Prophet forecast caching by uncertainty sample count.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ml_service
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    calls = []
+
+    def fake_forecast(model, periods, uncertainty_samples=None):
+        calls.append((periods, uncertainty_samples))
+        return [{"date": str(day), "predicted_demand": 1.0} for day in range(periods)]
+
+    monkeypatch.setattr(ml_service, "get_model", lambda key: SimpleNamespace(uncertainty_samples=1000))
+    monkeypatch.setattr(ml_service, "_run_prophet_forecast", fake_forecast)
+    ml_service.clear_forecast_cache()
+    yield calls
+    ml_service.clear_forecast_cache()
+
+
+def test_default_and_zero_samples_are_cached(runs):
+    for samples in (None, 1000, None, 0, 0):
+        assert len(ml_service.predict_demand(periods=7, uncertainty_samples=samples)) == 7
+    assert runs == [(ml_service.MAX_FORECAST_HORIZON, 1000), (ml_service.MAX_FORECAST_HORIZON, 0)]
+
+
+def test_other_sample_counts_forecast_only_the_periods(runs):
+    for samples in (250, 251):
+        ml_service.predict_demand(periods=7, uncertainty_samples=samples)
+    assert runs == [(7, 250), (7, 251)]
@@ -0,0 +1,32 @@
+"""
+Artifact selection between native exports and pickles.
+"""
+import os
+
+from app.services.model_io import resolve_artifact
+
+PICKLE = "inventory_optimization_lgb.pkl"
+NATIVE = "inventory_optimization_lgb.txt"
+
+
+def _touch(path, mtime):
+    path.write_text("model")
+    os.utime(path, (mtime, mtime))
+
+
+def test_native_export_wins_when_newer(tmp_path):
+    _touch(tmp_path / PICKLE, 1_000)
+    _touch(tmp_path / NATIVE, 2_000)
+    assert resolve_artifact("inventory_lgb", tmp_path, PICKLE) == (tmp_path / NATIVE, "native")
+
+
+def test_retrained_pickle_beats_stale_export(tmp_path):
+    _touch(tmp_path / NATIVE, 1_000)
+    _touch(tmp_path / PICKLE, 2_000)
+    assert resolve_artifact("inventory_lgb", tmp_path, PICKLE) == (tmp_path / PICKLE, "joblib")
+
+
+def test_missing_artifacts(tmp_path):
+    assert resolve_artifact("inventory_lgb", tmp_path, PICKLE) is None
+    _touch(tmp_path / NATIVE, 1_000)
+    assert resolve_artifact("inventory_lgb", tmp_path, PICKLE) == (tmp_path / NATIVE, "native")
@@ -0,0 +1,45 @@
+"""
+Order history orientation: requests, the feature tail and the store ring are all oldest -> newest.
+"""
+import numpy as np
+
+from app.services import feature_store, ml_service
+from app.services.features import order_history_flat, order_history_matrix
+
+
+def test_request_history_is_oldest_first():
+    # The last entry is qty_lag_1, as in the original single-item code (hist[-1])
+    tail, total, _, _ = order_history_matrix([[10, 20, 30, 40, 50], None], [7.0, 7.0])
+    assert tail[0].tolist() == [10, 20, 30, 40, 50]
+    assert tail[1].tolist() == [7.0] * 5
+    assert total.tolist() == [150, 35]
+
+
+def test_long_histories_keep_the_most_recent_orders():
+    histories = [[20, 30, 40, 50, 60, 70, 80], [1, 2, 3, 4, 5]]
+    tail, total, mean, std = order_history_matrix(histories, [0.0, 0.0])
+    assert tail.tolist() == [[40, 50, 60, 70, 80], [1, 2, 3, 4, 5]]
+
+    flat = np.concatenate([np.asarray(h, dtype=np.float64) for h in histories])
+    flat_stats = order_history_flat(flat, [7, 5], [0.0, 0.0])
+    for a, b in zip((tail, total, mean, std), flat_stats):
+        np.testing.assert_allclose(a, b)
+
+
+def test_stored_history_matches_request_history(monkeypatch):
+    store = feature_store.FeatureStore()
+    for day, qty in enumerate([10, 20, 30, 40, 50]):
+        store.record_receipt(7, day, qty)
+    monkeypatch.setattr(ml_service, "get_feature_store", lambda: store)
+
+    items = ml_service.attach_stored_order_history([
+        {"medicine_id": 7, "quantity_received": 3},
+        {"medicine_id": 8, "quantity_received": 3},
+        {"medicine_id": 7, "quantity_received": 3, "historical_qty_data": [1, 1, 1, 1, 1]},
+    ])
+    assert items[0]["stored_order_history"]["tail"] == [10, 20, 30, 40, 50]
+    assert "stored_order_history" not in items[1] and "stored_order_history" not in items[2]
+
+    stored_tail = ml_service._stored_order_history(items)[0][0]
+    request_tail = order_history_matrix([[10, 20, 30, 40, 50]], [3.0])[0][0]
+    assert stored_tail.tolist() == request_tail.tolist()
@@ -0,0 +1,35 @@
+"""
+Demand model routing on observed latency.
+"""
+import pytest
+
+from app.services import router
+
+LOADED = {router.FAST_DEMAND_MODEL: True, router.ACCURATE_DEMAND_MODEL: True}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_timings(monkeypatch):
+    monkeypatch.setattr(router, "_timings", {})
+    monkeypatch.setattr(router, "observe_stage", lambda *args: None)
+
+
+def test_batches_do_not_skew_single_call_latency():
+    router.record_inference_time(router.ACCURATE_DEMAND_MODEL, 0.010)
+    router.record_inference_time(router.ACCURATE_DEMAND_MODEL, 2.0, rows=1000)
+    assert router.expected_latency_ms(router.ACCURATE_DEMAND_MODEL) == pytest.approx(10.0)
+    assert router.expected_latency_ms(router.ACCURATE_DEMAND_MODEL, rows=500) == pytest.approx(1000.0)
+
+
+def test_balanced_keeps_sampling_stacking_over_budget(monkeypatch):
+    router.record_inference_time(router.ACCURATE_DEMAND_MODEL, 0.100)
+    monkeypatch.setattr(router.random, "random", lambda: 0.99)
+    assert router.choose_demand_model(LOADED, latency_budget_ms=50) == router.FAST_DEMAND_MODEL
+    monkeypatch.setattr(router.random, "random", lambda: 0.0)
+    assert router.choose_demand_model(LOADED, latency_budget_ms=50) == router.ACCURATE_DEMAND_MODEL
+
+    # Fast samples pull the estimate back under the budget
+    for _ in range(20):
+        router.record_inference_time(router.ACCURATE_DEMAND_MODEL, 0.010)
+    monkeypatch.setattr(router.random, "random", lambda: 0.99)
+    assert router.choose_demand_model(LOADED, latency_budget_ms=50) == router.ACCURATE_DEMAND_MODEL
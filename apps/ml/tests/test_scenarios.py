@@ -0,0 +1,28 @@
+"""
+What-if grids over one base item.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services import scenarios
+
+BASE = {"medicine_id": 1, "quantity_received": 10, "unit_cost": 2.0, "days_until_expiry": 180,
+        "days_since_last_order": 30, "order_count": 10, "historical_qty_data": [5, 4, 3, 2, 1]}
+
+
+def test_grid_reports_the_version_that_scored(monkeypatch):
+    served = [(SimpleNamespace(predict=lambda X: np.arange(len(X), dtype=np.float64)), "v1")]
+
+    def get_served_model(key):
+        # A reload lands right after the model is resolved
+        current = served[-1]
+        served.append((None, "v2"))
+        return current
+
+    monkeypatch.setattr(scenarios, "get_served_model", get_served_model)
+    surface = scenarios.inventory_scenarios(BASE, [("quantity_received", [0, 10, 20]), ("unit_cost", [1.0, 2.0])])
+
+    assert surface["model_version"] == "v1"
+    assert surface["shape"] == [3, 2] and surface["points"] == 6
+    assert surface["values"]["optimal_stock"] == [0, 1, 2, 3, 4, 5]
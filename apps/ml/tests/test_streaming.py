@@ -0,0 +1,77 @@
+"""
+NDJSON streaming endpoints: the request body is read while the response streams.
+"""
+import asyncio
+import json
+
+import httpx
+
+from app import main
+from app.api import streaming
+
+
+def _fake_inventory_batch(items):
+    return [{"optimal_stock": item["quantity_received"] * 2} for item in items]
+
+
+async def _stream_inventory(n_items: int, piece_bytes: int):
+    lines = b"".join(
+        (json.dumps({"medicine_id": i, "current_stock": i, "avg_daily_sales": 1.0, "price": 2.5}) + "\n").encode()
+        for i in range(n_items)
+    )
+
+    async def body():
+        # Split at arbitrary byte offsets so lines span chunks
+        for start in range(0, len(lines), piece_bytes):
+            yield lines[start:start + piece_bytes]
+            await asyncio.sleep(0)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        response = await client.post(
+            "/inventory/optimize/batch/stream",
+            content=body(),
+            headers={"content-type": "application/x-ndjson"},
+        )
+    return response
+
+
+def test_stream_returns_every_item(monkeypatch):
+    monkeypatch.setattr(main, "predict_inventory_optimization_batch", _fake_inventory_batch)
+    n_items = 1200  # more than one STREAM_CHUNK_SIZE chunk
+
+    response = asyncio.run(_stream_inventory(n_items, piece_bytes=1000))
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(row["index"] for row in rows) == list(range(n_items))
+    assert all(row["optimal_stock"] == row["medicine_id"] * 2 for row in rows)
+
+
+def test_stream_reports_invalid_lines_in_band(monkeypatch):
+    monkeypatch.setattr(main, "predict_inventory_optimization_batch", _fake_inventory_batch)
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/inventory/optimize/batch/stream",
+                content=b'{"medicine_id": 1, "current_stock": 3, "avg_daily_sales": 1, "price": 1}\n{"medicine_id": "x"}\n',
+                headers={"content-type": "application/x-ndjson"},
+            )
+
+    rows = [json.loads(line) for line in asyncio.run(post()).text.splitlines()]
+    assert sorted(row["index"] for row in rows) == [0, 1]
+    assert "error" in next(row for row in rows if row["index"] == 1)
+
+
+def test_json_body_over_cap_is_rejected(monkeypatch):
+    monkeypatch.setattr(streaming, "MAX_JSON_BODY_BYTES", 100)
+    medicines = [{"medicine_id": i, "current_stock": 1, "avg_daily_sales": 1, "price": 1} for i in range(10)]
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/inventory/optimize/batch/stream", json={"medicines": medicines})
+
+    assert asyncio.run(post()).status_code == 413
@@ -0,0 +1,154 @@
+"""
+Flattened tree evaluator parity against the native LightGBM / XGBoost predictions.
+"""
+import numpy as np
+import pytest
+
+from app.services.tree_eval import MISSING_NAN, MISSING_NONE, MISSING_ZERO, get_forest
+
+RTOL = 1e-5
+ATOL = 1e-6
+ROWS = 500
+THRESHOLD_ROWS = 300
+
+
+def edge_cases(X, forest, seed: int = 0):
+    """Copies of X exercising missing values, zeros, extremes and exact split thresholds"""
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float64)
+
+    with_nan = X.copy()
+    with_nan[rng.random(X.shape) < 0.1] = np.nan
+
+    zeros = X.copy()
+    zeros[rng.random(X.shape) < 0.3] = 0.0
+
+    extremes = X.copy()
+    mask = rng.random(X.shape) < 0.05
+    extremes[mask] = rng.choice([-1e30, 1e30], size=int(mask.sum()))
+
+    # One row per sampled split, with that feature set exactly to the threshold
+    splits = np.flatnonzero(~forest.is_leaf)
+    splits = rng.choice(splits, size=min(THRESHOLD_ROWS, len(splits)), replace=False)
+    on_threshold = X[rng.integers(0, len(X), len(splits))].copy()
+    on_threshold[np.arange(len(splits)), forest.feature[splits]] = forest.threshold[splits]
+
+    return {"features": X, "nan": with_nan, "zeros": zeros, "extremes": extremes, "on_threshold": on_threshold}
+
+
+def _features(n_features: int, seed: int = 1):
+    # Same distribution the dummy models are trained on
+    return np.random.default_rng(seed).uniform(0, 100, (ROWS, n_features))
+
+
+def assert_parity(model_key: str, model, native, X):
+    forest = get_forest(model_key, model)
+    assert forest is not None
+    for name, cases in edge_cases(X, forest).items():
+        np.testing.assert_allclose(forest.predict(cases), native(cases), rtol=RTOL, atol=ATOL, err_msg=name)
+    return forest
+
+
+def _lgb_booster(train_X, y, **params):
+    lgb = pytest.importorskip("lightgbm")
+    return lgb.train(
+        {"objective": "regression", "num_leaves": 15, "verbose": -1, "seed": 0, **params},
+        lgb.Dataset(train_X, y), num_boost_round=50
+    )
+
+
+# LightGBM: <= splits, NaN compared as 0 unless missing_type is NaN, zero band for missing_type Zero
+
+def test_lightgbm_dummy_models():
+    pytest.importorskip("lightgbm")
+    pytest.importorskip("sklearn")
+    from benchmarks.dummy_models import train_lgb_regressor
+
+    for model_key, feature_set in (("test_inventory_lgb", "inventory"), ("test_demand_lgb", "demand")):
+        booster = train_lgb_regressor(feature_set)
+        assert_parity(model_key, booster, booster.predict, _features(booster.num_feature()))
+
+
+def test_lightgbm_missing_type_none():
+    X = _features(8)
+    booster = _lgb_booster(X, X[:, :3].sum(axis=1))
+    forest = assert_parity("test_lgb_none", booster, booster.predict, X)
+    assert set(forest.missing_type[~forest.is_leaf]) == {MISSING_NONE}
+
+
+def test_lightgbm_missing_type_nan():
+    X = _features(8)
+    train_X = X.copy()
+    train_X[np.random.default_rng(2).random(X.shape) < 0.2] = np.nan
+    booster = _lgb_booster(train_X, np.nan_to_num(train_X[:, :3]).sum(axis=1))
+    forest = assert_parity("test_lgb_nan", booster, booster.predict, X)
+    assert MISSING_NAN in set(forest.missing_type[~forest.is_leaf])
+
+
+def test_lightgbm_missing_type_zero():
+    X = _features(8)
+    train_X = X.copy()
+    train_X[np.random.default_rng(3).random(X.shape) < 0.2] = 0.0
+    booster = _lgb_booster(train_X, train_X[:, :3].sum(axis=1), zero_as_missing=True)
+    forest = assert_parity("test_lgb_zero", booster, booster.predict, X)
+    assert MISSING_ZERO in set(forest.missing_type[~forest.is_leaf])
+
+
+# XGBoost: strict < splits in float32, NaN takes the default branch
+
+def _xgb_native(model):
+    from app.services.ml_service import _native_expiry_probabilities
+    return lambda X: _native_expiry_probabilities(model, X)
+
+
+def test_xgboost_dummy_model():
+    pytest.importorskip("xgboost")
+    pytest.importorskip("sklearn")
+    from benchmarks.dummy_models import train_expiry_classifier
+
+    model = train_expiry_classifier()
+    assert_parity("test_expiry_xgb", model, _xgb_native(model), _features(model.n_features_in_))
+
+
+def test_xgboost_strict_float32_thresholds():
+    pytest.importorskip("xgboost")
+    pytest.importorskip("sklearn")
+    from benchmarks.dummy_models import train_expiry_classifier
+
+    model = train_expiry_classifier(seed=1)
+    forest = get_forest("test_xgb_float32", model)
+    splits = np.flatnonzero(~forest.is_leaf)[:THRESHOLD_ROWS]
+    X = _features(forest.n_features)[np.arange(len(splits)) % ROWS]
+    threshold = forest.threshold[splits].astype(np.float64)
+    # Just below / at / just above each threshold in float64 - all round onto it in float32
+    for offset in (-1e-9, 0.0, 1e-9):
+        rows = X.copy()
+        rows[np.arange(len(splits)), forest.feature[splits]] = threshold * (1 + offset)
+        np.testing.assert_allclose(forest.predict(rows), _xgb_native(model)(rows), rtol=RTOL, atol=ATOL)
+
+
+def test_xgboost_best_iteration_truncation():
+    xgb = pytest.importorskip("xgboost")
+    pytest.importorskip("sklearn")
+
+    rng = np.random.default_rng(4)
+    X = _features(6)
+    y = (X[:, 0] + rng.normal(0, 40, ROWS) > 50).astype(int)
+    model = xgb.XGBClassifier(n_estimators=200, max_depth=4, learning_rate=0.3, early_stopping_rounds=5, random_state=0)
+    model.fit(X[:400], y[:400], eval_set=[(X[400:], y[400:])], verbose=False)
+    assert model.best_iteration < 199
+
+    forest = assert_parity("test_xgb_early_stop", model, _xgb_native(model), X)
+    assert forest.n_trees == model.best_iteration + 1
+
+
+@pytest.mark.parametrize("base_score", [0.3, None])
+def test_xgboost_logit_base_score(base_score):
+    xgb = pytest.importorskip("xgboost")
+    pytest.importorskip("sklearn")
+
+    X = _features(6)
+    y = (X[:, 0] > 70).astype(int)  # unbalanced, so a fitted intercept isn't 0.5
+    model = xgb.XGBClassifier(n_estimators=30, max_depth=3, base_score=base_score, random_state=0)
+    model.fit(X, y)
+    assert_parity(f"test_xgb_base_{base_score}", model, _xgb_native(model), X)